@@ -2,7 +2,9 @@
 from rest_framework.routers import DefaultRouter
 from accounts.api.views import (
     LandlordViewSet, ApartmentTypeViewSet, HouseTypeViewSet,
-    ApartmentViewSet, HouseViewSet, HouseBookingViewSet, InvoiceViewSet,TenantViewSet,ProfileViewSet,UserViewSet
+    ApartmentViewSet, HouseViewSet, HouseBookingViewSet, InvoiceViewSet,TenantViewSet,ProfileViewSet,UserViewSet,
+    ActivityEventViewSet, PaymentViewSet, LandlordStatementViewSet,
+    ArrearsSnapshotViewSet
 )
 
 # Create BRMS app-specific router
@@ -19,5 +21,9 @@ brms_router.register(r'apartments', ApartmentViewSet)
 brms_router.register(r'houses', HouseViewSet)
 brms_router.register(r'bookings', HouseBookingViewSet)
 brms_router.register(r'invoices', InvoiceViewSet)
+brms_router.register(r'payments', PaymentViewSet)
+brms_router.register(r'activities', ActivityEventViewSet)
+brms_router.register(r'statements', LandlordStatementViewSet)
+brms_router.register(r'arrears', ArrearsSnapshotViewSet)
 
 urlpatterns = brms_router.urls
\ No newline at end of file
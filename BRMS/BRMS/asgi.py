@@ -3,6 +3,11 @@ ASGI config for BRMS project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve the project through this entry point (e.g. ``uvicorn BRMS.asgi:application``)
+rather than WSGI: the /api/<role>/notifications/stream Server-Sent Events
+endpoint holds idle connections on the event loop, and WSGI cannot send an
+async stream until it ends, so under WSGI the endpoint answers 503.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
 """
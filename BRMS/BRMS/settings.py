@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 from corsheaders.defaults import default_headers
 
@@ -55,7 +56,9 @@ REST_FRAMEWORK = {
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
-    ]
+    ],
+    'DEFAULT_PAGINATION_CLASS': 'accounts.api.pagination.KeysetCursorPagination',
+    'PAGE_SIZE': 50,
 }
 
 from datetime import timedelta
@@ -109,6 +112,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'accounts.routers.DatabaseRoutingMiddleware',
 ]
 
 CSRF_TRUSTED_ORIGINS = [
@@ -144,9 +148,39 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        'OPTIONS': {
+            # Take the write lock up front so concurrent ledger writes queue
+            # on the busy timeout instead of failing with "database is locked"
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
+        'TEST': {
+            # File-backed so multi-threaded tests get real locking semantics
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
+    },
+    # Read replica for the list, export and report reads (accounts/routers.py).
+    # Point BRMS_REPLICA_DB at a copy of the primary kept current by replication
+    # (e.g. Litestream, or locally `sqlite3 db.sqlite3 ".backup replica.sqlite3"`)
+    # so reporting stops contending with payment writes for the primary's lock.
+    # Unset, the replica alias reads the primary file.
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ.get('BRMS_REPLICA_DB', BASE_DIR / 'db.sqlite3'),
+        'OPTIONS': {
+            'timeout': 20,
+        },
+        'TEST': {
+            'MIRROR': 'default',
+        },
+    },
 }
 
+DATABASE_ROUTERS = ['accounts.routers.PrimaryReplicaRouter']
+
+# Alias the routed reads go to; 'default' sends everything to the primary
+READ_DATABASE = os.environ.get('BRMS_READ_DATABASE', 'replica')
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -188,4 +222,22 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
-LOGIN_REDIRECT_URL = '/dashboard/'
\ No newline at end of file
+LOGIN_REDIRECT_URL = '/dashboard/'
+
+# M-Pesa (Daraja) STK push. Point BASE_URL at `manage.py run_fake_mpesa` to
+# develop without the sandbox. CALLBACK_TOKEN must be set: it is appended as
+# ?token= to the callback URL sent with each push, and callbacks without it
+# are refused (`manage.py check --deploy` reports it missing). With
+# CONFIRM_CALLBACKS on, a successful callback is checked with an STK push
+# query before the payment is recorded.
+MPESA = {
+    'BASE_URL': os.environ.get('MPESA_BASE_URL', 'https://sandbox.safaricom.co.ke'),
+    'CONSUMER_KEY': os.environ.get('MPESA_CONSUMER_KEY', ''),
+    'CONSUMER_SECRET': os.environ.get('MPESA_CONSUMER_SECRET', ''),
+    'SHORTCODE': os.environ.get('MPESA_SHORTCODE', '174379'),
+    'PASSKEY': os.environ.get('MPESA_PASSKEY', ''),
+    'CALLBACK_URL': os.environ.get('MPESA_CALLBACK_URL', 'http://127.0.0.1:8000/api/payments/mpesa/callback/'),
+    'CALLBACK_TOKEN': os.environ.get('MPESA_CALLBACK_TOKEN', ''),
+    'CONFIRM_CALLBACKS': os.environ.get('MPESA_CONFIRM_CALLBACKS', '1') != '0',
+    'TIMEOUT': 10,
+}
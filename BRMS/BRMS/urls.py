@@ -4,6 +4,8 @@ from django.urls import path, include
 from .api.urls import brms_router
 from accounts.api.urls import accounts_router
 from rest_framework.authtoken.views import obtain_auth_token
+from accounts.api.views import landlord_stats, tenant_stats, admin_stats, ActivityEventViewSet, NotificationViewSet
+from accounts.views import notification_stream, notification_stream_ticket, mpesa_initiate, mpesa_status, mpesa_callback
 from django.conf import settings
 from django.conf.urls.static import static
 
@@ -11,6 +13,23 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/brms/', include(brms_router.urls)),
     path('api/accounts/', include(accounts_router.urls)),
+    # Dashboard endpoints
+    path('api/landlord/stats', landlord_stats, name='landlord_stats'),
+    path('api/tenant/stats', tenant_stats, name='tenant_stats'),
+    path('api/admin/stats', admin_stats, name='admin_stats'),
+    path('api/landlord/activities', ActivityEventViewSet.as_view({'get': 'list'}, role='landlord'), name='landlord_activities'),
+    path('api/tenant/activities', ActivityEventViewSet.as_view({'get': 'list'}, role='tenant'), name='tenant_activities'),
+    path('api/admin/activities', ActivityEventViewSet.as_view({'get': 'list'}, role='admin'), name='admin_activities'),
+    path('api/landlord/notifications', NotificationViewSet.as_view({'get': 'list'}, role='landlord'), name='landlord_notifications'),
+    path('api/tenant/notifications', NotificationViewSet.as_view({'get': 'list'}, role='tenant'), name='tenant_notifications'),
+    path('api/admin/notifications', NotificationViewSet.as_view({'get': 'list'}, role='admin'), name='admin_notifications'),
+    # Server-Sent Events; needs the ASGI application (BRMS/asgi.py)
+    path('api/<str:role>/notifications/stream', notification_stream, name='notification_stream'),
+    path('api/<str:role>/notifications/stream/ticket', notification_stream_ticket, name='notification_stream_ticket'),
+    # M-Pesa STK push
+    path('api/payments/mpesa/initiate/', mpesa_initiate, name='mpesa_initiate'),
+    path('api/payments/mpesa/status/<str:checkout_request_id>/', mpesa_status, name='mpesa_status'),
+    path('api/payments/mpesa/callback/', mpesa_callback, name='mpesa_callback'),
     # Add more URL patterns as needed
 
     # Add these to your urlpatterns
@@ -0,0 +1,245 @@
+"""
+Activity event log for bookings, invoices, payments and house tenancies.
+
+Receivers here append an ActivityEvent whenever one of those changes. Each
+event is stamped with the landlord and tenant it concerns, so the feeds read
+them back with a single range scan on the matching (scope, created_at) index
+instead of filtering Django's LogEntry table.
+
+Bulk paths that skip signals (e.g. billing.generate_invoices, the bulk import
+resources, bookings.approve_booking) call the record_* helpers directly;
+invoice status changes made by queryset UPDATEs (the payment ledger, the
+overdue sweep) arrive through Invoice.tracked_update's invoice_statuses_changed.
+Events are handed to notifications.publish_events so subscribed dashboards
+hear about them as they happen.
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import notifications
+from .models import ActivityEvent, House, HouseBooking, Invoice, Payment, invoice_statuses_changed
+
+INSERT_CHUNK_SIZE = 500
+
+
+def record(event_type, object_id, summary, landlord_id=None, tenant_id=None, amount=None, using='default'):
+    event = ActivityEvent.objects.using(using).create(
+        event_type=event_type, object_id=object_id, summary=summary,
+        landlord_id=landlord_id, tenant_id=tenant_id, amount=amount,
+    )
+    notifications.publish_events([event], using)
+    return event
+
+
+def house_details(house_id, using='default'):
+    """
+    (house number, apartment name, landlord id) for a house, in one query
+    """
+    return House.objects.using(using).filter(pk=house_id).values_list(
+        'number', 'apartment__name', 'apartment__owner_id'
+    ).first() or ('?', '?', None)
+
+
+def invoice_details(invoice_id, using='default'):
+    """
+    (month, year, tenant id, landlord id) for an invoice, in one query
+    """
+    return Invoice.objects.using(using).filter(pk=invoice_id).values_list(
+        'month', 'year', 'tenant_id', 'house__apartment__owner_id'
+    ).first() or ('?', '?', None, None)
+
+
+def swap_saved(instance, attr, value):
+    """
+    Return the value last persisted for a tracked field and remember the new one
+    """
+    previous = getattr(instance, attr, None)
+    setattr(instance, attr, value)
+    return previous
+
+
+def record_invoices_created(queryset):
+    """
+    Append an invoice_created event for every invoice in the queryset.
+    Returns the number of events written.
+    """
+    rows = queryset.order_by().values_list(
+        'pk', 'month', 'year', 'total_payable', 'tenant_id', 'house__number', 'house__apartment__owner_id'
+    )
+    written = 0
+    batch = []
+    for pk, month, year, total, tenant_id, number, landlord_id in rows.iterator(chunk_size=INSERT_CHUNK_SIZE):
+        batch.append(ActivityEvent(
+            event_type='invoice_created', object_id=pk, summary=f'Invoice for {month} {year}, house {number}',
+            landlord_id=landlord_id, tenant_id=tenant_id, amount=total,
+        ))
+        if len(batch) >= INSERT_CHUNK_SIZE:
+            events = ActivityEvent.objects.using(queryset.db).bulk_create(batch)
+            notifications.publish_events(events, queryset.db)
+            written += len(batch)
+            batch = []
+    if batch:
+        events = ActivityEvent.objects.using(queryset.db).bulk_create(batch)
+        notifications.publish_events(events, queryset.db)
+        written += len(batch)
+    return written
+
+
+def record_payments_created(payments, using='default'):
+    """
+    Append a payment_received event for each bulk-created payment
+    """
+    if not payments:
+        return 0
+    details = {
+        pk: rest for pk, *rest in Invoice.objects.using(using).filter(
+            pk__in={payment.invoice_id for payment in payments}
+        ).values_list('pk', 'month', 'year', 'tenant_id', 'house__apartment__owner_id')
+    }
+    events = []
+    for payment in payments:
+        month, year, tenant_id, landlord_id = details[payment.invoice_id]
+        events.append(ActivityEvent(
+            event_type='payment_received', object_id=payment.pk,
+            summary=f'Payment of {payment.amount} received for {month} {year}',
+            landlord_id=landlord_id, tenant_id=tenant_id, amount=payment.amount,
+        ))
+    events = ActivityEvent.objects.using(using).bulk_create(events, batch_size=INSERT_CHUNK_SIZE)
+    notifications.publish_events(events, using)
+    return len(events)
+
+
+def record_tenancy_changes(houses, using='default'):
+    """
+    Append tenant_vacated / tenant_assigned events for bulk-written houses
+    whose tenant differs from the one they were loaded with
+    """
+    changed = [(house, swap_saved(house, '_saved_tenant_id', house.tenant_id)) for house in houses]
+    changed = [(house, previous) for house, previous in changed if previous != house.tenant_id]
+    if not changed:
+        return 0
+    details = {
+        pk: rest for pk, *rest in House.objects.using(using).filter(
+            pk__in=[house.pk for house, _ in changed]
+        ).values_list('pk', 'number', 'apartment__name', 'apartment__owner_id')
+    }
+    events = []
+    for house, previous in changed:
+        number, apartment, landlord_id = details[house.pk]
+        if previous is not None:
+            events.append(ActivityEvent(
+                event_type='tenant_vacated', object_id=house.pk, summary=f'Tenant moved out of house {number}, {apartment}',
+                landlord_id=landlord_id, tenant_id=previous,
+            ))
+        if house.tenant_id is not None:
+            events.append(ActivityEvent(
+                event_type='tenant_assigned', object_id=house.pk, summary=f'Tenant moved into house {number}, {apartment}',
+                landlord_id=landlord_id, tenant_id=house.tenant_id,
+            ))
+    events = ActivityEvent.objects.using(using).bulk_create(events, batch_size=INSERT_CHUNK_SIZE)
+    notifications.publish_events(events, using)
+    return len(events)
+
+
+def record_booking_approval(house_id, approved, rejected, using='default'):
+    """
+    Append the events for an approval written with queryset updates: a
+    booking_status event for the approved (booking id, tenant id) and each
+    rejected one, and tenant_assigned for the approved tenant
+    """
+    number, apartment, landlord_id = house_details(house_id, using)
+    booking_id, tenant_id = approved
+    events = [ActivityEvent(
+        event_type='booking_status', object_id=booking_id, summary=f'Booking for house {number}, {apartment} approved',
+        landlord_id=landlord_id, tenant_id=tenant_id,
+    )]
+    events.extend(
+        ActivityEvent(
+            event_type='booking_status', object_id=pk, summary=f'Booking for house {number}, {apartment} rejected',
+            landlord_id=landlord_id, tenant_id=rejected_tenant_id,
+        )
+        for pk, rejected_tenant_id in rejected
+    )
+    events.append(ActivityEvent(
+        event_type='tenant_assigned', object_id=house_id, summary=f'Tenant moved into house {number}, {apartment}',
+        landlord_id=landlord_id, tenant_id=tenant_id,
+    ))
+    events = ActivityEvent.objects.using(using).bulk_create(events, batch_size=INSERT_CHUNK_SIZE)
+    notifications.publish_events(events, using)
+    return len(events)
+
+
+@receiver(post_save, sender=HouseBooking)
+def record_booking(sender, instance, created, raw=False, using='default', **kwargs):
+    previous = swap_saved(instance, '_saved_status', instance.status)
+    if raw or (not created and previous == instance.status):
+        return
+    number, apartment, landlord_id = house_details(instance.house_id, using)
+    if created and instance.status == 'waitlisted':
+        event_type, summary = 'booking_created', f'Booking waitlisted for house {number}, {apartment}'
+    elif created:
+        event_type, summary = 'booking_created', f'Booking requested for house {number}, {apartment}'
+    else:
+        event_type, summary = 'booking_status', f'Booking for house {number}, {apartment} {instance.get_status_display().lower()}'
+    record(event_type, instance.pk, summary, landlord_id, instance.tenant_id, using=using)
+
+@receiver(post_save, sender=Invoice)
+def record_invoice(sender, instance, created, raw=False, using='default', **kwargs):
+    previous = swap_saved(instance, '_saved_payment_status', instance.payment_status)
+    if raw or (not created and previous == instance.payment_status):
+        return
+    number, _, landlord_id = house_details(instance.house_id, using)
+    if created:
+        event_type, summary = 'invoice_created', f'Invoice for {instance.month} {instance.year}, house {number}'
+    else:
+        event_type = 'invoice_status'
+        summary = f'Invoice for {instance.month} {instance.year} is {instance.get_payment_status_display().lower()}'
+    record(event_type, instance.pk, summary, landlord_id, instance.tenant_id, instance.total_payable, using)
+
+@receiver(invoice_statuses_changed)
+def record_invoice_statuses(sender, changes, using='default', **kwargs):
+    """
+    invoice_status events for status changes made by queryset UPDATEs (the
+    payment ledger, the overdue sweep), in one query and one insert
+    """
+    details = {
+        pk: rest for pk, *rest in Invoice.objects.using(using).filter(pk__in=[pk for pk, _ in changes]).order_by().values_list(
+            'pk', 'month', 'year', 'total_payable', 'tenant_id', 'house__apartment__owner_id'
+        )
+    }
+    labels = dict(Invoice.PAYMENT_STATUS_CHOICES)
+    events = []
+    for pk, payment_status in changes:
+        month, year, total, tenant_id, landlord_id = details[pk]
+        events.append(ActivityEvent(
+            event_type='invoice_status', object_id=pk,
+            summary=f'Invoice for {month} {year} is {labels[payment_status].lower()}',
+            landlord_id=landlord_id, tenant_id=tenant_id, amount=total,
+        ))
+    events = ActivityEvent.objects.using(using).bulk_create(events, batch_size=INSERT_CHUNK_SIZE)
+    notifications.publish_events(events, using)
+
+@receiver(post_save, sender=Payment)
+def record_payment(sender, instance, created, raw=False, using='default', **kwargs):
+    if raw or not created:
+        return
+    month, year, tenant_id, landlord_id = invoice_details(instance.invoice_id, using)
+    summary = f'Payment of {instance.amount} received for {month} {year}'
+    record('payment_received', instance.pk, summary, landlord_id, tenant_id, instance.amount, using)
+
+@receiver(post_delete, sender=Payment)
+def record_payment_reversal(sender, instance, using='default', **kwargs):
+    month, year, tenant_id, landlord_id = invoice_details(instance.invoice_id, using)
+    summary = f'Payment of {instance.amount} for {month} {year} reversed'
+    record('payment_reversed', instance.pk, summary, landlord_id, tenant_id, instance.amount, using)
+
+@receiver(post_save, sender=House)
+def record_tenancy(sender, instance, created, raw=False, using='default', **kwargs):
+    previous = swap_saved(instance, '_saved_tenant_id', instance.tenant_id)
+    if raw or previous == instance.tenant_id:
+        return
+    number, apartment, landlord_id = house_details(instance.pk, using)
+    if previous is not None:
+        record('tenant_vacated', instance.pk, f'Tenant moved out of house {number}, {apartment}', landlord_id, previous, using=using)
+    if instance.tenant_id is not None:
+        record('tenant_assigned', instance.pk, f'Tenant moved into house {number}, {apartment}', landlord_id, instance.tenant_id, using=using)
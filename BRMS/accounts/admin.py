@@ -1,12 +1,19 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 from django.contrib.admin.models import LogEntry, DELETION
 from django.utils.html import escape
 from django.urls import reverse
+from django.utils import timezone
 from django.utils.safestring import mark_safe
 from import_export.admin import ImportExportModelAdmin
+from .billing import generate_invoices
+from .resources import (
+    ApartmentResource, BulkApartmentResource, HouseResource, BulkHouseResource,
+    TenantResource, BulkTenantResource, InvoiceResource, BulkInvoiceResource,
+)
 from .models import (
     Profile, HouseBooking, Landlord, Invoice, 
-    Tenant, ApartmentType, Apartment, HouseType, House
+    Tenant, ApartmentType, Apartment, HouseType, House, ActivityEvent, MpesaTransaction,
+    LandlordStatement, ArrearsSnapshot, HouseOccupancyInterval
 )
 
 @admin.register(Profile)
@@ -26,6 +33,8 @@ class ApartmentTypeAdmin(ImportExportModelAdmin):
 
 @admin.register(Apartment)
 class ApartmentAdmin(ImportExportModelAdmin):
+    # The bulk resource skips save() per row; pick it for large files
+    resource_classes = [ApartmentResource, BulkApartmentResource]
     list_filter = ('name', 'location', 'owner', 'management_fee_percentage', 'date_added')
     search_fields = ('name', 'location', 'description')
     list_display = ('name', 'owner', 'location', 'description', 'management_fee_percentage', 'date_added')
@@ -38,35 +47,106 @@ class HouseTypeAdmin(ImportExportModelAdmin):
 
 @admin.register(House)
 class HouseAdmin(ImportExportModelAdmin):
+    resource_classes = [HouseResource, BulkHouseResource]
     list_filter = ('apartment', 'number', 'monthly_rent', 'date_added')
     search_fields = ('number', 'description')
     list_display = ('number', 'apartment', 'monthly_rent', 'deposit_amount', 'house_type', 'tenant')
 
+@admin.register(HouseOccupancyInterval)
+class HouseOccupancyIntervalAdmin(admin.ModelAdmin):
+    date_hierarchy = 'started_at'
+    list_filter = ('status',)
+    search_fields = ('house__number', 'house__apartment__name')
+    list_display = ('house', 'status', 'tenant', 'started_at', 'ended_at')
+    list_select_related = ('house__apartment', 'tenant')
+
+    # Written by House.save()
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
 @admin.register(Landlord)
 class LandlordAdmin(ImportExportModelAdmin):
     list_filter = ('date_added',)
     list_display = ['first_name', 'middle_name', 'id_number', 'email', 'phone_number']
     search_fields = ['first_name', 'middle_name', 'other_names', 'email', 'phone_number']
+    actions = ['generate_current_month_invoices']
+
+    @admin.action(description="Generate this month's invoices")
+    def generate_current_month_invoices(self, request, queryset):
+        today = timezone.localdate()
+        for landlord in queryset:
+            result = generate_invoices(today.month, today.year, landlord=landlord)
+            self.message_user(
+                request,
+                f"{landlord}: created {result['created']} invoice(s), "
+                f"skipped {result['skipped']} ({result['invoices_per_second'] or 0} invoices/s)",
+                messages.SUCCESS,
+            )
 
 @admin.register(Tenant)
 class TenantAdmin(ImportExportModelAdmin):
+    resource_classes = [TenantResource, BulkTenantResource]
     list_filter = ('occupation', 'date_added')
     search_fields = ('user__username', 'user__email', 'user__first_name', 'user__last_name')
     list_display = ('user', 'occupation', 'date_added')
 
 @admin.register(HouseBooking)
 class HouseBookingAdmin(ImportExportModelAdmin):
-    list_filter = ('tenant', 'house', 'date_added')
+    list_filter = ('status', 'tenant', 'house', 'date_added')
     search_fields = ('tenant__user__username', 'house__number')
-    list_display = ('tenant', 'house', 'deposit_amount', 'rent_amount_paid', 'date_added')
+    list_display = ('tenant', 'house', 'deposit_amount', 'rent_amount_paid', 'status', 'waitlist_position', 'date_added')
+    # Approval goes through the API's update_status, which claims the house
+    readonly_fields = ('status', 'waitlist_position')
 
 @admin.register(Invoice)
 class InvoiceAdmin(ImportExportModelAdmin):
+    resource_classes = [InvoiceResource, BulkInvoiceResource]
     # Changed 'paid' to 'payment_status' in both list_filter and list_display
     list_filter = ('month', 'year', 'payment_status', 'date_added')
     search_fields = ('tenant__user__username', 'house__number')
     list_display = ('tenant', 'house', 'month', 'year', 'rent', 'total_payable', 'payment_status', 'date_added')
 
+@admin.register(MpesaTransaction)
+class MpesaTransactionAdmin(admin.ModelAdmin):
+    list_filter = ('status', 'date_added')
+    search_fields = ('checkout_request_id', 'receipt_number', 'phone_number')
+    list_display = ('checkout_request_id', 'invoice', 'phone_number', 'amount', 'status', 'receipt_number', 'date_added')
+    list_select_related = ('invoice__tenant',)
+    readonly_fields = ('payment',)
+
+@admin.register(LandlordStatement)
+class LandlordStatementAdmin(admin.ModelAdmin):
+    date_hierarchy = 'period'
+    list_filter = ('period',)
+    search_fields = ('landlord__first_name', 'landlord__email')
+    list_display = ('period', 'landlord', 'rent_billed', 'rent_collected', 'management_fee', 'net_payout', 'generated_at')
+    list_select_related = ('landlord',)
+
+@admin.register(ArrearsSnapshot)
+class ArrearsSnapshotAdmin(admin.ModelAdmin):
+    date_hierarchy = 'snapshot_date'
+    list_filter = ('scope', 'snapshot_date')
+    list_display = ('snapshot_date', 'scope', 'object_id', 'landlord', 'days_0_30', 'days_31_60', 'days_61_90', 'days_over_90', 'total')
+    list_select_related = ('landlord',)
+
+@admin.register(ActivityEvent)
+class ActivityEventAdmin(admin.ModelAdmin):
+    date_hierarchy = 'created_at'
+    list_filter = ('event_type',)
+    search_fields = ('summary',)
+    list_display = ('created_at', 'event_type', 'summary', 'landlord', 'tenant', 'amount')
+    list_select_related = ('landlord', 'tenant')
+
+    # The log is append-only
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
 @admin.register(LogEntry)
 class LogEntryAdmin(admin.ModelAdmin):
     date_hierarchy = 'action_time'
@@ -0,0 +1,151 @@
+from datetime import date
+from decimal import Decimal, InvalidOperation
+
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend, SearchFilter
+
+from .. import search
+
+
+def parse_period(value, param):
+    """
+    Parse a period given as YYYY-MM or YYYY-MM-DD into the first day of that month.
+    """
+    try:
+        parts = [int(part) for part in value.split('-')[:2]]
+        return date(parts[0], parts[1], 1)
+    except (ValueError, IndexError):
+        raise ValidationError({param: "Use the format YYYY-MM or YYYY-MM-DD."})
+
+
+class InvoicePeriodFilter(BaseFilterBackend):
+    """
+    Filter invoices by billing period range: ?period_from=2025-01&period_to=2025-03.
+    Both bounds are inclusive months and hit the (tenant, period)/(house, period) indexes.
+    """
+    def filter_queryset(self, request, queryset, view):
+        period_from = request.query_params.get('period_from')
+        period_to = request.query_params.get('period_to')
+        if period_from:
+            queryset = queryset.filter(period__gte=parse_period(period_from, 'period_from'))
+        if period_to:
+            queryset = queryset.filter(period__lte=parse_period(period_to, 'period_to'))
+        return queryset
+
+
+class ArrearsSnapshotFilter(BaseFilterBackend):
+    """
+    Arrears history filters: ?scope=house&object_id=12 for one row's trend,
+    ?date_from= / ?date_to= (YYYY-MM-DD, inclusive) for a range of nights.
+    scope + object_id + date is backed by a composite index.
+    """
+    def get_date(self, request, name):
+        value = request.query_params.get(name)
+        if value in (None, ''):
+            return None
+        try:
+            return date.fromisoformat(value)
+        except ValueError:
+            raise ValidationError({name: "Use the format YYYY-MM-DD."})
+
+    def filter_queryset(self, request, queryset, view):
+        scope = request.query_params.get('scope')
+        if scope:
+            queryset = queryset.filter(scope=scope)
+        object_id = request.query_params.get('object_id')
+        if object_id:
+            if not object_id.isdigit():
+                raise ValidationError({'object_id': "A valid id is required."})
+            queryset = queryset.filter(object_id=object_id)
+
+        date_from = self.get_date(request, 'date_from')
+        if date_from:
+            queryset = queryset.filter(snapshot_date__gte=date_from)
+        date_to = self.get_date(request, 'date_to')
+        if date_to:
+            queryset = queryset.filter(snapshot_date__lte=date_to)
+        return queryset
+
+
+class HouseFilter(BaseFilterBackend):
+    """
+    Server-side house browsing filters:
+
+    * ?status=vacant (comma separated for several)
+    * ?min_rent= / ?max_rent= on monthly_rent
+    * ?house_type= (or house_type_id)
+    * ?apartment= (or apartment_id)
+    * ?location= matched against the apartment's location
+
+    status + rent and status + house type are backed by composite indexes.
+    """
+    def get_param(self, request, *names):
+        for name in names:
+            value = request.query_params.get(name)
+            if value not in (None, ''):
+                return name, value
+        return names[0], None
+
+    def get_decimal(self, request, name):
+        value = request.query_params.get(name)
+        if value in (None, ''):
+            return None
+        try:
+            return Decimal(value)
+        except InvalidOperation:
+            raise ValidationError({name: "A valid number is required."})
+
+    def get_id(self, request, *names):
+        name, value = self.get_param(request, *names)
+        if value is None:
+            return None
+        if not value.isdigit():
+            raise ValidationError({name: "A valid id is required."})
+        return int(value)
+
+    def filter_queryset(self, request, queryset, view):
+        status = request.query_params.get('status')
+        if status:
+            queryset = queryset.filter(status__in=status.split(','))
+
+        min_rent = self.get_decimal(request, 'min_rent')
+        if min_rent is not None:
+            queryset = queryset.filter(monthly_rent__gte=min_rent)
+        max_rent = self.get_decimal(request, 'max_rent')
+        if max_rent is not None:
+            queryset = queryset.filter(monthly_rent__lte=max_rent)
+
+        house_type = self.get_id(request, 'house_type', 'house_type_id')
+        if house_type is not None:
+            queryset = queryset.filter(house_type_id=house_type)
+        apartment = self.get_id(request, 'apartment', 'apartment_id')
+        if apartment is not None:
+            queryset = queryset.filter(apartment_id=apartment)
+
+        location = request.query_params.get('location')
+        if location:
+            queryset = queryset.filter(apartment__location__icontains=location)
+        return queryset
+
+
+class FullTextSearchFilter(SearchFilter):
+    """
+    ?search= backed by the FTS5 index in accounts.search, ranked best match first.
+
+    The MATCH is part of the (already role-scoped) queryset's SQL and each row
+    is annotated with its rank as `search_rank`, which get_ordering() hands to
+    the cursor paginator, so pagination alone bounds the results.
+    Falls back to DRF's icontains SearchFilter where FTS5 is unavailable.
+    """
+    def is_full_text(self, request, queryset):
+        return bool(self.get_search_terms(request)) and search.is_available(queryset.model, queryset.db)
+
+    def filter_queryset(self, request, queryset, view):
+        if not self.is_full_text(request, queryset):
+            return super().filter_queryset(request, queryset, view)
+        return search.matching(queryset, self.get_search_terms(request)).order_by('search_rank', 'id')
+
+    def get_ordering(self, request, queryset, view):
+        if self.is_full_text(request, queryset):
+            return ('search_rank', 'id')
+        return None
@@ -0,0 +1,39 @@
+from rest_framework.pagination import CursorPagination
+
+
+class KeysetCursorPagination(CursorPagination):
+    """
+    Cursor (keyset) pagination for every list endpoint.
+
+    Pages are located with `WHERE date_added < <cursor>` against the
+    (date_added, id) indexes instead of OFFSET, so a deep page costs the same
+    as the first one. The id tiebreaker keeps the order stable when rows share
+    a timestamp; such ties are walked with the cursor's small offset.
+
+    Views choose their key with `cursor_ordering`; clients may ask for up to
+    `max_page_size` rows with ?page_size=.
+    """
+    ordering = ('-date_added', '-id')
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+    def get_ordering(self, request, queryset, view):
+        # A filter that orders its results (e.g. search rank) takes precedence
+        for backend in getattr(view, 'filter_backends', []):
+            if hasattr(backend, 'get_ordering'):
+                ordering = backend().get_ordering(request, queryset, view)
+                if ordering:
+                    return tuple(ordering)
+
+        ordering = getattr(view, 'cursor_ordering', None)
+        if ordering:
+            return tuple(ordering)
+        return super().get_ordering(request, queryset, view)
+
+
+class ActivityFeedPagination(KeysetCursorPagination):
+    """
+    Latest-first activity feeds, newest 20 events per page
+    """
+    ordering = ('-created_at', '-id')
+    page_size = 20
@@ -0,0 +1,77 @@
+from django.core.exceptions import ObjectDoesNotExist
+from django.db.models import Q
+
+
+def get_landlord(user):
+    """
+    Return the user's Landlord profile, or None
+    """
+    try:
+        return user.landlord_profile
+    except (AttributeError, ObjectDoesNotExist):
+        return None
+
+
+def get_tenant(user):
+    """
+    Return the user's Tenant profile, or None
+    """
+    try:
+        return user.tenant_profile
+    except (AttributeError, ObjectDoesNotExist):
+        return None
+
+
+class RoleScopedQuerysetMixin:
+    """
+    Restrict a viewset's queryset to the rows the requesting user may see.
+
+    Visibility is expressed as a Q filter (JOINs or subqueries) so scoping costs
+    a fixed number of queries however large the landlord's portfolio is:
+
+    * staff see everything
+    * landlords see rows matching landlord_scope(), by default `landlord_lookup`
+    * tenants see rows matching tenant_scope(), by default `tenant_lookup`
+    * everyone else sees rows matching default_scope(), by default nothing
+
+    Lookups should only follow forward relations; scopes that cross a reverse
+    relation should filter on a `pk__in` subquery to avoid duplicate rows.
+    """
+    landlord_lookup = None
+    tenant_lookup = None
+
+    def landlord_scope(self, landlord):
+        if self.landlord_lookup is None:
+            return None
+        return Q(**{self.landlord_lookup: landlord})
+
+    def tenant_scope(self, tenant):
+        if self.tenant_lookup is None:
+            return None
+        return Q(**{self.tenant_lookup: tenant})
+
+    def default_scope(self):
+        return None
+
+    def get_scope(self, user):
+        if user.is_staff:
+            return Q()
+
+        landlord = get_landlord(user)
+        if landlord is not None:
+            return self.landlord_scope(landlord)
+
+        tenant = get_tenant(user)
+        if tenant is not None:
+            return self.tenant_scope(tenant)
+
+        return self.default_scope()
+
+    def scope_queryset(self, queryset):
+        scope = self.get_scope(self.request.user)
+        if scope is None:
+            return queryset.none()
+        return queryset.filter(scope)
+
+    def get_queryset(self):
+        return self.scope_queryset(super().get_queryset())
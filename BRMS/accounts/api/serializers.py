@@ -1,10 +1,14 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Count, Q
 from django.contrib.auth.password_validation import validate_password
 from ..models import (
     Profile, Role, Landlord, ApartmentType, Apartment,
-    HouseType, Tenant, House, HouseBooking, Invoice, Payment
+    HouseType, Tenant, House, HouseBooking, Invoice, Payment, ActivityEvent, LandlordStatement,
+    ArrearsSnapshot
 )
+from ..bookings import next_waitlist_position
 
 class UserSerializer(serializers.ModelSerializer):
     password = serializers.CharField(
@@ -204,13 +208,17 @@ class ApartmentSerializer(serializers.ModelSerializer):
     owner = serializers.PrimaryKeyRelatedField(queryset=Landlord.objects.all())
     owner_detail = serializers.SerializerMethodField(read_only=True)
     houses_count = serializers.SerializerMethodField(read_only=True)
+    vacant_houses = serializers.SerializerMethodField(read_only=True)
+    occupied_houses = serializers.SerializerMethodField(read_only=True)
+    occupancy_rate = serializers.SerializerMethodField(read_only=True)
     
     class Meta:
         model = Apartment
         fields = [
             'id', 'name', 'apartment_type', 'apartment_type_detail', 'location', 
             'description', 'owner', 'owner_detail', 'management_fee_percentage', 
-            'total_houses', 'houses_count', 'date_added', 'image'
+            'total_houses', 'houses_count', 'vacant_houses', 'occupied_houses',
+            'occupancy_rate', 'date_added', 'image'
         ]
         read_only_fields = ['date_added', 'total_houses']
     
@@ -226,8 +234,43 @@ class ApartmentSerializer(serializers.ModelSerializer):
             'name': f"{obj.owner.first_name} {obj.owner.middle_name or ''}".strip()
         }
     
+    @staticmethod
+    def occupancy_annotations():
+        """
+        Annotations ApartmentViewSet adds so the counts below come from the list query
+        """
+        return {
+            'houses_count': Count('houses'),
+            'vacant_houses': Count('houses', filter=Q(houses__status='vacant')),
+            'occupied_houses': Count('houses', filter=Q(houses__status='occupied')),
+        }
+    
+    def get_occupancy(self, obj):
+        # Instances that did not come from the annotated queryset (e.g. just created)
+        if not hasattr(obj, 'houses_count'):
+            counts = obj.houses.aggregate(
+                houses_count=Count('pk'),
+                vacant_houses=Count('pk', filter=Q(status='vacant')),
+                occupied_houses=Count('pk', filter=Q(status='occupied')),
+            )
+            for name, value in counts.items():
+                setattr(obj, name, value)
+        return obj
+    
     def get_houses_count(self, obj):
-        return obj.houses.count()
+        return self.get_occupancy(obj).houses_count
+    
+    def get_vacant_houses(self, obj):
+        return self.get_occupancy(obj).vacant_houses
+    
+    def get_occupied_houses(self, obj):
+        return self.get_occupancy(obj).occupied_houses
+    
+    def get_occupancy_rate(self, obj):
+        obj = self.get_occupancy(obj)
+        if not obj.houses_count:
+            return 0.0
+        return round(obj.occupied_houses * 100 / obj.houses_count, 1)
 
 class HouseBookingSerializer(serializers.ModelSerializer):
     house = serializers.PrimaryKeyRelatedField(queryset=House.objects.all())
@@ -241,9 +284,19 @@ class HouseBookingSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'house', 'house_detail', 'tenant', 'tenant_detail', 'deposit_amount', 
             'rent_amount_paid', 'status', 'status_display', 'booking_date', 
-            'move_in_date', 'date_added'
+            'move_in_date', 'date_added', 'waitlist_position'
         ]
-        read_only_fields = ['date_added', 'booking_date', 'status_display']
+        # Status only changes through update_status, which approves through
+        # approve_booking() and promotes the waitlist
+        read_only_fields = ['date_added', 'booking_date', 'status', 'status_display', 'waitlist_position']
+
+    def get_fields(self):
+        fields = super().get_fields()
+        # A booking stays with the house and tenant it was made for
+        if self.instance is not None:
+            fields['house'] = serializers.PrimaryKeyRelatedField(read_only=True)
+            fields['tenant'] = serializers.PrimaryKeyRelatedField(read_only=True)
+        return fields
     
     def get_house_detail(self, obj):
         return {
@@ -260,16 +313,29 @@ class HouseBookingSerializer(serializers.ModelSerializer):
             'phone_number': obj.tenant.phone_number
         }
     
-    def validate(self, attrs):
+    def create(self, validated_data):
         """
-        Additional validation for house bookings
-        Ensures house is available and validates booking details
+        Book a vacant house, or join its waitlist if it is taken or others
+        are already queueing for it
         """
-        house = attrs.get('house')
-        if house and house.status != 'vacant':
-            raise serializers.ValidationError({"house": "This house is not available for booking"})
-        
-        return attrs
+        # With the house row locked, so the house cannot be taken, nor the
+        # queue grow, between the checks and the insert
+        with transaction.atomic():
+            house = validated_data['house']
+            house_status = (
+                House.objects.select_for_update().filter(pk=house.pk)
+                .values_list('status', flat=True).first()
+            )
+            tenant = validated_data.get('tenant')
+            if HouseBooking.objects.filter(house=house, tenant=tenant, status__in=['pending', 'waitlisted']).exists():
+                raise serializers.ValidationError({"house": "This tenant already has an open booking for this house"})
+
+            position = next_waitlist_position(house.pk)
+            if house_status == 'vacant' and position is None:
+                validated_data['status'] = 'pending'
+            else:
+                validated_data.update(status='waitlisted', waitlist_position=position or 1)
+            return super().create(validated_data)
 
 class InvoiceSerializer(serializers.ModelSerializer):
     tenant = serializers.PrimaryKeyRelatedField(queryset=Tenant.objects.all())
@@ -283,11 +349,11 @@ class InvoiceSerializer(serializers.ModelSerializer):
         model = Invoice
         fields = [
             'id', 'tenant', 'tenant_detail', 'house', 'house_detail', 'month', 'year', 
-            'rent', 'additional_charges', 'discount', 'total_payable', 
+            'period', 'rent', 'additional_charges', 'discount', 'total_payable', 
             'amount_paid', 'remaining_amount', 'payment_status', 
             'payment_status_display', 'due_date', 'date_added'
         ]
-        read_only_fields = ['date_added', 'total_payable', 'payment_status', 'payment_status_display', 'amount_paid']
+        read_only_fields = ['date_added', 'period', 'total_payable', 'payment_status', 'payment_status_display', 'amount_paid']
     
     def get_tenant_detail(self, obj):
         return {
@@ -330,6 +396,8 @@ class PaymentSerializer(serializers.ModelSerializer):
             'payment_method_display', 'transaction_reference', 
             'payment_date', 'notes'
         ]
+        # The UniqueTogetherValidator ModelSerializer derives from the
+        # payment_unique_reference constraint makes a replayed reference a 400
         read_only_fields = ['payment_date', 'payment_method_display']
     
     def get_invoice_detail(self, obj):
@@ -342,6 +410,36 @@ class PaymentSerializer(serializers.ModelSerializer):
             'total_payable': obj.invoice.total_payable,
             'amount_paid': obj.invoice.amount_paid
         }
+
+class ActivityEventSerializer(serializers.ModelSerializer):
+    event_type_display = serializers.CharField(source='get_event_type_display', read_only=True)
+
+    class Meta:
+        model = ActivityEvent
+        fields = [
+            'id', 'event_type', 'event_type_display', 'object_id', 'summary',
+            'amount', 'landlord', 'tenant', 'created_at'
+        ]
+        read_only_fields = fields
+
+class LandlordStatementSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = LandlordStatement
+        fields = [
+            'id', 'landlord', 'period', 'rent_billed', 'rent_collected', 'management_fee',
+            'net_payout', 'payments_count', 'apartments', 'generated_at'
+        ]
+        read_only_fields = fields
+
+class ArrearsSnapshotSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ArrearsSnapshot
+        fields = [
+            'id', 'snapshot_date', 'scope', 'object_id', 'landlord', 'days_0_30', 'days_31_60',
+            'days_61_90', 'days_over_90', 'total', 'invoices_count'
+        ]
+        read_only_fields = fields
+
     # Authentication Serializers
 from rest_framework.authtoken.serializers import AuthTokenSerializer
 from django.contrib.auth import authenticate
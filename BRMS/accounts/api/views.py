@@ -1,28 +1,53 @@
+import csv
+import datetime
+import io
+
 from django.contrib.auth import authenticate
 from django.contrib.auth.models import User
-from django.db import transaction
+from django.db import IntegrityError, transaction
+from django.db.models import Q
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
 
 from rest_framework import status, filters
 from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAuthenticated, BasePermission, SAFE_METHODS, AllowAny
 from rest_framework.response import Response
 from rest_framework.authtoken.views import ObtainAuthToken
-from rest_framework.viewsets import ModelViewSet
+from rest_framework.viewsets import ModelViewSet, ReadOnlyModelViewSet
 from rest_framework.authentication import TokenAuthentication, SessionAuthentication
 from rest_framework.authtoken.models import Token
 from rest_framework.parsers import MultiPartParser, FormParser
 
+from ..aging import aging_report
+from ..billing import generate_invoices
+from ..bookings import BookingConflict, approve_booking, promote_next
+from ..notifications import NOTIFICATION_EVENT_TYPES
+from ..occupancy import occupancy_report
+from ..payments import MAX_BATCH_SIZE as MAX_INGEST_BATCH_SIZE, ingest_payments
+from ..reconciliation import reconcile_statement
+from ..statements import generate_statements, next_period, statement_period
+from ..stats import dashboard_stats
 from ..models import (
     Profile, Landlord, Tenant, ApartmentType, Apartment,
-    HouseType, House, HouseBooking, Invoice, Payment, Role
+    HouseType, House, HouseBooking, Invoice, Payment, Role, ActivityEvent, LandlordStatement,
+    ArrearsSnapshot, HouseOccupancyInterval
 )
+from .filters import ArrearsSnapshotFilter, FullTextSearchFilter, HouseFilter, InvoicePeriodFilter, parse_period
+from .mixins import RelatedQuerysetMixin, ReplicaReadMixin, StreamingExportMixin, paginated_response
+from .pagination import ActivityFeedPagination
+from .scoping import RoleScopedQuerysetMixin, get_landlord, get_tenant
 from .serializers import (
     UserSerializer, ProfileSerializer, RoleSerializer, LandlordSerializer, TenantSerializer,
     ApartmentTypeSerializer, HouseTypeSerializer, ApartmentSerializer,
-    HouseSerializer, HouseBookingSerializer, InvoiceSerializer, PaymentSerializer,CustomAuthTokenSerializer
+    HouseSerializer, HouseBookingSerializer, InvoiceSerializer, PaymentSerializer,CustomAuthTokenSerializer,
+    ActivityEventSerializer, LandlordStatementSerializer, ArrearsSnapshotSerializer
 )
 
+# Unmatched statement lines returned inline; the command writes the full report
+RECONCILE_REVIEW_LIMIT = 1000
+
 # Custom Permissions
 class IsAdminUser(BasePermission):
     """
@@ -164,12 +189,44 @@ def logout_user(request):
     except Exception as e:
         return error_response(f"Logout failed: {str(e)}")
 
+# Dashboard Views
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def landlord_stats(request):
+    """
+    Dashboard statistics for the authenticated landlord's portfolio
+    """
+    landlord = get_landlord(request.user)
+    if landlord is None:
+        return error_response("No landlord profile found", status.HTTP_403_FORBIDDEN)
+    return Response(dashboard_stats('landlord', landlord=landlord))
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def tenant_stats(request):
+    """
+    Dashboard statistics for the authenticated tenant
+    """
+    tenant = get_tenant(request.user)
+    if tenant is None:
+        return error_response("No tenant profile found", status.HTTP_403_FORBIDDEN)
+    return Response(dashboard_stats('tenant', tenant=tenant))
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def admin_stats(request):
+    """
+    Dashboard statistics for the whole portfolio
+    """
+    return Response(dashboard_stats('admin'))
+
 # User and Profile ViewSets
 class UserViewSet(ModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
     authentication_classes = [TokenAuthentication, SessionAuthentication]
     permission_classes = [IsAuthenticated]
+    cursor_ordering = ('-date_joined', '-id')
     
     def get_permissions(self):
         if self.action == 'create':
@@ -205,18 +262,23 @@ class UserViewSet(ModelViewSet):
         except Exception as e:
             return error_response(f"Error retrieving user data: {str(e)}")
 
-class ProfileViewSet(ModelViewSet):
+class ProfileViewSet(RelatedQuerysetMixin, ModelViewSet):
     queryset = Profile.objects.all()
     serializer_class = ProfileSerializer
     authentication_classes = [TokenAuthentication, SessionAuthentication]
     permission_classes = [IsAuthenticated, IsOwnerOrAdmin]
     parser_classes = [MultiPartParser, FormParser]
+    cursor_ordering = ('-id',)
+    related_by_action = {
+        'default': (('user',), ()),
+        'destroy': ((), ()),
+    }
     
     def get_queryset(self):
         # Admin can see all profiles, other users only see their own
         if self.request.user.is_staff:
-            return Profile.objects.all()
-        return Profile.objects.filter(user=self.request.user)
+            return self.with_related(Profile.objects.all())
+        return self.with_related(Profile.objects.filter(user=self.request.user))
     
     def perform_create(self, serializer):
         # This method automatically associates the new profile with the current user
@@ -251,11 +313,16 @@ class ProfileViewSet(ModelViewSet):
         except Exception as e:
             return error_response(f"Profile update failed: {str(e)}")
 
-class RoleViewSet(ModelViewSet):
+class RoleViewSet(RelatedQuerysetMixin, ModelViewSet):
     queryset = Role.objects.all()
     serializer_class = RoleSerializer
     authentication_classes = [TokenAuthentication, SessionAuthentication]
     permission_classes = [IsAuthenticated]
+    cursor_ordering = ('-date_assigned', '-id')
+    related_by_action = {
+        'default': (('user',), ()),
+        'destroy': ((), ()),
+    }
     
     def get_permissions(self):
         if self.action in ['list', 'retrieve']:
@@ -265,8 +332,8 @@ class RoleViewSet(ModelViewSet):
     def get_queryset(self):
         # Admin can see all roles, other users only see their own
         if self.request.user.is_staff:
-            return Role.objects.all()
-        return Role.objects.filter(user=self.request.user)
+            return self.with_related(Role.objects.all())
+        return self.with_related(Role.objects.filter(user=self.request.user))
     
     @action(detail=False, methods=['get'])
     def my_role(self, request):
@@ -281,11 +348,15 @@ class RoleViewSet(ModelViewSet):
             return error_response(f"Error retrieving role: {str(e)}")
 
 # Landlord ViewSet
-class LandlordViewSet(ModelViewSet):
+class LandlordViewSet(ReplicaReadMixin, RelatedQuerysetMixin, RoleScopedQuerysetMixin, ModelViewSet):
     queryset = Landlord.objects.all()
     serializer_class = LandlordSerializer
     authentication_classes = [TokenAuthentication, SessionAuthentication]
     permission_classes = [IsAuthenticated]
+    related_by_action = {
+        'default': (('user',), ()),
+        'destroy': ((), ()),
+    }
     filter_backends = [filters.SearchFilter]
     search_fields = ['first_name', 'middle_name', 'email', 'phone_number']
     
@@ -294,25 +365,12 @@ class LandlordViewSet(ModelViewSet):
             return [IsLandlordOrAdmin()]
         return [IsAuthenticated()]
     
-    def get_queryset(self):
-        # Admin can see all landlords, landlords see themselves, tenants see connected landlords
-        if self.request.user.is_staff:
-            return Landlord.objects.all()
-            
-        try:
-            if hasattr(self.request.user, 'landlord_profile'):
-                return Landlord.objects.filter(id=self.request.user.landlord_profile.id)
-            elif hasattr(self.request.user, 'tenant_profile'):
-                # Get landlords connected to tenant's apartments
-                tenant_houses = House.objects.filter(tenant=self.request.user.tenant_profile)
-                landlord_ids = set()
-                for house in tenant_houses:
-                    landlord_ids.add(house.apartment.owner.id)
-                return Landlord.objects.filter(id__in=landlord_ids)
-        except:
-            pass
-            
-        return Landlord.objects.none()
+    # Admin can see all landlords, landlords see themselves, tenants see connected landlords
+    def landlord_scope(self, landlord):
+        return Q(pk=landlord.pk)
+    
+    def tenant_scope(self, tenant):
+        return Q(pk__in=House.objects.filter(tenant=tenant).values('apartment__owner'))
     
     @action(detail=False, methods=['get'])
     def my_landlord_profile(self, request):
@@ -328,13 +386,24 @@ class LandlordViewSet(ModelViewSet):
             return error_response(f"Error retrieving landlord profile: {str(e)}")
 
 # Tenant ViewSet
-class TenantViewSet(ModelViewSet):
+class TenantViewSet(ReplicaReadMixin, RelatedQuerysetMixin, StreamingExportMixin, RoleScopedQuerysetMixin, ModelViewSet):
     queryset = Tenant.objects.all()
     serializer_class = TenantSerializer
     authentication_classes = [TokenAuthentication, SessionAuthentication]
     permission_classes = [IsAuthenticated]
-    filter_backends = [filters.SearchFilter]
+    cursor_ordering = ('date_added', 'id')
+    related_by_action = {
+        'default': (('user',), ()),
+        'destroy': ((), ()),
+    }
+    filter_backends = [FullTextSearchFilter]
     search_fields = ['first_name', 'last_name', 'email', 'phone_number']
+    export_fields = [
+        ('id', 'pk'), ('username', 'user__username'), ('first_name', 'first_name'), ('last_name', 'last_name'),
+        ('id_number_or_passport', 'id_number_or_passport'), ('email', 'email'), ('phone_number', 'phone_number'),
+        ('physical_address', 'physical_address'), ('occupation', 'occupation'), ('workplace', 'workplace'),
+        ('emergency_contact_phone', 'emergency_contact_phone'), ('date_added', 'date_added'),
+    ]
     
     def get_permissions(self):
         if self.action == 'create':
@@ -343,27 +412,12 @@ class TenantViewSet(ModelViewSet):
             return [IsTenantOrAdmin()]  # Only tenants or admins can modify
         return [IsAuthenticated()]
     
-    def get_queryset(self):
-        # Admin can see all tenants, tenants see themselves, landlords see connected tenants
-        if self.request.user.is_staff:
-            return Tenant.objects.all()
-            
-        try:
-            if hasattr(self.request.user, 'tenant_profile'):
-                return Tenant.objects.filter(id=self.request.user.tenant_profile.id)
-            elif hasattr(self.request.user, 'landlord_profile'):
-                # Get tenants connected to landlord's apartments
-                landlord_apts = Apartment.objects.filter(owner=self.request.user.landlord_profile)
-                tenant_ids = set()
-                for apt in landlord_apts:
-                    for house in apt.houses.all():
-                        if house.tenant:
-                            tenant_ids.add(house.tenant.id)
-                return Tenant.objects.filter(id__in=tenant_ids)
-        except:
-            pass
-            
-        return Tenant.objects.none()
+    # Admin can see all tenants, tenants see themselves, landlords see connected tenants
+    def landlord_scope(self, landlord):
+        return Q(pk__in=House.objects.filter(apartment__owner=landlord).values('tenant'))
+    
+    def tenant_scope(self, tenant):
+        return Q(pk=tenant.pk)
     
     def create(self, request, *args, **kwargs):
         """
@@ -426,36 +480,39 @@ class HouseTypeViewSet(ModelViewSet):
         return [IsAuthenticated()]
 
 # Apartment ViewSet
-class ApartmentViewSet(ModelViewSet):
+class ApartmentViewSet(ReplicaReadMixin, RelatedQuerysetMixin, RoleScopedQuerysetMixin, ModelViewSet):
     queryset = Apartment.objects.all()
     serializer_class = ApartmentSerializer
     authentication_classes = [TokenAuthentication, SessionAuthentication]
     permission_classes = [IsAuthenticated]
-    filter_backends = [filters.SearchFilter]
+    related_by_action = {
+        'default': (('apartment_type', 'owner'), ()),
+        'destroy': ((), ()),
+    }
+    filter_backends = [FullTextSearchFilter]
     search_fields = ['name', 'location', 'description']
     
     def get_permissions(self):
-        if self.action in ['create', 'update', 'partial_update', 'destroy']:
+        if self.action in ['create', 'update', 'partial_update', 'destroy', 'occupancy']:
             return [IsLandlordOrAdmin()]
         return [IsAuthenticated()]
     
+    # Landlord sees only their apartments
+    landlord_lookup = 'owner'
+    
     def get_queryset(self):
-        # Filter apartments based on user role
-        queryset = Apartment.objects.all()
-        
-        # Admin sees all apartments
-        if self.request.user.is_staff:
+        queryset = super().get_queryset()
+        if self.action == 'destroy':
             return queryset
-        
-        # Landlord sees only their apartments
-        try:
-            if hasattr(self.request.user, 'landlord_profile'):
-                return queryset.filter(owner=self.request.user.landlord_profile)
-        except:
-            pass
-        
-        # Everyone else sees all apartments (for browsing)
-        return queryset
+        # House counts and occupancy come from the same query as the apartments
+        return queryset.annotate(**ApartmentSerializer.occupancy_annotations())
+    
+    # Everyone else sees all apartments (for browsing)
+    def tenant_scope(self, tenant):
+        return Q()
+    
+    def default_scope(self):
+        return Q()
     
     @action(detail=True, methods=['get'])
     def houses(self, request, pk=None):
@@ -464,54 +521,83 @@ class ApartmentViewSet(ModelViewSet):
         """
         try:
             apartment = self.get_object()
-            houses = House.objects.filter(apartment=apartment)
+            houses = House.objects.filter(apartment=apartment).select_related('apartment', 'house_type', 'tenant__user')
             
             # For tenants, only show vacant houses or their own
             if hasattr(request.user, 'tenant_profile') and not request.user.is_staff:
                 tenant = request.user.tenant_profile
                 houses = houses.filter(status='vacant') | houses.filter(tenant=tenant)
             
-            serializer = HouseSerializer(houses, many=True)
-            return Response(serializer.data)
+            return paginated_response(self, houses, HouseSerializer)
         except Exception as e:
             return error_response(f"Error retrieving houses: {str(e)}")
 
+    @action(detail=False, methods=['get'])
+    def occupancy(self, request):
+        """
+        Vacancy rate, average days vacant and move-ins per apartment for the
+        months ?period_from= to ?period_to= (YYYY-MM, default this month),
+        optionally for one ?apartment=
+        """
+        today = timezone.localdate()
+        period_from = request.query_params.get('period_from')
+        period_to = request.query_params.get('period_to')
+        first = parse_period(period_from, 'period_from') if period_from else today.replace(day=1)
+        last = parse_period(period_to, 'period_to') if period_to else first
+        if last < first:
+            return error_response("period_to must not be before period_from")
+        start = timezone.make_aware(datetime.datetime(first.year, first.month, 1))
+        end = next_period(timezone.make_aware(datetime.datetime(last.year, last.month, 1)))
+
+        intervals = HouseOccupancyInterval.objects.all()
+        if not request.user.is_staff:
+            intervals = intervals.filter(house__apartment__owner=get_landlord(request.user))
+        apartment_id = request.query_params.get('apartment')
+        if apartment_id:
+            if not apartment_id.isdigit():
+                return error_response("A valid apartment id is required")
+            intervals = intervals.filter(house__apartment_id=apartment_id)
+
+        return Response({
+            'period_from': first,
+            'period_to': last,
+            'results': occupancy_report(start, end, intervals),
+        })
+
 # House ViewSet
-class HouseViewSet(ModelViewSet):
+class HouseViewSet(ReplicaReadMixin, RelatedQuerysetMixin, StreamingExportMixin, RoleScopedQuerysetMixin, ModelViewSet):
     queryset = House.objects.all()
     serializer_class = HouseSerializer
     authentication_classes = [TokenAuthentication, SessionAuthentication]
     permission_classes = [IsAuthenticated]
-    filter_backends = [filters.SearchFilter]
+    related_by_action = {
+        'default': (('apartment', 'house_type', 'tenant__user'), ()),
+        'destroy': ((), ()),
+    }
+    filter_backends = [FullTextSearchFilter, HouseFilter]
     search_fields = ['number', 'description', 'apartment__name', 'apartment__location']
+    export_fields = [
+        ('id', 'pk'), ('number', 'number'), ('apartment_id', 'apartment_id'), ('apartment', 'apartment__name'),
+        ('location', 'apartment__location'), ('house_type', 'house_type__name'), ('monthly_rent', 'monthly_rent'),
+        ('deposit_amount', 'deposit_amount'), ('status', 'status'), ('tenant_id', 'tenant_id'),
+        ('date_added', 'date_added'),
+    ]
     
     def get_permissions(self):
         if self.action in ['create', 'update', 'partial_update', 'destroy']:
             return [IsLandlordOrAdmin()]
         return [IsAuthenticated()]
     
-    def get_queryset(self):
-        # Filter houses based on user role
-        queryset = House.objects.all()
-        
-        # Admin sees all houses
-        if self.request.user.is_staff:
-            return queryset
-        
-        # Landlord sees houses in their apartments
-        try:
-            if hasattr(self.request.user, 'landlord_profile'):
-                landlord_apartments = Apartment.objects.filter(owner=self.request.user.landlord_profile)
-                return queryset.filter(apartment__in=landlord_apartments)
-            # Tenant sees vacant houses and their own
-            elif hasattr(self.request.user, 'tenant_profile'):
-                tenant = self.request.user.tenant_profile
-                return queryset.filter(status='vacant') | queryset.filter(tenant=tenant)
-        except:
-            pass
-        
-        # Default to showing only vacant houses
-        return queryset.filter(status='vacant')
+    # Landlord sees houses in their apartments
+    landlord_lookup = 'apartment__owner'
+    
+    # Tenant sees vacant houses and their own
+    def tenant_scope(self, tenant):
+        return Q(status='vacant') | Q(tenant=tenant)
+    
+    # Default to showing only vacant houses
+    def default_scope(self):
+        return Q(status='vacant')
     
     @action(detail=False, methods=['get'])
     def vacant(self, request):
@@ -519,9 +605,8 @@ class HouseViewSet(ModelViewSet):
         Get all vacant houses
         """
         try:
-            houses = House.objects.filter(status='vacant')
-            serializer = self.get_serializer(houses, many=True)
-            return Response(serializer.data)
+            houses = self.filter_queryset(self.with_related(House.objects.filter(status='vacant')))
+            return paginated_response(self, houses)
         except Exception as e:
             return error_response(f"Error retrieving vacant houses: {str(e)}")
     
@@ -578,6 +663,8 @@ class HouseViewSet(ModelViewSet):
             house.tenant = None
             house.status = 'vacant'
             house.save()
+            # Offer the house to the first booking on its waitlist
+            promote_next(house.pk)
             
             serializer = self.get_serializer(house)
             return Response(serializer.data)
@@ -585,11 +672,15 @@ class HouseViewSet(ModelViewSet):
             return error_response(f"Error vacating house: {str(e)}")
 
 # HouseBooking ViewSet
-class HouseBookingViewSet(ModelViewSet):
+class HouseBookingViewSet(ReplicaReadMixin, RelatedQuerysetMixin, RoleScopedQuerysetMixin, ModelViewSet):
     queryset = HouseBooking.objects.all()
     serializer_class = HouseBookingSerializer
     authentication_classes = [TokenAuthentication, SessionAuthentication]
     permission_classes = [IsAuthenticated]
+    related_by_action = {
+        'default': (('house__apartment', 'tenant__user'), ()),
+        'destroy': ((), ()),
+    }
     
     def get_permissions(self):
         if self.action == 'create':
@@ -598,40 +689,18 @@ class HouseBookingViewSet(ModelViewSet):
             return [IsLandlordOrAdmin()]  # Only landlords or admins can update/delete
         return [IsAuthenticated()]
     
-    def get_queryset(self):
-        # Filter bookings based on user role
-        queryset = HouseBooking.objects.all()
-        
-        # Admin sees all bookings
-        if self.request.user.is_staff:
-            return queryset
-        
-        try:
-            # Landlord sees bookings for their apartments
-            if hasattr(self.request.user, 'landlord_profile'):
-                landlord_apartments = Apartment.objects.filter(owner=self.request.user.landlord_profile)
-                landlord_houses = House.objects.filter(apartment__in=landlord_apartments)
-                return queryset.filter(house__in=landlord_houses)
-            # Tenant sees only their bookings
-            elif hasattr(self.request.user, 'tenant_profile'):
-                return queryset.filter(tenant=self.request.user.tenant_profile)
-        except:
-            pass
-            
-        return HouseBooking.objects.none()
+    # Landlord sees bookings for their apartments, tenant sees only their bookings
+    landlord_lookup = 'house__apartment__owner'
+    tenant_lookup = 'tenant'
     
     def create(self, request, *args, **kwargs):
         """
-        Create a new house booking
+        Create a new house booking; a booking for a house that is taken joins
+        its waitlist
         """
         try:
             serializer = self.get_serializer(data=request.data)
             if serializer.is_valid():
-                # Check if house is available
-                house = serializer.validated_data['house']
-                if house.status != 'vacant':
-                    return error_response("House is not available for booking")
-                
                 # Automatically set tenant to current user's tenant profile if not specified
                 if 'tenant' not in serializer.validated_data and hasattr(request.user, 'tenant_profile'):
                     serializer.validated_data['tenant'] = request.user.tenant_profile
@@ -639,6 +708,8 @@ class HouseBookingViewSet(ModelViewSet):
                 booking = serializer.save()
                 return Response(serializer.data, status=status.HTTP_201_CREATED)
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        except ValidationError as e:
+            return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             return error_response(f"Error creating booking: {str(e)}")
     
@@ -657,61 +728,57 @@ class HouseBookingViewSet(ModelViewSet):
                 
             if status_value not in dict(HouseBooking.STATUS_CHOICES):
                 return error_response("Invalid status value")
+            if status_value == 'waitlisted':
+                return error_response("Bookings join the waitlist when they are made for a house that is taken")
             
-            # If approving booking, check if house is still available
-            if status_value == 'approved' and booking.house.status != 'vacant':
-                return error_response("House is no longer available")
-            
-            # Update booking status
-            booking.status = status_value
-            booking.save()
-            
-            # If approved, update the house
             if status_value == 'approved':
-                house = booking.house
-                house.tenant = booking.tenant
-                house.save()
+                # Claims the house atomically and rejects competing bookings
+                approve_booking(booking.pk)
+                booking = self.get_object()
+            else:
+                was_pending = booking.status == 'pending'
+                booking.status = status_value
+                booking.save()
+                if was_pending:
+                    # The house is free again for whoever is next in line
+                    promote_next(booking.house_id)
             
             serializer = self.get_serializer(booking)
             return Response(serializer.data)
+        except BookingConflict as e:
+            return error_response(str(e), status.HTTP_409_CONFLICT)
         except Exception as e:
             return error_response(f"Error updating booking status: {str(e)}")
 
 # Invoice ViewSet
-class InvoiceViewSet(ModelViewSet):
+class InvoiceViewSet(ReplicaReadMixin, RelatedQuerysetMixin, StreamingExportMixin, RoleScopedQuerysetMixin, ModelViewSet):
     queryset = Invoice.objects.all()
     serializer_class = InvoiceSerializer
     authentication_classes = [TokenAuthentication, SessionAuthentication]
     permission_classes = [IsAuthenticated]
-    filter_backends = [filters.SearchFilter]
+    related_by_action = {
+        'default': (('tenant__user', 'house__apartment'), ()),
+        'destroy': ((), ()),
+    }
+    filter_backends = [FullTextSearchFilter, InvoicePeriodFilter]
     search_fields = ['tenant__user__username', 'tenant__first_name', 'tenant__last_name', 'house__number']
+    export_fields = [
+        ('id', 'pk'), ('tenant_id', 'tenant_id'), ('tenant_first_name', 'tenant__first_name'),
+        ('tenant_last_name', 'tenant__last_name'), ('house_id', 'house_id'), ('house', 'house__number'),
+        ('apartment', 'house__apartment__name'), ('month', 'month'), ('year', 'year'), ('period', 'period'),
+        ('rent', 'rent'), ('additional_charges', 'additional_charges'), ('discount', 'discount'),
+        ('total_payable', 'total_payable'), ('amount_paid', 'amount_paid'), ('payment_status', 'payment_status'),
+        ('due_date', 'due_date'), ('date_added', 'date_added'),
+    ]
     
     def get_permissions(self):
-        if self.action in ['create', 'update', 'partial_update', 'destroy']:
+        if self.action in ['create', 'update', 'partial_update', 'destroy', 'generate']:
             return [IsLandlordOrAdmin()]
         return [IsAuthenticated()]
     
-    def get_queryset(self):
-        # Filter invoices based on user role
-        queryset = Invoice.objects.all()
-        
-        # Admin sees all invoices
-        if self.request.user.is_staff:
-            return queryset
-        
-        try:
-            # Landlord sees invoices for their apartments
-            if hasattr(self.request.user, 'landlord_profile'):
-                landlord_apartments = Apartment.objects.filter(owner=self.request.user.landlord_profile)
-                landlord_houses = House.objects.filter(apartment__in=landlord_apartments)
-                return queryset.filter(house__in=landlord_houses)
-            # Tenant sees only their invoices
-            elif hasattr(self.request.user, 'tenant_profile'):
-                return queryset.filter(tenant=self.request.user.tenant_profile)
-        except:
-            pass
-            
-        return Invoice.objects.none()
+    # Landlord sees invoices for their apartments, tenant sees only their invoices
+    landlord_lookup = 'house__apartment__owner'
+    tenant_lookup = 'tenant'
     
     @action(detail=False, methods=['get'])
     def my_invoices(self, request):
@@ -722,9 +789,8 @@ class InvoiceViewSet(ModelViewSet):
             if not hasattr(request.user, 'tenant_profile'):
                 return error_response("No tenant profile found", status.HTTP_404_NOT_FOUND)
                 
-            invoices = Invoice.objects.filter(tenant=request.user.tenant_profile)
-            serializer = self.get_serializer(invoices, many=True)
-            return Response(serializer.data)
+            invoices = self.filter_queryset(self.with_related(Invoice.objects.filter(tenant=request.user.tenant_profile)))
+            return paginated_response(self, invoices)
         except Exception as e:
             return error_response(f"Error retrieving invoices: {str(e)}")
     
@@ -735,47 +801,66 @@ class InvoiceViewSet(ModelViewSet):
         """
         try:
             # Filter for unpaid and overdue invoices
-            invoices = self.get_queryset().filter(payment_status__in=['unpaid', 'overdue'])
-            serializer = self.get_serializer(invoices, many=True)
-            return Response(serializer.data)
+            invoices = self.filter_queryset(self.get_queryset()).filter(payment_status__in=['unpaid', 'overdue'])
+            return paginated_response(self, invoices)
         except Exception as e:
             return error_response(f"Error retrieving unpaid invoices: {str(e)}")
+    
+    @action(detail=False, methods=['post'])
+    def generate(self, request):
+        """
+        Bulk-create the invoices for a billing month.
+        Landlords always bill their own houses; admins may pass landlord_id.
+        """
+        month = request.data.get('month')
+        year = request.data.get('year')
+        if not month or not year:
+            return error_response("Month and year are required")
+        
+        try:
+            if request.user.is_staff:
+                landlord_id = request.data.get('landlord_id')
+                landlord = get_object_or_404(Landlord, id=landlord_id) if landlord_id else None
+            elif hasattr(request.user, 'landlord_profile'):
+                landlord = request.user.landlord_profile
+            else:
+                return error_response("No landlord profile found", status.HTTP_403_FORBIDDEN)
+            
+            result = generate_invoices(month, year, landlord=landlord)
+            return Response(result, status=status.HTTP_201_CREATED)
+        except ValueError as e:
+            return error_response(str(e))
+        except Exception as e:
+            return error_response(f"Error generating invoices: {str(e)}")
 
 # Payment ViewSet
-class PaymentViewSet(ModelViewSet):
+class PaymentViewSet(ReplicaReadMixin, RelatedQuerysetMixin, StreamingExportMixin, RoleScopedQuerysetMixin, ModelViewSet):
     queryset = Payment.objects.all()
     serializer_class = PaymentSerializer
     authentication_classes = [TokenAuthentication, SessionAuthentication]
     permission_classes = [IsAuthenticated]
+    cursor_ordering = ('-payment_date', '-id')
+    related_by_action = {
+        'default': (('invoice__tenant__user', 'invoice__house__apartment'), ()),
+        'destroy': ((), ()),
+    }
+    export_fields = [
+        ('id', 'pk'), ('invoice_id', 'invoice_id'), ('tenant_id', 'invoice__tenant_id'),
+        ('house', 'invoice__house__number'), ('month', 'invoice__month'), ('year', 'invoice__year'),
+        ('amount', 'amount'), ('payment_method', 'payment_method'),
+        ('transaction_reference', 'transaction_reference'), ('payment_date', 'payment_date'), ('notes', 'notes'),
+    ]
     
     def get_permissions(self):
         if self.action == 'create':
             return [IsAuthenticated()]  # Allow tenant to create payments
-        elif self.action in ['update', 'partial_update', 'destroy']:
+        elif self.action in ['update', 'partial_update', 'destroy', 'ingest', 'reconcile']:
             return [IsLandlordOrAdmin()]  # Only landlords or admins can modify
         return [IsAuthenticated()]
     
-    def get_queryset(self):
-        # Filter payments based on user role
-        queryset = Payment.objects.all()
-        
-        # Admin sees all payments
-        if self.request.user.is_staff:
-            return queryset
-        
-        try:
-            # Landlord sees payments for their apartments
-            if hasattr(self.request.user, 'landlord_profile'):
-                landlord_apartments = Apartment.objects.filter(owner=self.request.user.landlord_profile)
-                landlord_houses = House.objects.filter(apartment__in=landlord_apartments)
-                return queryset.filter(invoice__house__in=landlord_houses)
-            # Tenant sees only their payments
-            elif hasattr(self.request.user, 'tenant_profile'):
-                return queryset.filter(invoice__tenant=self.request.user.tenant_profile)
-        except:
-            pass
-            
-        return Payment.objects.none()
+    # Landlord sees payments for their apartments, tenant sees only their payments
+    landlord_lookup = 'invoice__house__apartment__owner'
+    tenant_lookup = 'invoice__tenant'
     
     def create(self, request, *args, **kwargs):
         """
@@ -792,7 +877,14 @@ class PaymentViewSet(ModelViewSet):
                     return error_response("Invalid invoice", status.HTTP_403_FORBIDDEN)
                 
                 # Create payment
-                payment = serializer.save()
+                try:
+                    with transaction.atomic():
+                        payment = serializer.save()
+                except IntegrityError:
+                    # The same reference was recorded by a concurrent request after validation
+                    return error_response(
+                        "A payment with this transaction reference is already recorded", status.HTTP_409_CONFLICT
+                    )
                 
                 # Payment creation also updates invoice amounts
                 return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -800,6 +892,60 @@ class PaymentViewSet(ModelViewSet):
         except Exception as e:
             return error_response(f"Error creating payment: {str(e)}")
     
+    @action(detail=False, methods=['post'])
+    def ingest(self, request):
+        """
+        Record a batch of payments (a list, or {"payments": [...]}) in one
+        transaction. Items whose (payment_method, transaction_reference) is
+        already recorded are reported as duplicates, so replays are safe.
+        """
+        items = request.data.get('payments') if isinstance(request.data, dict) else request.data
+        if not isinstance(items, list) or not items:
+            return error_response("A non-empty list of payments is required")
+        if len(items) > MAX_INGEST_BATCH_SIZE:
+            return error_response(f"At most {MAX_INGEST_BATCH_SIZE} payments can be ingested at once")
+
+        # Landlords may only pay into their own portfolio
+        invoices = Invoice.objects.all()
+        if not request.user.is_staff:
+            landlord = get_landlord(request.user)
+            invoices = invoices.filter(house__apartment__owner=landlord) if landlord else invoices.none()
+        try:
+            result = ingest_payments(items, invoices)
+        except Exception as e:
+            return error_response(f"Error ingesting payments: {str(e)}")
+        return Response(result, status=status.HTTP_201_CREATED if result['created'] else status.HTTP_200_OK)
+
+    @action(detail=False, methods=['post'], parser_classes=[MultiPartParser, FormParser])
+    def reconcile(self, request):
+        """
+        Match an uploaded statement CSV ("statement") to open invoices and
+        record the matches as payments. Unmatched lines are returned for review.
+        """
+        statement = request.FILES.get('statement')
+        if statement is None:
+            return error_response("A statement CSV file is required")
+        payment_method = request.data.get('payment_method', 'bank_transfer')
+        if payment_method not in dict(Payment.PAYMENT_METHOD_CHOICES):
+            return error_response("Invalid payment method")
+        dry_run = str(request.data.get('dry_run', '')).lower() in ('1', 'true', 'yes')
+
+        invoices = Invoice.objects.all()
+        if not request.user.is_staff:
+            landlord = get_landlord(request.user)
+            invoices = invoices.filter(house__apartment__owner=landlord) if landlord else invoices.none()
+        try:
+            lines = io.TextIOWrapper(statement.file, encoding='utf-8-sig', newline='')
+            summary, unmatched = reconcile_statement(lines, invoices, payment_method, dry_run=dry_run)
+        except (ValueError, UnicodeDecodeError, csv.Error) as e:
+            return error_response(f"Invalid statement: {str(e)}")
+        except Exception as e:
+            return error_response(f"Error reconciling statement: {str(e)}")
+        return Response({
+            'summary': summary,
+            'unmatched': unmatched[:RECONCILE_REVIEW_LIMIT],
+        })
+
     @action(detail=False, methods=['get'])
     def my_payments(self, request):
         """
@@ -809,12 +955,140 @@ class PaymentViewSet(ModelViewSet):
             if not hasattr(request.user, 'tenant_profile'):
                 return error_response("No tenant profile found", status.HTTP_404_NOT_FOUND)
                 
-            payments = Payment.objects.filter(invoice__tenant=request.user.tenant_profile)
-            serializer = self.get_serializer(payments, many=True)
-            return Response(serializer.data)
+            payments = self.with_related(Payment.objects.filter(invoice__tenant=request.user.tenant_profile))
+            return paginated_response(self, payments)
         except Exception as e:
             return error_response(f"Error retrieving payments: {str(e)}")
-        
+
+# LandlordStatement ViewSet
+class LandlordStatementViewSet(ReplicaReadMixin, RoleScopedQuerysetMixin, ReadOnlyModelViewSet):
+    """
+    Stored monthly payout statements, newest month first. Filter with
+    ?period_from=/?period_to= (YYYY-MM); admins may also pass ?landlord=.
+    """
+    queryset = LandlordStatement.objects.all()
+    serializer_class = LandlordStatementSerializer
+    authentication_classes = [TokenAuthentication, SessionAuthentication]
+    permission_classes = [IsAuthenticated]
+    filter_backends = [InvoicePeriodFilter]
+    cursor_ordering = ('-period', '-id')
+
+    # Landlords see their own statements; tenants see none
+    landlord_lookup = 'landlord'
+
+    def get_permissions(self):
+        if self.action == 'generate':
+            return [IsLandlordOrAdmin()]
+        return [IsAuthenticated()]
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        landlord_id = self.request.query_params.get('landlord')
+        if landlord_id:
+            if not landlord_id.isdigit():
+                raise ValidationError({'landlord': "A valid id is required."})
+            queryset = queryset.filter(landlord_id=landlord_id)
+        return queryset
+
+    @action(detail=False, methods=['post'])
+    def generate(self, request):
+        """
+        Compute and store the statements for a month. Landlords always get
+        their own; admins may pass landlord_id, or get every landlord's.
+        """
+        month = request.data.get('month')
+        year = request.data.get('year')
+        if not month or not year:
+            return error_response("Month and year are required")
+
+        try:
+            period = statement_period(month, year)
+            if request.user.is_staff:
+                landlord_id = request.data.get('landlord_id')
+                landlord_ids = [get_object_or_404(Landlord, id=landlord_id).pk] if landlord_id else None
+            else:
+                landlord = get_landlord(request.user)
+                if landlord is None:
+                    return error_response("No landlord profile found", status.HTTP_403_FORBIDDEN)
+                landlord_ids = [landlord.pk]
+
+            result = generate_statements(period, landlord_ids)
+            return Response(result, status=status.HTTP_201_CREATED)
+        except ValueError as e:
+            return error_response(str(e))
+        except Exception as e:
+            return error_response(f"Error generating statements: {str(e)}")
+
+# ArrearsSnapshot ViewSet
+class ArrearsSnapshotViewSet(ReplicaReadMixin, RoleScopedQuerysetMixin, ReadOnlyModelViewSet):
+    """
+    Nightly arrears aging snapshots, newest first, for trends (see
+    ArrearsSnapshotFilter); /aging/ computes today's buckets live.
+    """
+    queryset = ArrearsSnapshot.objects.all()
+    serializer_class = ArrearsSnapshotSerializer
+    authentication_classes = [TokenAuthentication, SessionAuthentication]
+    permission_classes = [IsLandlordOrAdmin]
+    filter_backends = [ArrearsSnapshotFilter]
+    cursor_ordering = ('-snapshot_date', '-id')
+
+    landlord_lookup = 'landlord'
+
+    @action(detail=False, methods=['get'])
+    def aging(self, request):
+        """
+        Past-due balances in 0-30, 31-60, 61-90 and 90+ day buckets per
+        ?scope= (tenant, house, apartment or landlord), one query per request
+        """
+        scope = request.query_params.get('scope', 'landlord')
+        invoices = Invoice.objects.all()
+        if not request.user.is_staff:
+            landlord = get_landlord(request.user)
+            if landlord is None:
+                return error_response("No landlord profile found", status.HTTP_403_FORBIDDEN)
+            invoices = invoices.filter(house__apartment__owner=landlord)
+        try:
+            report = aging_report(scope, invoices=invoices)
+        except ValueError as e:
+            return error_response(str(e))
+        return Response({'scope': scope, 'as_of': timezone.localdate(), 'results': report})
+
+# ActivityEvent ViewSet
+class ActivityEventViewSet(ReplicaReadMixin, RoleScopedQuerysetMixin, ReadOnlyModelViewSet):
+    """
+    Latest-first activity feed. Pages are keyset cursors over the
+    (landlord|tenant, created_at, id) indexes.
+    """
+    queryset = ActivityEvent.objects.all()
+    serializer_class = ActivityEventSerializer
+    authentication_classes = [TokenAuthentication, SessionAuthentication]
+    permission_classes = [IsAuthenticated]
+    pagination_class = ActivityFeedPagination
+
+    landlord_lookup = 'landlord'
+    tenant_lookup = 'tenant'
+
+    # Set by the /api/<role>/activities routes to serve only that role's feed
+    role = None
+
+    def get_scope(self, user):
+        if self.role == 'admin':
+            return Q() if user.is_staff else None
+        if self.role == 'landlord':
+            landlord = get_landlord(user)
+            return None if landlord is None else self.landlord_scope(landlord)
+        if self.role == 'tenant':
+            tenant = get_tenant(user)
+            return None if tenant is None else self.tenant_scope(tenant)
+        return super().get_scope(user)
+
+class NotificationViewSet(ActivityEventViewSet):
+    """
+    The notification-worthy subset of the activity feed. Clients that want
+    them pushed open the matching /notifications/stream SSE endpoint.
+    """
+    queryset = ActivityEvent.objects.filter(event_type__in=NOTIFICATION_EVENT_TYPES)
+
 
 class CustomAuthToken(ObtainAuthToken):
     serializer_class = CustomAuthTokenSerializer
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class AccountsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'accounts'
+
+    def ready(self):
+        # Connect the full-text index sync and activity log signals, and
+        # register the system checks
+        from . import activity, checks, search  # noqa: F401
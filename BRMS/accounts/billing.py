@@ -0,0 +1,116 @@
+import logging
+import time
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import activity, search
+from .models import House, Invoice, billing_month, billing_period, default_due_date
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 500
+
+
+def generate_invoices(month, year, landlord=None, due_date=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Create one invoice for every occupied house for the given billing month.
+
+    Invoices are built in memory and inserted with chunked bulk_create. Houses
+    that already have an invoice for the month are skipped, and the insert
+    ignores conflicts on the (tenant, house, month, year) unique constraint, so
+    running it twice for the same month is harmless.
+
+    Returns a dict with the created/skipped counts, elapsed seconds and
+    invoices per second.
+    """
+    month = billing_month(month)
+    year = int(year)
+    period = billing_period(month, year)
+    due_date = due_date or default_due_date()
+    started = time.monotonic()
+
+    houses = House.objects.filter(status='occupied', tenant__isnull=False)
+    existing = Invoice.objects.filter(month=month, year=year)
+    if landlord is not None:
+        houses = houses.filter(apartment__owner=landlord)
+        existing = existing.filter(house__apartment__owner=landlord)
+
+    attempted = skipped = 0
+    batch = []
+    with transaction.atomic():
+        # Read inside the transaction: it holds the write lock (IMMEDIATE), so no
+        # other run can add invoices for the month between this read and the next
+        already_billed = set(existing.values_list('tenant_id', 'house_id'))
+        rows = houses.order_by().values_list('pk', 'tenant_id', 'monthly_rent')
+        for house_id, tenant_id, rent in rows.iterator(chunk_size=chunk_size):
+            if (tenant_id, house_id) in already_billed:
+                skipped += 1
+                continue
+            # bulk_create bypasses Invoice.save(), so set the derived fields here
+            batch.append(Invoice(
+                tenant_id=tenant_id, house_id=house_id, month=month, year=year, period=period,
+                rent=rent, total_payable=rent, payment_status='unpaid', due_date=due_date,
+            ))
+            if len(batch) >= chunk_size:
+                Invoice.objects.bulk_create(batch, ignore_conflicts=True)
+                attempted += len(batch)
+                batch = []
+        if batch:
+            Invoice.objects.bulk_create(batch, ignore_conflicts=True)
+            attempted += len(batch)
+
+        # ignore_conflicts does not say which rows went in: the new ones are
+        # the month's invoices whose key was not billed before
+        created_ids = [
+            pk for pk, tenant_id, house_id in existing.order_by('pk').values_list('pk', 'tenant_id', 'house_id')
+            if (tenant_id, house_id) not in already_billed
+        ] if attempted else []
+        # Rows the insert skipped on a conflict
+        skipped += attempted - len(created_ids)
+
+        # bulk_create skips the post_save signals that feed the search index
+        # and the activity log
+        for start in range(0, len(created_ids), chunk_size):
+            created = Invoice.objects.filter(pk__in=created_ids[start:start + chunk_size])
+            search.index_queryset(created)
+            activity.record_invoices_created(created)
+
+    created = len(created_ids)
+    elapsed = time.monotonic() - started
+    return {
+        'month': month,
+        'year': year,
+        'created': created,
+        'skipped': skipped,
+        'elapsed_seconds': round(elapsed, 3),
+        'invoices_per_second': round(created / elapsed, 1) if elapsed else None,
+    }
+
+
+def sweep_overdue_invoices(today=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Flip every unpaid invoice whose due date has passed to 'overdue'.
+
+    Each chunk is one UPDATE over a slice of primary keys taken from the
+    (payment_status, due_date) index, so the sweep never loads or saves
+    Invoice instances; an invoice_status event is logged for each invoice
+    swept. Returns the number of invoices updated and the elapsed seconds.
+    """
+    today = today or timezone.localdate()
+    started = time.monotonic()
+    past_due = Invoice.objects.filter(payment_status='unpaid', due_date__lt=today).order_by()
+
+    updated = 0
+    while True:
+        chunk = list(past_due.values_list('pk', flat=True)[:chunk_size])
+        if not chunk:
+            break
+        # Re-check the status so a payment landing mid-sweep is not overwritten
+        updated += Invoice.tracked_update(past_due.filter(pk__in=chunk), payment_status='overdue')
+        if len(chunk) < chunk_size:
+            break
+
+    elapsed = round(time.monotonic() - started, 3)
+    logger.info("Marked %d invoice(s) overdue in %ss", updated, elapsed)
+    return {'updated': updated, 'elapsed_seconds': elapsed}
@@ -0,0 +1,102 @@
+"""
+Booking approval that cannot let two tenants into one house.
+
+Approving used to read the house's status, check it was vacant, then save
+both rows; two approvals racing on competing bookings could both pass the
+check. approve_booking() instead claims the booking (pending -> approved) and
+the house (vacant -> occupied by the booking's tenant) with conditional
+UPDATEs in one transaction. The database lets exactly one approval match
+`status = 'vacant'`; the loser matches no row and rolls back. The winner
+rejects the house's other pending bookings with one more UPDATE.
+
+The UPDATEs skip House.save() and the post_save receivers, so the occupancy
+interval and the activity events are written here.
+
+A booking for a house that is taken, or that already has a queue, joins the
+house's waitlist at the next waitlist_position. When the house frees up,
+promote_next() moves the head of the queue to pending, ready for approval:
+one LIMIT 1 read on the (house, waitlist_position) constraint index and one
+UPDATE by primary key, however long the queue is.
+"""
+from django.db import transaction
+
+from . import activity
+from .models import House, HouseBooking, HouseOccupancyInterval
+
+
+def waitlisted(house_id):
+    return HouseBooking.objects.filter(house_id=house_id, waitlist_position__isnull=False)
+
+
+def next_waitlist_position(house_id):
+    """
+    Position after the last in the house's queue, or None if the queue is empty
+    """
+    last = waitlisted(house_id).order_by('-waitlist_position').values_list('waitlist_position', flat=True).first()
+    return None if last is None else last + 1
+
+
+def promote_next(house_id):
+    """
+    Move the first booking in the house's waitlist to pending, if the house is
+    vacant and no pending booking is waiting on it. Call in the transaction
+    that freed the house. Returns the promoted booking id or None.
+    """
+    if not House.objects.filter(pk=house_id, status='vacant').exists():
+        return None
+    if HouseBooking.objects.filter(house_id=house_id, status='pending').exists():
+        return None
+    while True:
+        head = waitlisted(house_id).order_by('waitlist_position').values_list('pk', 'tenant_id', 'waitlist_position').first()
+        if head is None:
+            return None
+        booking_id, tenant_id, position = head
+        # Cancelled since the read: try the next in line
+        if HouseBooking.objects.filter(pk=booking_id, waitlist_position=position).update(
+            status='pending', waitlist_position=None,
+        ):
+            break
+
+    number, apartment, landlord_id = activity.house_details(house_id)
+    activity.record(
+        'booking_status', booking_id, f'Booking for house {number}, {apartment} moved off the waitlist',
+        landlord_id, tenant_id,
+    )
+    return booking_id
+
+
+class BookingConflict(Exception):
+    """
+    The booking is no longer pending, or its house is no longer vacant
+    """
+
+
+def approve_booking(booking_id):
+    """
+    Approve a pending booking, move its tenant into the house and reject the
+    other pending bookings for that house. Returns the number rejected;
+    raises BookingConflict if the booking or the house was taken first.
+    """
+    with transaction.atomic():
+        booking = HouseBooking.objects.filter(pk=booking_id).values_list('house_id', 'tenant_id').first()
+        if booking is None:
+            raise HouseBooking.DoesNotExist(f"Booking {booking_id} does not exist")
+        house_id, tenant_id = booking
+
+        if not HouseBooking.objects.filter(pk=booking_id, status='pending').update(status='approved'):
+            raise BookingConflict("Booking is no longer pending")
+        claimed = House.objects.filter(pk=house_id, status='vacant', tenant__isnull=True).update(
+            status='occupied', tenant_id=tenant_id,
+        )
+        if not claimed:
+            # Leaves the atomic block, undoing the booking claim too
+            raise BookingConflict("House is no longer available")
+
+        competing = HouseBooking.objects.filter(house_id=house_id, status='pending')
+        rejected = list(competing.values_list('pk', 'tenant_id'))
+        if rejected:
+            competing.filter(pk__in=[pk for pk, _ in rejected]).update(status='rejected')
+
+        HouseOccupancyInterval.record_transition(house_id, 'occupied', tenant_id)
+        activity.record_booking_approval(house_id, (booking_id, tenant_id), rejected)
+    return len(rejected)
@@ -0,0 +1,18 @@
+from django.core.checks import Error, Tags, register
+
+from . import mpesa
+
+
+@register(Tags.security, deploy=True)
+def check_mpesa_callback_token(app_configs, **kwargs):
+    """
+    The M-Pesa callback refuses every request without a token, so a
+    deployment without one can never record an STK payment
+    """
+    if mpesa.config().get('CALLBACK_TOKEN'):
+        return []
+    return [Error(
+        "MPESA['CALLBACK_TOKEN'] is not set, so every M-Pesa callback will be refused.",
+        hint="Set the MPESA_CALLBACK_TOKEN environment variable to a long random string.",
+        id='accounts.E001',
+    )]
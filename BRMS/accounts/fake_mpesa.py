@@ -0,0 +1,172 @@
+"""
+A local stand-in for the Daraja API endpoints mpesa.MpesaClient calls.
+
+FakeMpesaServer answers the OAuth, STK push and STK push query requests on a
+real socket, so tests and local development exercise the same HTTP path as
+production. When `callback_delay` is set it also plays the customer: that
+many seconds after each push it posts the STK callback (ResultCode
+`result_code`) to the request's CallBackURL. Tests that drive the callback
+themselves can leave it unset and use callback_payload(); the push query
+reports a push as answered once its callback payload has been built.
+
+    with FakeMpesaServer() as gateway:
+        settings.MPESA['BASE_URL'] = gateway.url
+        ...
+"""
+import itertools
+import json
+import threading
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.utils import timezone
+
+ACCESS_TOKEN = 'fake-mpesa-token'
+
+
+class FakeMpesaServer:
+    def __init__(self, host='127.0.0.1', port=0, result_code=0, callback_delay=None):
+        self.result_code = result_code
+        self.callback_delay = callback_delay
+        # STK push request bodies by CheckoutRequestID
+        self.pushes = {}
+        # Result codes of the pushes the customer has answered, for the push query
+        self.results = {}
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), self.handler_class())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def serve_forever(self):
+        self.httpd.serve_forever()
+
+    def push(self, body):
+        with self.lock:
+            number = next(self.ids)
+        checkout_request_id = f'ws_CO_{number:08d}'
+        self.pushes[checkout_request_id] = body
+        if self.callback_delay is not None:
+            timer = threading.Timer(self.callback_delay, self.send_callback, [checkout_request_id])
+            timer.daemon = True
+            timer.start()
+        return {
+            'MerchantRequestID': f'fake-{number}',
+            'CheckoutRequestID': checkout_request_id,
+            'ResponseCode': '0',
+            'ResponseDescription': 'Success. Request accepted for processing',
+            'CustomerMessage': 'Success. Request accepted for processing',
+        }
+
+    def callback_payload(self, checkout_request_id, result_code=None):
+        """
+        The STK callback Safaricom would send for a push this server received
+        """
+        body = self.pushes[checkout_request_id]
+        result_code = self.result_code if result_code is None else result_code
+        self.results[checkout_request_id] = result_code
+        result = {
+            'MerchantRequestID': f'fake-{int(checkout_request_id.rsplit("_", 1)[1])}',
+            'CheckoutRequestID': checkout_request_id,
+            'ResultCode': result_code,
+            'ResultDesc': 'The service request is processed successfully.' if result_code == 0
+                          else 'Request cancelled by user',
+        }
+        if result_code == 0:
+            result['CallbackMetadata'] = {'Item': [
+                {'Name': 'Amount', 'Value': body['Amount']},
+                {'Name': 'MpesaReceiptNumber', 'Value': f'FAKE{checkout_request_id[-8:]}'},
+                {'Name': 'TransactionDate', 'Value': int(timezone.localtime().strftime('%Y%m%d%H%M%S'))},
+                {'Name': 'PhoneNumber', 'Value': int(body['PhoneNumber'])},
+            ]}
+        return {'Body': {'stkCallback': result}}
+
+    def query(self, checkout_request_id):
+        """
+        The status code and body of an STK push query
+        """
+        if checkout_request_id not in self.pushes:
+            return 400, {'errorCode': '400.002.02', 'errorMessage': 'Bad Request - Invalid CheckoutRequestID'}
+        if checkout_request_id not in self.results:
+            return 500, {'errorCode': '500.001.1001', 'errorMessage': 'The transaction is being processed'}
+        result_code = self.results[checkout_request_id]
+        return 200, {
+            'ResponseCode': '0',
+            'ResponseDescription': 'The service request has been accepted successfully',
+            'CheckoutRequestID': checkout_request_id,
+            'ResultCode': str(result_code),
+            'ResultDesc': 'The service request is processed successfully.' if result_code == 0
+                          else 'Request cancelled by user',
+        }
+
+    def send_callback(self, checkout_request_id):
+        body = self.pushes[checkout_request_id]
+        request = urllib.request.Request(
+            body['CallBackURL'], data=json.dumps(self.callback_payload(checkout_request_id)).encode(),
+            method='POST', headers={'Content-Type': 'application/json'},
+        )
+        try:
+            urllib.request.urlopen(request, timeout=10).close()
+        except OSError:
+            pass
+
+    def handler_class(self):
+        gateway = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def reply(self, status, payload):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                if self.path.startswith('/oauth/v1/generate'):
+                    if not self.headers.get('Authorization', '').startswith('Basic '):
+                        return self.reply(400, {'errorMessage': 'Invalid credentials'})
+                    return self.reply(200, {'access_token': ACCESS_TOKEN, 'expires_in': '3599'})
+                self.reply(404, {'errorMessage': 'Not found'})
+
+            def do_POST(self):
+                if self.path not in ('/mpesa/stkpush/v1/processrequest', '/mpesa/stkpushquery/v1/query'):
+                    return self.reply(404, {'errorMessage': 'Not found'})
+                if self.headers.get('Authorization') != f'Bearer {ACCESS_TOKEN}':
+                    return self.reply(401, {'errorMessage': 'Invalid Access Token'})
+                length = int(self.headers.get('Content-Length', 0))
+                try:
+                    body = json.loads(self.rfile.read(length))
+                except ValueError:
+                    return self.reply(400, {'errorMessage': 'Bad Request'})
+                if self.path == '/mpesa/stkpushquery/v1/query':
+                    return self.reply(*gateway.query(body.get('CheckoutRequestID')))
+                required = ['BusinessShortCode', 'Password', 'Amount', 'PhoneNumber', 'CallBackURL']
+                if any(not body.get(field) for field in required):
+                    return self.reply(400, {'errorMessage': 'Bad Request - Invalid request body'})
+                self.reply(200, gateway.push(body))
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
@@ -0,0 +1,47 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.aging import BUCKETS, SCOPES, aging_report, take_snapshot
+from accounts.routers import replica_reads
+
+
+class Command(BaseCommand):
+    help = (
+        "Print arrears aging (0-30, 31-60, 61-90, 90+ days past due) per tenant, "
+        "house, apartment or landlord, or with --snapshot store every scope for the "
+        "day. Schedule the snapshot nightly to keep aging trends."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scope', choices=sorted(SCOPES), default='landlord')
+        parser.add_argument('--date', help="Age balances as of this date (YYYY-MM-DD), default today")
+        parser.add_argument('--snapshot', action='store_true', help="Store every scope instead of printing one")
+        parser.add_argument('--limit', type=int, default=50, help="Rows to print")
+
+    def handle(self, *args, **options):
+        today = None
+        if options['date']:
+            try:
+                today = datetime.date.fromisoformat(options['date'])
+            except ValueError:
+                raise CommandError(f"Invalid date: {options['date']!r}")
+
+        if options['snapshot']:
+            # Aged on the replica, stored on the primary
+            with replica_reads():
+                result = take_snapshot(today)
+            rows = ', '.join(f"{count} {scope}(s)" for scope, count in result['rows'].items())
+            self.stdout.write(self.style.SUCCESS(
+                f"Arrears snapshot for {result['snapshot_date']}: {rows} in {result['elapsed_seconds']}s"
+            ))
+            return
+
+        with replica_reads():
+            report = aging_report(options['scope'], today)
+        columns = ['object_id', 'name'] + BUCKETS + ['total']
+        self.stdout.write('\t'.join(columns))
+        for row in report[:options['limit']]:
+            self.stdout.write('\t'.join(str(row[column]) for column in columns))
+        if len(report) > options['limit']:
+            self.stdout.write(f"... {len(report) - options['limit']} more")
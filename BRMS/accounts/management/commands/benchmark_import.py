@@ -0,0 +1,90 @@
+import csv
+import io
+import time
+
+import tablib
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from accounts.models import Apartment, ApartmentType, House, HouseOccupancyInterval, HouseType, Landlord, Tenant
+from accounts.resources import BulkHouseResource, BulkInvoiceResource, HouseResource, InvoiceResource, stream_import
+
+HOUSE_COLUMNS = ['id', 'apartment', 'number', 'monthly_rent', 'deposit_amount', 'house_type', 'status', 'tenant']
+INVOICE_COLUMNS = ['id', 'tenant', 'house', 'month', 'year', 'rent', 'additional_charges', 'discount', 'amount_paid']
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the standard (row by row) and bulk import paths on the same generated "
+        "file. Runs in a transaction that is rolled back, so nothing is kept."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('model', choices=['house', 'invoice'])
+        parser.add_argument('--rows', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            rows = self.fixture(options['model'], options['rows'])
+            columns = HOUSE_COLUMNS if options['model'] == 'house' else INVOICE_COLUMNS
+            standard, bulk = {
+                'house': (HouseResource, BulkHouseResource),
+                'invoice': (InvoiceResource, BulkInvoiceResource),
+            }[options['model']]
+
+            savepoint = transaction.savepoint()
+            started = time.monotonic()
+            result = standard().import_data(tablib.Dataset(*rows, headers=columns), use_transactions=True)
+            standard_seconds = time.monotonic() - started
+            if result.has_errors() or result.has_validation_errors():
+                self.stderr.write("The standard import reported errors")
+            transaction.savepoint_rollback(savepoint)
+
+            stream = io.StringIO()
+            writer = csv.writer(stream)
+            writer.writerow(columns)
+            writer.writerows(rows)
+            stream.seek(0)
+            started = time.monotonic()
+            summary, problems = stream_import(bulk, stream)
+            bulk_seconds = time.monotonic() - started
+            if problems:
+                self.stderr.write(f"The bulk import rejected {len(problems)} row(s)")
+
+            transaction.set_rollback(True)
+
+        count = len(rows)
+        self.stdout.write(f"standard: {count} {options['model']}(s) in {standard_seconds:.2f}s ({count / standard_seconds:.0f} rows/s)")
+        self.stdout.write(f"bulk:     {count} {options['model']}(s) in {bulk_seconds:.2f}s ({count / bulk_seconds:.0f} rows/s)")
+        self.stdout.write(self.style.SUCCESS(f"bulk is {standard_seconds / bulk_seconds:.1f}x faster"))
+
+    def fixture(self, model, count):
+        """
+        Rows for the generated file, plus whatever they reference
+        """
+        landlord = Landlord.objects.create(
+            first_name='Benchmark', id_number='benchmark-import', email='benchmark-import@example.com',
+            phone_number='+254799999999', physical_address='Nowhere',
+        )
+        apartment = Apartment.objects.create(
+            name='Benchmark import', location='Nowhere', owner=landlord, management_fee_percentage=10,
+            apartment_type=ApartmentType.objects.get_or_create(name='Benchmark')[0],
+        )
+        house_type = HouseType.objects.get_or_create(name='Benchmark')[0]
+        if model == 'house':
+            return [['', apartment.pk, f'B{number}', 10000, 10000, house_type.pk, 'vacant', ''] for number in range(count)]
+
+        tenants = Tenant.objects.bulk_create([
+            Tenant(first_name='Benchmark', last_name=str(number), phone_number=f'+2547{number:08d}')
+            for number in range(count)
+        ])
+        houses = House.objects.bulk_create([
+            House(apartment=apartment, number=f'B{number}', monthly_rent=10000, house_type=house_type,
+                  status='occupied', tenant=tenant)
+            for number, tenant in enumerate(tenants)
+        ])
+        HouseOccupancyInterval.record_transitions(houses)
+        return [
+            ['', house.tenant_id, house.pk, 'January', 2020, 10000, 500, 0, 5000 * (number % 3)]
+            for number, house in enumerate(houses)
+        ]
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.billing import DEFAULT_CHUNK_SIZE, generate_invoices
+from accounts.models import Landlord
+
+
+class Command(BaseCommand):
+    help = "Bulk-create the monthly invoice for every occupied house"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--month', required=True, help="Month number or name, e.g. 3 or March")
+        parser.add_argument('--year', required=True, type=int)
+        parser.add_argument('--landlord', type=int, help="Only bill houses owned by this landlord id")
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        landlord = None
+        if options['landlord']:
+            try:
+                landlord = Landlord.objects.get(pk=options['landlord'])
+            except Landlord.DoesNotExist:
+                raise CommandError(f"Landlord {options['landlord']} does not exist")
+
+        try:
+            result = generate_invoices(
+                options['month'], options['year'],
+                landlord=landlord, chunk_size=options['chunk_size']
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{result['month']} {result['year']}: created {result['created']} invoice(s), "
+            f"skipped {result['skipped']} already billed in {result['elapsed_seconds']}s "
+            f"({result['invoices_per_second'] or 0} invoices/s)"
+        ))
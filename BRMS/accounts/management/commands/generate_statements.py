@@ -0,0 +1,46 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import Landlord
+from accounts.routers import replica_reads
+from accounts.statements import DEFAULT_BATCH_SIZE, generate_statements, statement_period
+
+
+class Command(BaseCommand):
+    help = (
+        "Compute and store every landlord's payout statement for a month: rent "
+        "collected, management fee and net payout per apartment and house"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--month', required=True, help="Month number or name, e.g. 3 or March")
+        parser.add_argument('--year', required=True, type=int)
+        parser.add_argument('--landlord', type=int, action='append', help="Only this landlord id (repeatable)")
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help="Processes computing landlord batches in parallel (default: one per CPU)",
+        )
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help="Landlords per batch")
+
+    def handle(self, *args, **options):
+        try:
+            period = statement_period(options['month'], options['year'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        landlord_ids = options['landlord']
+        if landlord_ids:
+            missing = set(landlord_ids) - set(Landlord.objects.filter(pk__in=landlord_ids).values_list('pk', flat=True))
+            if missing:
+                raise CommandError(f"Landlord(s) {', '.join(map(str, sorted(missing)))} do not exist")
+
+        # Computed on the replica, stored on the primary
+        with replica_reads():
+            result = generate_statements(
+                period, landlord_ids, workers=options['workers'], batch_size=options['batch_size'],
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f"{period:%B %Y}: wrote {result['statements']} statement(s) with {result['workers']} worker(s) "
+            f"in {result['elapsed_seconds']}s ({result['statements_per_second'] or 0} statements/s)"
+        ))
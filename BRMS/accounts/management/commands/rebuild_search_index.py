@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from accounts import search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index for houses, apartments, tenants and invoices"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        for model in search.SEARCH_INDEXES:
+            if not search.is_available(model, options['database']):
+                self.stdout.write(self.style.WARNING("Full-text search needs SQLite FTS5; nothing to rebuild"))
+                return
+            written = search.rebuild(model, options['database'])
+            self.stdout.write(self.style.SUCCESS(f"Indexed {written} {model._meta.verbose_name_plural.lower()}"))
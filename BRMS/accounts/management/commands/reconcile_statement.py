@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import Invoice, Landlord, Payment
+from accounts.reconciliation import reconcile_statement, report_csv, write_report
+
+
+class Command(BaseCommand):
+    help = (
+        "Match a bank or mobile-money statement CSV to open invoices, record the "
+        "matches as payments and write the unmatched lines to a review report"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('statement', help="Path to the statement CSV")
+        parser.add_argument(
+            '--method',
+            default='bank_transfer',
+            choices=[choice for choice, _ in Payment.PAYMENT_METHOD_CHOICES],
+            help="Payment method recorded for matched lines",
+        )
+        parser.add_argument('--landlord', type=int, help="Only match invoices of this landlord id")
+        parser.add_argument('--report', help="Write unmatched lines here as CSV (default: stdout)")
+        parser.add_argument('--dry-run', action='store_true', help="Match without recording payments")
+
+    def handle(self, *args, **options):
+        invoices = Invoice.objects.all()
+        if options['landlord']:
+            try:
+                invoices = invoices.filter(house__apartment__owner=Landlord.objects.get(pk=options['landlord']))
+            except Landlord.DoesNotExist:
+                raise CommandError(f"Landlord {options['landlord']} does not exist")
+
+        try:
+            with open(options['statement'], newline='', encoding='utf-8-sig') as statement:
+                summary, unmatched = reconcile_statement(
+                    statement, invoices, options['method'], dry_run=options['dry_run']
+                )
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        if options['report']:
+            with open(options['report'], 'w', newline='') as report:
+                write_report(unmatched, report)
+        elif unmatched:
+            self.stdout.write(report_csv(unmatched), ending='')
+
+        self.stderr.write(self.style.SUCCESS(
+            f"{summary['lines']} line(s): matched {summary['matched']}, recorded {summary['created']} payment(s), "
+            f"{summary['already_recorded']} already recorded, {summary['unmatched']} for review "
+            f"in {summary['elapsed_seconds']}s ({summary['lines_per_second'] or 0} lines/s)"
+            + (" [dry run]" if options['dry_run'] else "")
+        ))
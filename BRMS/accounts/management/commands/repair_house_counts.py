@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from accounts.models import Apartment
+
+
+class Command(BaseCommand):
+    help = "Recompute Apartment.total_houses from the houses table in one grouped query"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--apartment',
+            type=int,
+            action='append',
+            dest='apartment_ids',
+            help="Only repair this apartment id (may be repeated)",
+        )
+
+    def handle(self, *args, **options):
+        updated = Apartment.refresh_house_counts(options['apartment_ids'])
+        self.stdout.write(self.style.SUCCESS(f"Recounted houses for {updated} apartment(s)"))
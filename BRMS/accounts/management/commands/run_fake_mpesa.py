@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from accounts.fake_mpesa import FakeMpesaServer
+
+
+class Command(BaseCommand):
+    help = (
+        "Serve a local fake of the M-Pesa Daraja API. Set MPESA_BASE_URL to the "
+        "printed address; each STK push is answered with a callback after --callback-delay seconds."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8001)
+        parser.add_argument('--callback-delay', type=float, default=3.0)
+        parser.add_argument(
+            '--result-code',
+            type=int,
+            default=0,
+            help="ResultCode sent in callbacks (0 = paid, 1032 = cancelled by user)",
+        )
+
+    def handle(self, *args, **options):
+        gateway = FakeMpesaServer(
+            host=options['host'], port=options['port'],
+            result_code=options['result_code'], callback_delay=options['callback_delay'],
+        )
+        self.stdout.write(self.style.SUCCESS(f"Fake M-Pesa gateway listening on {gateway.url}"))
+        try:
+            gateway.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            gateway.httpd.server_close()
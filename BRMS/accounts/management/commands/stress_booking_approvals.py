@@ -0,0 +1,106 @@
+import random
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count, OuterRef
+
+from accounts.bookings import BookingConflict, approve_booking
+from accounts.models import Apartment, ApartmentType, House, HouseBooking, HouseType, Landlord, Tenant
+
+
+class Command(BaseCommand):
+    help = (
+        "Race threads approving competing bookings for the same houses and check "
+        "no house was given to two tenants. The generated rows are deleted afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--houses', type=int, default=50)
+        parser.add_argument('--bookings-per-house', type=int, default=10)
+        parser.add_argument('--threads', type=int, default=8)
+
+    def handle(self, *args, **options):
+        # Approvals run in separate connections, so the fixture is committed, then deleted
+        landlord, tenant_ids, bookings = self.fixture(options['houses'], options['bookings_per_house'])
+        try:
+            random.shuffle(bookings)
+            threads = options['threads']
+            start = threading.Barrier(threads)
+            approved, conflicts, errors = [], [], []
+
+            def approve(share):
+                try:
+                    start.wait()
+                    for booking_id in share:
+                        try:
+                            approve_booking(booking_id)
+                            approved.append(booking_id)
+                        except BookingConflict:
+                            conflicts.append(booking_id)
+                except Exception as e:
+                    errors.append(e)
+                finally:
+                    connection.close()
+
+            workers = [threading.Thread(target=approve, args=(bookings[number::threads],)) for number in range(threads)]
+            started = time.monotonic()
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+            elapsed = time.monotonic() - started
+
+            if errors:
+                raise CommandError(f"{len(errors)} thread(s) failed: {errors[0]!r}")
+            houses = House.objects.filter(apartment__owner=landlord)
+            double = (
+                HouseBooking.objects.filter(house__in=houses, status='approved')
+                .values('house').annotate(approvals=Count('pk')).filter(approvals__gt=1).count()
+            )
+            mismatched = houses.exclude(
+                tenant_id__in=HouseBooking.objects.filter(house=OuterRef('pk'), status='approved').values('tenant_id')
+            ).count()
+        finally:
+            Apartment.objects.filter(owner=landlord).delete()
+            Tenant.objects.filter(pk__in=tenant_ids).delete()
+            landlord.delete()
+
+        self.stdout.write(
+            f"{len(approved) + len(conflicts)} approval attempt(s) on {options['houses']} house(s) from {threads} "
+            f"thread(s) in {elapsed:.2f}s: {len(approved)} approved, {len(conflicts)} conflict(s), "
+            f"{(len(approved) + len(conflicts)) / elapsed:.0f} attempts/s"
+        )
+        if double or mismatched or len(approved) != options['houses']:
+            raise CommandError(
+                f"Double occupancy: {double} house(s) with two approvals, {mismatched} house(s) "
+                f"not held by their approved tenant"
+            )
+        self.stdout.write(self.style.SUCCESS("no double occupancy"))
+
+    @transaction.atomic
+    def fixture(self, house_count, bookings_per_house):
+        landlord = Landlord.objects.create(
+            first_name='Stress', id_number='stress-bookings', email='stress-bookings@example.com',
+            phone_number='+254799999998', physical_address='Nowhere',
+        )
+        apartment = Apartment.objects.create(
+            name='Stress bookings', location='Nowhere', owner=landlord, management_fee_percentage=10,
+            apartment_type=ApartmentType.objects.get_or_create(name='Benchmark')[0],
+        )
+        house_type = HouseType.objects.get_or_create(name='Benchmark')[0]
+        houses = [
+            House.objects.create(apartment=apartment, number=f'S{number}', monthly_rent=10000, house_type=house_type)
+            for number in range(house_count)
+        ]
+        tenants = Tenant.objects.bulk_create([
+            Tenant(first_name='Stress', last_name=str(number), phone_number=f'+2540{number:08d}')
+            for number in range(house_count * bookings_per_house)
+        ])
+        bookings = HouseBooking.objects.bulk_create([
+            HouseBooking(house=house, tenant=tenant, deposit_amount=1000, rent_amount_paid=0)
+            for number, house in enumerate(houses)
+            for tenant in tenants[number * bookings_per_house:(number + 1) * bookings_per_house]
+        ])
+        return landlord, [tenant.pk for tenant in tenants], [booking.pk for booking in bookings]
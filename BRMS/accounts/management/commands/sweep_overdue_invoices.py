@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts.billing import DEFAULT_CHUNK_SIZE, sweep_overdue_invoices
+
+
+class Command(BaseCommand):
+    help = (
+        "Mark past-due unpaid invoices as overdue. Schedule it from cron "
+        "(e.g. hourly) or run it with --interval as a long-lived worker."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=0,
+            help="Repeat the sweep every N seconds instead of running once",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            result = sweep_overdue_invoices(chunk_size=options['chunk_size'])
+            self.stdout.write(self.style.SUCCESS(
+                f"Marked {result['updated']} invoice(s) overdue in {result['elapsed_seconds']}s"
+            ))
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:53
+
+import accounts.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0010_alter_invoice_due_date'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='invoice',
+            name='due_date',
+            field=models.DateField(default=accounts.models.default_due_date),
+        ),
+    ]
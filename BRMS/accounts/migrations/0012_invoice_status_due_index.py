@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0011_invoice_due_date_default'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['payment_status', 'due_date'], name='invoice_status_due_idx'),
+        ),
+    ]
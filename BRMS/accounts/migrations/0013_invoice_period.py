@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:55
+
+from django.db import migrations, models
+
+from accounts.models import billing_period
+
+
+def populate_period(apps, schema_editor):
+    # The same parsing Invoice.save() uses, so every month it accepts gets a period
+    Invoice = apps.get_model('accounts', 'Invoice')
+    for invoice in Invoice.objects.filter(period__isnull=True).only('month', 'year').iterator():
+        period = billing_period(invoice.month, invoice.year)
+        if period is not None:
+            Invoice.objects.filter(pk=invoice.pk).update(period=period)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0012_invoice_status_due_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoice',
+            name='period',
+            field=models.DateField(blank=True, editable=False, help_text='First day of the billing month, derived from month and year', null=True),
+        ),
+        migrations.RunPython(populate_period, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['tenant', 'period'], name='invoice_tenant_period_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['house', 'period'], name='invoice_house_period_idx'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:59
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0013_invoice_period'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='apartment',
+            index=models.Index(fields=['date_added', 'id'], name='apartment_date_added_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='house',
+            index=models.Index(fields=['date_added', 'id'], name='house_date_added_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='housebooking',
+            index=models.Index(fields=['date_added', 'id'], name='booking_date_added_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['date_added', 'id'], name='invoice_date_added_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='landlord',
+            index=models.Index(fields=['date_added', 'id'], name='landlord_date_added_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['payment_date', 'id'], name='payment_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tenant',
+            index=models.Index(fields=['date_added', 'id'], name='tenant_date_added_id_idx'),
+        ),
+    ]
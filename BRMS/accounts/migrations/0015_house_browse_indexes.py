@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0014_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='house',
+            index=models.Index(fields=['status', 'monthly_rent'], name='house_status_rent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='house',
+            index=models.Index(fields=['status', 'house_type'], name='house_status_type_idx'),
+        ),
+    ]
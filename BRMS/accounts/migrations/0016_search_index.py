@@ -0,0 +1,53 @@
+from django.db import migrations
+
+from accounts.search import SEARCH_INDEXES, write_documents
+
+SEARCH_TABLES = [
+    'accounts_house_fts',
+    'accounts_apartment_fts',
+    'accounts_tenant_fts',
+    'accounts_invoice_fts',
+]
+
+
+def create_search_tables(apps, schema_editor):
+    # FTS5 is SQLite only; other backends fall back to DRF's SearchFilter
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for table in SEARCH_TABLES:
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {table} "
+            f"USING fts5(body, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        )
+
+
+def build_search_index(apps, schema_editor):
+    # Index the rows saved before the tables existed, so they are searchable
+    # without running rebuild_search_index
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    for model, (table, fields) in SEARCH_INDEXES.items():
+        historical = apps.get_model('accounts', model.__name__)
+        rows = historical.objects.using(connection.alias).order_by().values_list('pk', *fields).iterator()
+        with connection.cursor() as cursor:
+            write_documents(cursor, table, rows)
+
+
+def drop_search_tables(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for table in SEARCH_TABLES:
+        schema_editor.execute(f"DROP TABLE IF EXISTS {table}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0015_house_browse_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_tables, drop_search_tables),
+        migrations.RunPython(build_search_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:04
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0016_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivityEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_type', models.CharField(choices=[('booking_created', 'Booking Created'), ('booking_status', 'Booking Status Changed'), ('invoice_created', 'Invoice Created'), ('invoice_status', 'Invoice Status Changed'), ('payment_received', 'Payment Received'), ('payment_reversed', 'Payment Reversed'), ('tenant_assigned', 'Tenant Assigned'), ('tenant_vacated', 'Tenant Vacated')], max_length=30)),
+                ('object_id', models.PositiveBigIntegerField()),
+                ('summary', models.CharField(max_length=255)),
+                ('amount', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('landlord', models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='activities', to='accounts.landlord')),
+                ('tenant', models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='activities', to='accounts.tenant')),
+            ],
+            options={
+                'verbose_name': 'Activity Event',
+                'verbose_name_plural': 'Activity Events',
+                'ordering': ['-created_at', '-id'],
+                'indexes': [models.Index(fields=['landlord', 'created_at', 'id'], name='activity_landlord_created_idx'), models.Index(fields=['tenant', 'created_at', 'id'], name='activity_tenant_created_idx'), models.Index(fields=['created_at', 'id'], name='activity_created_id_idx')],
+            },
+        ),
+    ]
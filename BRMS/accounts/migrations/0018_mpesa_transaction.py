@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:09
+
+import django.core.validators
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0017_activity_event'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MpesaTransaction',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('checkout_request_id', models.CharField(max_length=100, unique=True)),
+                ('merchant_request_id', models.CharField(blank=True, max_length=100)),
+                ('phone_number', models.CharField(max_length=15)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10, validators=[django.core.validators.MinValueValidator(1)])),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('success', 'Success'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('result_code', models.IntegerField(blank=True, null=True)),
+                ('result_description', models.CharField(blank=True, max_length=255)),
+                ('receipt_number', models.CharField(blank=True, max_length=50, null=True)),
+                ('date_added', models.DateTimeField(auto_now_add=True)),
+                ('date_completed', models.DateTimeField(blank=True, null=True)),
+                ('invoice', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='mpesa_transactions', to='accounts.invoice')),
+                ('payment', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='mpesa_transaction', to='accounts.payment')),
+                ('requested_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='mpesa_transactions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'M-Pesa Transaction',
+                'verbose_name_plural': 'M-Pesa Transactions',
+                'ordering': ['-date_added'],
+            },
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:10
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def mark_duplicate_references(apps, schema_editor):
+    """
+    Keep the first payment of each (method, reference) pair and suffix the
+    reference of the rest so the unique constraint can be created. The
+    duplicates stay in the ledger for someone to review.
+    """
+    Payment = apps.get_model('accounts', 'Payment')
+    duplicates = (
+        Payment.objects.exclude(transaction_reference__isnull=True).exclude(transaction_reference='')
+        .values('payment_method', 'transaction_reference')
+        .annotate(count=Count('pk'), first=Min('pk')).filter(count__gt=1)
+    )
+    for group in duplicates:
+        extra = Payment.objects.filter(
+            payment_method=group['payment_method'], transaction_reference=group['transaction_reference'],
+        ).exclude(pk=group['first'])
+        for payment in extra.only('pk', 'transaction_reference'):
+            reference = f"{payment.transaction_reference[:80]}-duplicate-{payment.pk}"
+            Payment.objects.filter(pk=payment.pk).update(transaction_reference=reference)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0018_mpesa_transaction'),
+    ]
+
+    operations = [
+        migrations.RunPython(mark_duplicate_references, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='payment',
+            constraint=models.UniqueConstraint(condition=models.Q(('transaction_reference__isnull', False), models.Q(('transaction_reference', ''), _negated=True)), fields=('payment_method', 'transaction_reference'), name='payment_unique_reference'),
+        ),
+    ]
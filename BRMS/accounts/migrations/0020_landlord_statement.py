@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:35
+
+import django.core.serializers.json
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0019_payment_unique_reference'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LandlordStatement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.DateField(help_text='First day of the statement month')),
+                ('rent_billed', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('rent_collected', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('management_fee', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('net_payout', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('payments_count', models.PositiveIntegerField(default=0)),
+                ('apartments', models.JSONField(default=list, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('generated_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('landlord', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='statements', to='accounts.landlord')),
+            ],
+            options={
+                'verbose_name': 'Landlord Statement',
+                'verbose_name_plural': 'Landlord Statements',
+                'ordering': ['-period', 'landlord'],
+                'indexes': [models.Index(fields=['period', 'landlord'], name='statement_period_landlord_idx')],
+                'unique_together': {('landlord', 'period')},
+            },
+        ),
+    ]
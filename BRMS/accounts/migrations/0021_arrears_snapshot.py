@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0020_landlord_statement'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArrearsSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('snapshot_date', models.DateField()),
+                ('scope', models.CharField(choices=[('tenant', 'Tenant'), ('house', 'House'), ('apartment', 'Apartment'), ('landlord', 'Landlord')], max_length=20)),
+                ('object_id', models.PositiveBigIntegerField()),
+                ('days_0_30', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('days_31_60', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('days_61_90', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('days_over_90', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('invoices_count', models.PositiveIntegerField(default=0)),
+                ('landlord', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='arrears_snapshots', to='accounts.landlord')),
+            ],
+            options={
+                'verbose_name': 'Arrears Snapshot',
+                'verbose_name_plural': 'Arrears Snapshots',
+                'ordering': ['-snapshot_date', 'scope', 'object_id'],
+                'indexes': [models.Index(fields=['scope', 'object_id', 'snapshot_date'], name='arrears_object_date_idx'), models.Index(fields=['landlord', 'snapshot_date', 'id'], name='arrears_landlord_date_idx')],
+                'unique_together': {('snapshot_date', 'scope', 'object_id', 'landlord')},
+            },
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:40
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def open_current_intervals(apps, schema_editor):
+    """
+    Earlier history was not kept: start each house's record with its current
+    status and tenant, from the day the house was added
+    """
+    House = apps.get_model('accounts', 'House')
+    HouseOccupancyInterval = apps.get_model('accounts', 'HouseOccupancyInterval')
+    houses = House.objects.order_by('pk').values_list('pk', 'status', 'tenant_id', 'date_added')
+    batch = []
+    for house_id, status, tenant_id, date_added in houses.iterator(chunk_size=2000):
+        batch.append(HouseOccupancyInterval(house_id=house_id, status=status, tenant_id=tenant_id, started_at=date_added))
+        if len(batch) >= 2000:
+            HouseOccupancyInterval.objects.bulk_create(batch)
+            batch = []
+    HouseOccupancyInterval.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0021_arrears_snapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HouseOccupancyInterval',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('vacant', 'Vacant'), ('occupied', 'Occupied'), ('maintenance', 'Under Maintenance')], max_length=20)),
+                ('started_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('ended_at', models.DateTimeField(blank=True, null=True)),
+                ('house', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='occupancy_intervals', to='accounts.house')),
+                ('tenant', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='occupancy_intervals', to='accounts.tenant')),
+            ],
+            options={
+                'verbose_name': 'House Occupancy Interval',
+                'verbose_name_plural': 'House Occupancy Intervals',
+                'ordering': ['house', 'started_at'],
+                'indexes': [models.Index(fields=['house', 'started_at'], name='occupancy_house_started_idx'), models.Index(fields=['started_at', 'ended_at'], name='occupancy_started_ended_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('ended_at__isnull', True)), fields=('house',), name='occupancy_one_open_interval')],
+            },
+        ),
+        migrations.RunPython(open_current_intervals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0022_house_occupancy_interval'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='housebooking',
+            name='waitlist_position',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AlterField(
+            model_name='housebooking',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('waitlisted', 'Waitlisted'), ('approved', 'Approved'), ('rejected', 'Rejected'), ('completed', 'Completed'), ('cancelled', 'Cancelled')], default='pending', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='housebooking',
+            index=models.Index(fields=['house', 'status'], name='booking_house_status_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='housebooking',
+            constraint=models.UniqueConstraint(condition=models.Q(('waitlist_position__isnull', False)), fields=('house', 'waitlist_position'), name='booking_waitlist_position'),
+        ),
+    ]
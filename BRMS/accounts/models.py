@@ -1,9 +1,18 @@
-from django.db import models
-from datetime import timedelta
+import calendar
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction
+from django.db.models import Case, Count, F, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce
+from django.db.models.lookups import GreaterThan, GreaterThanOrEqual
 from django.utils import timezone
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
-from django.dispatch import receiver
+from django.db.models.signals import post_save, post_delete, pre_delete
+from django.dispatch import Signal, receiver
 from django.core.validators import (
     RegexValidator, 
     MinValueValidator, 
@@ -123,6 +132,10 @@ class Landlord(models.Model):
         verbose_name = 'Landlord'
         verbose_name_plural = 'Landlords'
         ordering = ['first_name']
+        indexes = [
+            # Keyset pagination
+            models.Index(fields=['date_added', 'id'], name='landlord_date_added_id_idx'),
+        ]
 
 # ApartmentType Model
 class ApartmentType(models.Model):
@@ -191,17 +204,46 @@ class Apartment(models.Model):
     def __str__(self):
         return f"{self.name} - {self.location}"
 
-    def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        # Update total houses count after saving
-        self.total_houses = self.houses.count()
-        if self.total_houses > 0:  # Only update if needed to avoid infinite recursion
-            models.Model.save(self, *args, **kwargs)
+    @classmethod
+    def adjust_house_count(cls, apartment_id, delta):
+        """
+        Atomically shift total_houses for one apartment by delta.
+        Skipped (and remembered) while counters are deferred.
+        """
+        if apartment_id is None or not delta:
+            return
+        deferred = getattr(_house_counters, 'deferred', None)
+        if deferred is not None:
+            deferred.add(apartment_id)
+            return
+        cls.objects.filter(pk=apartment_id).update(total_houses=F('total_houses') + delta)
+
+    @classmethod
+    def refresh_house_counts(cls, apartment_ids=None):
+        """
+        Recompute total_houses from the houses table in a single grouped UPDATE.
+        Pass apartment_ids to limit the repair to those apartments.
+        """
+        house_counts = (
+            House.objects.filter(apartment=OuterRef('pk'))
+            .order_by()
+            .values('apartment')
+            .annotate(count=Count('pk'))
+            .values('count')
+        )
+        queryset = cls.objects.all()
+        if apartment_ids is not None:
+            queryset = queryset.filter(pk__in=apartment_ids)
+        return queryset.update(total_houses=Coalesce(Subquery(house_counts), 0))
 
     class Meta:
         verbose_name = 'Apartment'
         verbose_name_plural = 'Apartments'
         ordering = ['name']
+        indexes = [
+            # Keyset pagination
+            models.Index(fields=['date_added', 'id'], name='apartment_date_added_id_idx'),
+        ]
 
 # HouseType Model
 class HouseType(models.Model):
@@ -303,6 +345,10 @@ class Tenant(models.Model):
         verbose_name = 'Tenant'
         verbose_name_plural = 'Tenants'
         ordering = ['date_added']
+        indexes = [
+            # Keyset pagination
+            models.Index(fields=['date_added', 'id'], name='tenant_date_added_id_idx'),
+        ]
 
 # House Model
 class House(models.Model):
@@ -358,6 +404,17 @@ class House(models.Model):
     date_added = models.DateTimeField(auto_now_add=True)
     image = models.URLField(blank=True, null=True)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the persisted apartment so re-parenting can move the counter
+        instance._saved_apartment_id = instance.__dict__.get('apartment_id')
+        # ...and the tenant, so the activity log can record assignments
+        instance._saved_tenant_id = instance.__dict__.get('tenant_id')
+        # ...and both with the status, so occupancy intervals are only cut on a change
+        instance._saved_occupancy = (instance.__dict__.get('status'), instance.__dict__.get('tenant_id'))
+        return instance
+
     def __str__(self):
         return f"House {self.number} - {self.apartment.name}"
 
@@ -367,21 +424,124 @@ class House(models.Model):
             self.status = 'occupied'
         elif self.status != 'maintenance':
             self.status = 'vacant'
-        super().save(*args, **kwargs)
-        
-        # Update apartment's total houses count
-        self.apartment.save()
+
+        with transaction.atomic():
+            adding = self._state.adding
+            previous_apartment_id = getattr(self, '_saved_apartment_id', None)
+            previous_occupancy = getattr(self, '_saved_occupancy', None)
+            super().save(*args, **kwargs)
+
+            # Keep the apartment's total houses count in step
+            if adding:
+                Apartment.adjust_house_count(self.apartment_id, 1)
+            elif previous_apartment_id is not None and previous_apartment_id != self.apartment_id:
+                Apartment.adjust_house_count(previous_apartment_id, -1)
+                Apartment.adjust_house_count(self.apartment_id, 1)
+
+            # Start a new occupancy interval when the status or tenant changes
+            if previous_occupancy != (self.status, self.tenant_id):
+                HouseOccupancyInterval.record_transition(self.pk, self.status, self.tenant_id)
+        self._saved_apartment_id = self.apartment_id
+        self._saved_occupancy = (self.status, self.tenant_id)
 
     class Meta:
         verbose_name = 'House'
         verbose_name_plural = 'Houses'
         ordering = ['apartment', 'number']
         unique_together = ['apartment', 'number']  # Ensure house numbers are unique within each apartment
+        indexes = [
+            # Keyset pagination
+            models.Index(fields=['date_added', 'id'], name='house_date_added_id_idx'),
+            # House browsing filters
+            models.Index(fields=['status', 'monthly_rent'], name='house_status_rent_idx'),
+            models.Index(fields=['status', 'house_type'], name='house_status_type_idx'),
+        ]
+
+# HouseOccupancyInterval Model
+class HouseOccupancyInterval(models.Model):
+    """
+    A span of time a house spent in one status with one tenant. House.save()
+    closes the open interval and opens a new one whenever either changes, so
+    vacancy and occupancy over any period are range aggregates over these
+    rows (see accounts.occupancy). `ended_at` is null for the current one.
+    """
+    house = models.ForeignKey(
+        House,
+        on_delete=models.CASCADE,
+        related_name='occupancy_intervals',
+        db_index=False
+    )
+    status = models.CharField(max_length=20, choices=House.STATUS_CHOICES)
+    tenant = models.ForeignKey(
+        Tenant,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='occupancy_intervals'
+    )
+    started_at = models.DateTimeField(default=timezone.now)
+    ended_at = models.DateTimeField(null=True, blank=True)
+
+    @classmethod
+    def record_transition(cls, house_id, status, tenant_id, at=None):
+        """
+        Close the house's open interval, unless it already has this status
+        and tenant, and open one that does
+        """
+        at = at or timezone.now()
+        current = cls.objects.filter(house_id=house_id, ended_at__isnull=True)
+        current.exclude(status=status, tenant_id=tenant_id).update(ended_at=at)
+        if not current.exists():
+            cls.objects.create(house_id=house_id, status=status, tenant_id=tenant_id, started_at=at)
+
+    @classmethod
+    def record_transitions(cls, houses, at=None, chunk_size=500):
+        """
+        record_transition() for houses written without House.save() (e.g.
+        bulk imports): one UPDATE and one INSERT per chunk of changed houses
+        """
+        at = at or timezone.now()
+        changed = [
+            house for house in houses
+            if getattr(house, '_saved_occupancy', None) != (house.status, house.tenant_id)
+        ]
+        for start in range(0, len(changed), chunk_size):
+            chunk = changed[start:start + chunk_size]
+            cls.objects.filter(house_id__in=[house.pk for house in chunk], ended_at__isnull=True).update(ended_at=at)
+            cls.objects.bulk_create([
+                cls(house_id=house.pk, status=house.status, tenant_id=house.tenant_id, started_at=at)
+                for house in chunk
+            ])
+        for house in changed:
+            house._saved_occupancy = (house.status, house.tenant_id)
+        return len(changed)
+
+    def __str__(self):
+        return f'House #{self.house_id} {self.get_status_display()} from {self.started_at:%Y-%m-%d}'
+
+    class Meta:
+        verbose_name = 'House Occupancy Interval'
+        verbose_name_plural = 'House Occupancy Intervals'
+        ordering = ['house', 'started_at']
+        indexes = [
+            # A house's history, and the intervals overlapping a period
+            models.Index(fields=['house', 'started_at'], name='occupancy_house_started_idx'),
+            models.Index(fields=['started_at', 'ended_at'], name='occupancy_started_ended_idx'),
+        ]
+        constraints = [
+            # At most one open interval per house
+            models.UniqueConstraint(
+                fields=['house'],
+                condition=Q(ended_at__isnull=True),
+                name='occupancy_one_open_interval',
+            ),
+        ]
 
 # HouseBooking Model
 class HouseBooking(models.Model):
     STATUS_CHOICES = [
         ('pending', 'Pending'),
+        ('waitlisted', 'Waitlisted'),
         ('approved', 'Approved'),
         ('rejected', 'Rejected'),
         ('completed', 'Completed'),
@@ -416,6 +576,23 @@ class HouseBooking(models.Model):
     booking_date = models.DateTimeField(default=timezone.now)
     move_in_date = models.DateField(null=True, blank=True)
     date_added = models.DateTimeField(auto_now_add=True)
+    # Place in the house's queue while waitlisted; positions only grow, so
+    # leaving the queue never renumbers the bookings behind
+    waitlist_position = models.PositiveIntegerField(null=True, blank=True, editable=False)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the persisted status so the activity log can record changes
+        instance._saved_status = instance.__dict__.get('status')
+        return instance
+
+    def save(self, *args, **kwargs):
+        # Only waitlisted bookings hold a place, so the head of the queue is
+        # always the first entry in the (house, waitlist_position) index
+        if self.status != 'waitlisted':
+            self.waitlist_position = None
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f'Booking: {self.tenant} - {self.house} ({self.get_status_display()})'
@@ -424,6 +601,53 @@ class HouseBooking(models.Model):
         verbose_name = 'House Booking'
         verbose_name_plural = 'House Bookings'
         ordering = ['-date_added']
+        indexes = [
+            # Keyset pagination
+            models.Index(fields=['date_added', 'id'], name='booking_date_added_id_idx'),
+            # A house's pending bookings without reading its whole waitlist
+            models.Index(fields=['house', 'status'], name='booking_house_status_idx'),
+        ]
+        constraints = [
+            # The waitlist per house, in order
+            models.UniqueConstraint(
+                fields=['house', 'waitlist_position'],
+                condition=Q(waitlist_position__isnull=False),
+                name='booking_waitlist_position',
+            ),
+        ]
+
+def default_due_date():
+    return timezone.localdate() + timedelta(days=30)
+
+def billing_month(value):
+    """
+    Normalise a month given as a number ("3", "03"), full or short name
+    ("march", "Mar") or a date ("2024-03", "2024-03-01") to the full month
+    name stored in Invoice.month.
+    """
+    text = str(value).strip()
+    parts = text.split('-')
+    if len(parts) in (2, 3) and all(part.isdigit() for part in parts) and len(parts[0]) == 4:
+        text = parts[1]
+    if text.isdigit():
+        number = int(text)
+        if 1 <= number <= 12:
+            return calendar.month_name[number]
+    else:
+        for number in range(1, 13):
+            if text.lower() in (calendar.month_name[number].lower(), calendar.month_abbr[number].lower()):
+                return calendar.month_name[number]
+    raise ValueError(f"Invalid month: {value!r}")
+
+def billing_period(month, year):
+    """
+    First day of the billing month, or None if month/year cannot be parsed.
+    """
+    try:
+        number = list(calendar.month_name).index(billing_month(month))
+        return date(int(year), number, 1)
+    except (TypeError, ValueError):
+        return None
 
 # Invoice Model
 class Invoice(models.Model):
@@ -446,6 +670,12 @@ class Invoice(models.Model):
     )
     month = models.CharField(max_length=20)
     year = models.IntegerField()
+    period = models.DateField(
+        null=True,
+        blank=True,
+        editable=False,
+        help_text="First day of the billing month, derived from month and year"
+    )
     rent = models.DecimalField(
         max_digits=10, 
         decimal_places=2,
@@ -479,10 +709,19 @@ class Invoice(models.Model):
         choices=PAYMENT_STATUS_CHOICES,
         default='unpaid'
     )
-    due_date = models.DateField(default=timezone.now() + timedelta(days=30))
+    due_date = models.DateField(default=default_due_date)
     date_added = models.DateTimeField(auto_now_add=True)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the persisted status so the activity log can record changes
+        instance._saved_payment_status = instance.__dict__.get('payment_status')
+        return instance
+
     def save(self, *args, **kwargs):
+        self.period = billing_period(self.month, self.year)
+
         # Calculate total payable
         self.total_payable = self.rent + self.additional_charges - self.discount
         
@@ -491,11 +730,100 @@ class Invoice(models.Model):
             self.payment_status = 'paid'
         elif self.amount_paid > 0:
             self.payment_status = 'partial'
-        elif self.due_date and self.due_date < models.functions.Now().date() and self.payment_status == 'unpaid':
+        elif self.due_date and self.due_date < timezone.localdate() and self.payment_status == 'unpaid':
             self.payment_status = 'overdue'
         
         super().save(*args, **kwargs)
 
+    @classmethod
+    def tracked_update(cls, queryset, **assignments):
+        """
+        queryset.update(**assignments), then send invoice_statuses_changed for
+        the invoices whose payment_status it moved: queryset UPDATEs skip the
+        post_save receiver that logs status changes. Two extra queries, however
+        many rows.
+        """
+        with transaction.atomic(using=queryset.db, savepoint=False):
+            before = dict(queryset.select_for_update().order_by().values_list('pk', 'payment_status'))
+            if not before:
+                return 0
+            invoices = cls.objects.using(queryset.db).filter(pk__in=before).order_by()
+            updated = invoices.update(**assignments)
+            changes = [
+                (pk, payment_status) for pk, payment_status in invoices.values_list('pk', 'payment_status')
+                if before[pk] != payment_status
+            ]
+            if changes:
+                invoice_statuses_changed.send(sender=cls, changes=changes, using=queryset.db)
+        return updated
+
+    @classmethod
+    def apply_payment(cls, invoice_id, amount):
+        """
+        Add amount (negative to reverse) to an invoice's amount_paid and
+        recompute payment_status in the same UPDATE statement, so concurrent
+        payments on one invoice cannot lose each other's updates.
+        """
+        if invoice_id is None or not amount:
+            return 0
+        return cls.tracked_update(
+            cls.objects.filter(pk=invoice_id), **cls.ledger_update(Value(amount, output_field=models.DecimalField()))
+        )
+
+    @classmethod
+    def apply_payments(cls, totals, chunk_size=500):
+        """
+        apply_payment() for many invoices at once: `totals` maps invoice id to
+        amount. Invoices paid the same amount share an UPDATE, so a batch of
+        rent payments costs one statement per distinct amount, not per invoice.
+        """
+        by_amount = defaultdict(list)
+        for pk, amount in totals.items():
+            if pk is not None and amount:
+                by_amount[amount].append(pk)
+        updated = 0
+        for amount, pks in by_amount.items():
+            assignments = cls.ledger_update(Value(amount, output_field=models.DecimalField()))
+            for start in range(0, len(pks), chunk_size):
+                updated += cls.tracked_update(cls.objects.filter(pk__in=pks[start:start + chunk_size]), **assignments)
+        return updated
+
+    @classmethod
+    def ledger_update(cls, amount):
+        """
+        UPDATE assignments adding `amount` to amount_paid and recomputing payment_status
+        """
+        amount_paid = F('amount_paid') + amount
+        return {
+            'amount_paid': amount_paid,
+            'payment_status': cls.payment_status_case(amount_paid, F('total_payable')),
+        }
+
+    @classmethod
+    def payment_status_case(cls, amount_paid, total_payable):
+        return Case(
+            When(GreaterThanOrEqual(amount_paid, total_payable), then=Value('paid')),
+            When(GreaterThan(amount_paid, 0), then=Value('partial')),
+            When(due_date__lt=timezone.localdate(), then=Value('overdue')),
+            default=Value('unpaid'),
+        )
+
+    @classmethod
+    def refresh_totals(cls, invoice_ids=None):
+        """
+        Recompute total_payable and payment_status from the stored columns in
+        one UPDATE, for rows written without Invoice.save() (e.g. bulk imports).
+        Pass invoice_ids to limit it to those invoices.
+        """
+        total_payable = F('rent') + F('additional_charges') - F('discount')
+        queryset = cls.objects.all()
+        if invoice_ids is not None:
+            queryset = queryset.filter(pk__in=invoice_ids)
+        return queryset.update(
+            total_payable=total_payable,
+            payment_status=cls.payment_status_case(F('amount_paid'), total_payable),
+        )
+
     def __str__(self):
         return f'Invoice {self.id} for {self.tenant} - {self.month}/{self.year}'
 
@@ -504,6 +832,18 @@ class Invoice(models.Model):
         verbose_name_plural = 'Invoices'
         ordering = ['-date_added']
         unique_together = ['tenant', 'house', 'month', 'year']  # Prevent duplicate invoices
+        indexes = [
+            # Keyset pagination
+            models.Index(fields=['date_added', 'id'], name='invoice_date_added_id_idx'),
+            # Backs the overdue sweep and unpaid listings
+            models.Index(fields=['payment_status', 'due_date'], name='invoice_status_due_idx'),
+            # Period range queries per tenant and per house
+            models.Index(fields=['tenant', 'period'], name='invoice_tenant_period_idx'),
+            models.Index(fields=['house', 'period'], name='invoice_house_period_idx'),
+        ]
+
+# Sent with changes=[(invoice id, new payment_status)] by Invoice.tracked_update()
+invoice_statuses_changed = Signal()
 
 # Payment Model
 class Payment(models.Model):
@@ -538,13 +878,34 @@ class Payment(models.Model):
     payment_date = models.DateTimeField(auto_now_add=True)
     notes = models.TextField(blank=True, null=True)
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what was last applied to the invoice ledger
+        instance._saved_invoice_id = instance.__dict__.get('invoice_id')
+        instance._saved_amount = instance.__dict__.get('amount')
+        return instance
+
     def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        # Update the invoice payment status
-        invoice = self.invoice
-        total_payments = sum(payment.amount for payment in invoice.payments.all())
-        invoice.amount_paid = total_payments
-        invoice.save()
+        with transaction.atomic():
+            adding = self._state.adding
+            previous_invoice_id = getattr(self, '_saved_invoice_id', None)
+            previous_amount = getattr(self, '_saved_amount', None)
+            super().save(*args, **kwargs)
+
+            # Apply only the change to the invoice balance
+            if adding:
+                Invoice.apply_payment(self.invoice_id, self.amount)
+            elif previous_invoice_id is not None and previous_invoice_id != self.invoice_id:
+                Invoice.apply_payment(previous_invoice_id, -previous_amount)
+                Invoice.apply_payment(self.invoice_id, self.amount)
+            elif previous_amount is not None:
+                Invoice.apply_payment(self.invoice_id, self.amount - previous_amount)
+        self._saved_invoice_id = self.invoice_id
+        self._saved_amount = self.amount
+
+        if Payment.invoice.is_cached(self):
+            self.invoice.refresh_from_db(fields=['amount_paid', 'payment_status'])
     
     def __str__(self):
         return f"Payment of {self.amount} for Invoice #{self.invoice.id}"
@@ -553,6 +914,273 @@ class Payment(models.Model):
         verbose_name = 'Payment'
         verbose_name_plural = 'Payments'
         ordering = ['-payment_date']
+        indexes = [
+            # Keyset pagination
+            models.Index(fields=['payment_date', 'id'], name='payment_date_id_idx'),
+        ]
+        constraints = [
+            # One payment per provider reference; also the index reference lookups use
+            models.UniqueConstraint(
+                fields=['payment_method', 'transaction_reference'],
+                condition=Q(transaction_reference__isnull=False) & ~Q(transaction_reference=''),
+                name='payment_unique_reference',
+            ),
+        ]
+
+# MpesaTransaction Model
+class MpesaTransaction(models.Model):
+    """
+    An M-Pesa STK push request and its outcome. Written when the push is
+    accepted and completed by the gateway's callback; the status endpoint
+    reads from the cache and only falls back to this table on a miss.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('success', 'Success'),
+        ('failed', 'Failed'),
+    ]
+
+    checkout_request_id = models.CharField(
+        max_length=100,
+        unique=True
+    )
+    merchant_request_id = models.CharField(
+        max_length=100,
+        blank=True
+    )
+    invoice = models.ForeignKey(
+        Invoice,
+        on_delete=models.CASCADE,
+        related_name='mpesa_transactions'
+    )
+    requested_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='mpesa_transactions'
+    )
+    phone_number = models.CharField(max_length=15)
+    amount = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        validators=[MinValueValidator(1)]
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default='pending'
+    )
+    result_code = models.IntegerField(null=True, blank=True)
+    result_description = models.CharField(max_length=255, blank=True)
+    receipt_number = models.CharField(max_length=50, blank=True, null=True)
+    payment = models.OneToOneField(
+        Payment,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='mpesa_transaction'
+    )
+    date_added = models.DateTimeField(auto_now_add=True)
+    date_completed = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f'M-Pesa {self.checkout_request_id} for Invoice #{self.invoice_id} ({self.get_status_display()})'
+
+    class Meta:
+        verbose_name = 'M-Pesa Transaction'
+        verbose_name_plural = 'M-Pesa Transactions'
+        ordering = ['-date_added']
+
+# ActivityEvent Model
+class ActivityEvent(models.Model):
+    """
+    Append-only log of what happened to bookings, invoices, payments and house
+    tenancies. Each event carries the landlord and tenant it concerns, so a
+    role's feed is a range scan on one (scope, created_at) index.
+    """
+    EVENT_TYPE_CHOICES = [
+        ('booking_created', 'Booking Created'),
+        ('booking_status', 'Booking Status Changed'),
+        ('invoice_created', 'Invoice Created'),
+        ('invoice_status', 'Invoice Status Changed'),
+        ('payment_received', 'Payment Received'),
+        ('payment_reversed', 'Payment Reversed'),
+        ('tenant_assigned', 'Tenant Assigned'),
+        ('tenant_vacated', 'Tenant Vacated'),
+    ]
+
+    event_type = models.CharField(
+        max_length=30,
+        choices=EVENT_TYPE_CHOICES
+    )
+    landlord = models.ForeignKey(
+        Landlord,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='activities',
+        db_index=False
+    )
+    tenant = models.ForeignKey(
+        Tenant,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='activities',
+        db_index=False
+    )
+    object_id = models.PositiveBigIntegerField()
+    summary = models.CharField(max_length=255)
+    amount = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        blank=True,
+        null=True
+    )
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Activity events are append-only")
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f'{self.get_event_type_display()}: {self.summary}'
+
+    class Meta:
+        verbose_name = 'Activity Event'
+        verbose_name_plural = 'Activity Events'
+        ordering = ['-created_at', '-id']
+        indexes = [
+            # Per-role feeds, newest first
+            models.Index(fields=['landlord', 'created_at', 'id'], name='activity_landlord_created_idx'),
+            models.Index(fields=['tenant', 'created_at', 'id'], name='activity_tenant_created_idx'),
+            models.Index(fields=['created_at', 'id'], name='activity_created_id_idx'),
+        ]
+
+# LandlordStatement Model
+class LandlordStatement(models.Model):
+    """
+    A landlord's payout statement for one billing month: rent collected,
+    the management fee at each apartment's management_fee_percentage, and the
+    net payout, with the per-apartment and per-house breakdown in `apartments`.
+    Written by statements.generate_statements(); re-running it replaces the
+    stored figures.
+    """
+    landlord = models.ForeignKey(
+        Landlord,
+        on_delete=models.CASCADE,
+        related_name='statements'
+    )
+    period = models.DateField(help_text="First day of the statement month")
+    rent_billed = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    rent_collected = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    management_fee = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    net_payout = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    payments_count = models.PositiveIntegerField(default=0)
+    apartments = models.JSONField(default=list, encoder=DjangoJSONEncoder)
+    generated_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f'Statement for {self.landlord} - {self.period:%B %Y}'
+
+    class Meta:
+        verbose_name = 'Landlord Statement'
+        verbose_name_plural = 'Landlord Statements'
+        ordering = ['-period', 'landlord']
+        unique_together = ['landlord', 'period']
+        indexes = [
+            # All owners' statements for a month
+            models.Index(fields=['period', 'landlord'], name='statement_period_landlord_idx'),
+        ]
+
+# ArrearsSnapshot Model
+class ArrearsSnapshot(models.Model):
+    """
+    One night's arrears aging for a tenant, house, apartment or landlord,
+    written by aging.take_snapshot(). Rows carry their landlord, so a
+    landlord's history is a range scan; tenant rows are per landlord.
+    """
+    SCOPE_CHOICES = [
+        ('tenant', 'Tenant'),
+        ('house', 'House'),
+        ('apartment', 'Apartment'),
+        ('landlord', 'Landlord'),
+    ]
+
+    snapshot_date = models.DateField()
+    scope = models.CharField(max_length=20, choices=SCOPE_CHOICES)
+    object_id = models.PositiveBigIntegerField()
+    landlord = models.ForeignKey(
+        Landlord,
+        on_delete=models.CASCADE,
+        related_name='arrears_snapshots',
+        db_index=False
+    )
+    days_0_30 = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    days_31_60 = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    days_61_90 = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    days_over_90 = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    invoices_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.get_scope_display()} #{self.object_id} arrears on {self.snapshot_date}'
+
+    class Meta:
+        verbose_name = 'Arrears Snapshot'
+        verbose_name_plural = 'Arrears Snapshots'
+        ordering = ['-snapshot_date', 'scope', 'object_id']
+        unique_together = ['snapshot_date', 'scope', 'object_id', 'landlord']
+        indexes = [
+            # Trend for one tenant, house, apartment or landlord
+            models.Index(fields=['scope', 'object_id', 'snapshot_date'], name='arrears_object_date_idx'),
+            # A landlord's snapshots, newest first
+            models.Index(fields=['landlord', 'snapshot_date', 'id'], name='arrears_landlord_date_idx'),
+        ]
+
+# Apartment.total_houses counter maintenance
+_house_counters = threading.local()
+
+@contextmanager
+def defer_house_counts():
+    """
+    Suspend per-save total_houses updates for the current thread.
+
+    Apartments touched inside the block are recounted in one grouped query on
+    exit. Bulk paths that bypass House.save() (bulk_create, queryset.update)
+    should add the affected apartment ids to the yielded set.
+    """
+    if getattr(_house_counters, 'deferred', None) is not None:
+        # Nested block: the outermost one does the refresh
+        yield _house_counters.deferred
+        return
+
+    _house_counters.deferred = touched = set()
+    try:
+        yield touched
+    finally:
+        _house_counters.deferred = None
+    if touched:
+        Apartment.refresh_house_counts(touched)
+
+@receiver(post_delete, sender=House)
+def decrement_apartment_house_count(sender, instance, **kwargs):
+    Apartment.adjust_house_count(instance.apartment_id, -1)
+
+@receiver(pre_delete, sender=Tenant)
+def vacate_tenant_houses(sender, instance, **kwargs):
+    # House.tenant's SET_NULL is a queryset UPDATE, which would leave the
+    # house occupied by nobody and its occupancy interval open; save() vacates
+    # it and records the transition instead
+    for house in House.objects.filter(tenant=instance):
+        house.tenant = None
+        house.save()
+
+@receiver(post_delete, sender=Payment)
+def reverse_invoice_payment(sender, instance, **kwargs):
+    Invoice.apply_payment(instance.invoice_id, -instance.amount)
 
 # Signals to create profile and role automatically
 @receiver(post_save, sender=User)
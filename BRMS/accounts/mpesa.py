@@ -0,0 +1,290 @@
+"""
+M-Pesa (Daraja) STK push gateway.
+
+A payment is a three step exchange:
+
+1. initiate: one OAuth token fetch (cached until it expires) and one STK push
+   request. Both run off the event loop, so an async view awaiting them holds
+   no worker while Safaricom responds.
+2. callback: Safaricom posts the outcome to MPESA['CALLBACK_URL'];
+   record_callback() turns a successful one into a Payment exactly once.
+   The callback URL carries MPESA['CALLBACK_TOKEN'] and is refused without
+   it. A success is only recorded for the amount that was pushed, and
+   (unless CONFIRM_CALLBACKS is off) once an STK push query agrees with it.
+3. status: clients poll status(), which is answered from the cache entry the
+   first two steps keep current rather than from the database.
+
+Nothing waits for the customer to confirm on their phone, so a burst of
+pending transactions costs cache entries, not workers. With several worker
+processes the default cache must be shared (e.g. Redis or Memcached); a
+process that misses the cache falls back to the MpesaTransaction row once.
+
+Settings live in the MPESA dict; `manage.py run_fake_mpesa` serves a local
+stand-in for the gateway (see fake_mpesa.py).
+"""
+import asyncio
+import base64
+import json
+import logging
+import urllib.error
+import urllib.request
+from decimal import Decimal, ROUND_HALF_UP
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .models import MpesaTransaction, Payment
+
+logger = logging.getLogger(__name__)
+
+# How long a transaction's status stays in the cache
+STATUS_TTL = 60 * 60
+
+TOKEN_CACHE_KEY = 'mpesa:access-token'
+
+
+class MpesaError(Exception):
+    pass
+
+
+def config():
+    return getattr(settings, 'MPESA', {})
+
+
+def status_key(checkout_request_id):
+    return f'mpesa:status:{checkout_request_id}'
+
+
+def normalize_phone(phone_number):
+    """
+    '0712345678', '+254712345678' or '712345678' -> '254712345678', else None
+    """
+    digits = ''.join(ch for ch in str(phone_number) if ch.isdigit())
+    if len(digits) == 10 and digits.startswith('0'):
+        digits = '254' + digits[1:]
+    elif len(digits) == 9:
+        digits = '254' + digits
+    if len(digits) == 12 and digits.startswith(('2547', '2541')):
+        return digits
+    return None
+
+
+def whole_shillings(amount):
+    """
+    STK push only accepts whole shillings
+    """
+    return int(Decimal(str(amount)).quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+
+
+class MpesaClient:
+    def __init__(self, options=None):
+        options = options or config()
+        self.base_url = options.get('BASE_URL', '').rstrip('/')
+        self.consumer_key = options.get('CONSUMER_KEY', '')
+        self.consumer_secret = options.get('CONSUMER_SECRET', '')
+        self.shortcode = str(options.get('SHORTCODE', ''))
+        self.passkey = options.get('PASSKEY', '')
+        self.callback_url = options.get('CALLBACK_URL', '')
+        self.callback_token = options.get('CALLBACK_TOKEN', '')
+        self.timeout = options.get('TIMEOUT', 10)
+
+    def _send(self, method, path, body=None, headers=None):
+        data = json.dumps(body).encode() if body is not None else None
+        request = urllib.request.Request(self.base_url + path, data=data, method=method, headers=headers or {})
+        if data is not None:
+            request.add_header('Content-Type', 'application/json')
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return json.loads(response.read() or b'{}')
+        except urllib.error.HTTPError as e:
+            detail = e.read().decode(errors='replace')[:200]
+            raise MpesaError(f"M-Pesa returned HTTP {e.code}: {detail}") from e
+        except (urllib.error.URLError, TimeoutError, ValueError) as e:
+            raise MpesaError(f"M-Pesa request failed: {e}") from e
+
+    async def request(self, method, path, body=None, headers=None):
+        # urllib blocks, so it runs on the executor and the event loop stays free
+        return await asyncio.to_thread(self._send, method, path, body, headers)
+
+    async def access_token(self):
+        token = await cache.aget(TOKEN_CACHE_KEY)
+        if token:
+            return token
+        credentials = base64.b64encode(f'{self.consumer_key}:{self.consumer_secret}'.encode()).decode()
+        response = await self.request(
+            'GET', '/oauth/v1/generate?grant_type=client_credentials',
+            headers={'Authorization': f'Basic {credentials}'},
+        )
+        token = response.get('access_token')
+        if not token:
+            raise MpesaError("M-Pesa did not return an access token")
+        # Refresh a minute before Safaricom expires it
+        expires_in = int(response.get('expires_in', 3599))
+        await cache.aset(TOKEN_CACHE_KEY, token, max(expires_in - 60, 60))
+        return token
+
+    def password(self, timestamp):
+        return base64.b64encode(f'{self.shortcode}{self.passkey}{timestamp}'.encode()).decode()
+
+    def callback(self):
+        if self.callback_token:
+            return f'{self.callback_url}?token={self.callback_token}'
+        return self.callback_url
+
+    async def stk_push(self, phone_number, amount, account_reference, description):
+        """
+        Ask Safaricom to prompt the customer's phone. Returns the gateway's
+        acknowledgement (CheckoutRequestID, MerchantRequestID, CustomerMessage).
+        """
+        timestamp = timezone.localtime().strftime('%Y%m%d%H%M%S')
+        token = await self.access_token()
+        response = await self.request('POST', '/mpesa/stkpush/v1/processrequest', body={
+            'BusinessShortCode': self.shortcode,
+            'Password': self.password(timestamp),
+            'Timestamp': timestamp,
+            'TransactionType': 'CustomerPayBillOnline',
+            'Amount': whole_shillings(amount),
+            'PartyA': phone_number,
+            'PartyB': self.shortcode,
+            'PhoneNumber': phone_number,
+            'CallBackURL': self.callback(),
+            # Daraja caps these at 12 and 13 characters
+            'AccountReference': account_reference[:12],
+            'TransactionDesc': description[:13],
+        }, headers={'Authorization': f'Bearer {token}'})
+        if str(response.get('ResponseCode')) != '0' or not response.get('CheckoutRequestID'):
+            raise MpesaError(response.get('errorMessage') or response.get('ResponseDescription') or "STK push rejected")
+        return response
+
+    async def stk_query(self, checkout_request_id):
+        """
+        Ask Safaricom for the outcome of a push. ResultCode 0 in the response
+        means the customer paid; a push still awaiting the customer is an
+        MpesaError.
+        """
+        timestamp = timezone.localtime().strftime('%Y%m%d%H%M%S')
+        token = await self.access_token()
+        return await self.request('POST', '/mpesa/stkpushquery/v1/query', body={
+            'BusinessShortCode': self.shortcode,
+            'Password': self.password(timestamp),
+            'Timestamp': timestamp,
+            'CheckoutRequestID': checkout_request_id,
+        }, headers={'Authorization': f'Bearer {token}'})
+
+
+def status_payload(transaction_row):
+    payload = {
+        'checkout_request_id': transaction_row.checkout_request_id,
+        'invoice_id': transaction_row.invoice_id,
+        'user_id': transaction_row.requested_by_id,
+        'status': transaction_row.status,
+        'success': transaction_row.status == 'success',
+        'amount': str(transaction_row.amount),
+    }
+    if transaction_row.status == 'success':
+        payload['transaction_id'] = transaction_row.receipt_number
+        payload['payment_id'] = transaction_row.payment_id
+    elif transaction_row.status == 'failed':
+        payload['error'] = transaction_row.result_description or "Payment was not completed"
+    return payload
+
+
+def cache_status(transaction_row):
+    payload = status_payload(transaction_row)
+    cache.set(status_key(transaction_row.checkout_request_id), payload, STATUS_TTL)
+    return payload
+
+
+def status(checkout_request_id):
+    """
+    Cached status of a transaction, or None if it is unknown
+    """
+    payload = cache.get(status_key(checkout_request_id))
+    if payload is None:
+        transaction_row = MpesaTransaction.objects.filter(checkout_request_id=checkout_request_id).first()
+        if transaction_row is not None:
+            payload = cache_status(transaction_row)
+    return payload
+
+
+def callback_items(result):
+    items = result.get('CallbackMetadata', {}).get('Item', [])
+    return {item.get('Name'): item.get('Value') for item in items if isinstance(item, dict)}
+
+
+def confirm_success(checkout_request_id):
+    """
+    Whether Safaricom itself reports the push as paid
+    """
+    response = async_to_sync(MpesaClient().stk_query)(checkout_request_id)
+    return str(response.get('ResultCode')) == '0'
+
+
+def record_callback(payload):
+    """
+    Apply an STK callback. Repeated deliveries of the same callback leave the
+    first outcome in place, so a transaction yields at most one Payment.
+    Returns the MpesaTransaction, or None for an unknown CheckoutRequestID.
+
+    A success whose Amount is not what was pushed, or that the STK push query
+    does not confirm, raises MpesaError and leaves the transaction pending.
+    """
+    try:
+        result = payload['Body']['stkCallback']
+        checkout_request_id = result['CheckoutRequestID']
+        result_code = int(result['ResultCode'])
+    except (KeyError, TypeError, ValueError):
+        raise MpesaError("Malformed STK callback")
+
+    transaction_row = MpesaTransaction.objects.filter(checkout_request_id=checkout_request_id).first()
+    if transaction_row is None:
+        logger.warning("STK callback for unknown CheckoutRequestID %s", checkout_request_id)
+        return None
+    if transaction_row.status != 'pending':
+        return transaction_row
+
+    if result_code == 0:
+        items = callback_items(result)
+        try:
+            amount = Decimal(str(items['Amount']))
+        except (KeyError, ArithmeticError):
+            raise MpesaError("Malformed STK callback")
+        if amount != whole_shillings(transaction_row.amount):
+            logger.warning(
+                "STK callback for %s reports %s, but %s was pushed",
+                checkout_request_id, amount, whole_shillings(transaction_row.amount),
+            )
+            raise MpesaError("Callback amount does not match the payment request")
+        # The query runs outside the transaction so no lock is held while Safaricom answers
+        if config().get('CONFIRM_CALLBACKS', True) and not confirm_success(checkout_request_id):
+            logger.warning("STK callback for %s was not confirmed by the push query", checkout_request_id)
+            raise MpesaError("Payment not confirmed by M-Pesa")
+
+    with transaction.atomic():
+        transaction_row = MpesaTransaction.objects.select_for_update().get(pk=transaction_row.pk)
+        if transaction_row.status != 'pending':
+            return transaction_row
+
+        transaction_row.result_code = result_code
+        transaction_row.result_description = str(result.get('ResultDesc', ''))[:255]
+        transaction_row.date_completed = timezone.now()
+        if result_code == 0:
+            receipt = str(items.get('MpesaReceiptNumber') or checkout_request_id)
+            payment = Payment.objects.filter(payment_method='mobile_money', transaction_reference=receipt).first()
+            if payment is None:
+                payment = Payment.objects.create(
+                    invoice_id=transaction_row.invoice_id, amount=amount, payment_method='mobile_money',
+                    transaction_reference=receipt, notes=f'M-Pesa from {items.get("PhoneNumber", transaction_row.phone_number)}',
+                )
+            transaction_row.status = 'success'
+            transaction_row.receipt_number = receipt
+            transaction_row.payment = payment
+        else:
+            transaction_row.status = 'failed'
+        transaction_row.save()
+
+    cache_status(transaction_row)
+    return transaction_row
@@ -0,0 +1,201 @@
+"""
+Push notifications for dashboards over Server-Sent Events.
+
+Booking status changes, new invoices and payment confirmations are already
+written to the activity log; the ones in NOTIFICATION_EVENT_TYPES are also
+published, once their transaction commits, to the channels of the landlord
+and tenant they concern and to the admin channel. The SSE view in
+accounts/views.py subscribes an open connection to the requesting user's
+channel and relays what is published.
+
+The broker is pluggable through the NOTIFICATION_BROKER setting (a dotted
+path to a class with publish(channel, message) and subscribe(channels)).
+The default InProcessBroker only reaches connections held by the same
+process, which suits a single ASGI worker; several workers need a broker
+backed by shared infrastructure (e.g. Redis pub/sub) implementing the same
+two methods.
+"""
+import asyncio
+import json
+import threading
+
+from django.conf import settings
+from django.core import signing
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+NOTIFICATION_EVENT_TYPES = ['booking_status', 'invoice_created', 'payment_received']
+
+# Seconds between keep-alive comments on an idle stream
+HEARTBEAT_SECONDS = getattr(settings, 'NOTIFICATION_HEARTBEAT_SECONDS', 15)
+
+# Seconds a stream ticket can be used to open a connection
+STREAM_TICKET_MAX_AGE = getattr(settings, 'NOTIFICATION_STREAM_TICKET_MAX_AGE', 60)
+STREAM_TICKET_SALT = 'accounts.notifications.stream-ticket'
+
+ADMIN_CHANNEL = 'admin'
+
+
+def landlord_channel(landlord_id):
+    return f'landlord:{landlord_id}'
+
+
+def tenant_channel(tenant_id):
+    return f'tenant:{tenant_id}'
+
+
+def issue_stream_ticket(user, role):
+    """
+    Signed, short-lived value that opens the user's stream for one role.
+    EventSource cannot send an Authorization header, so this goes in the
+    URL in place of the API token, which would otherwise end up in logs.
+    """
+    return signing.dumps({'user': user.pk, 'role': role}, salt=STREAM_TICKET_SALT)
+
+
+def stream_ticket_user_id(ticket, role):
+    """
+    Id of the user a ticket was issued to, or None if it is forged, expired
+    or for another role
+    """
+    try:
+        payload = signing.loads(ticket, salt=STREAM_TICKET_SALT, max_age=STREAM_TICKET_MAX_AGE)
+    except signing.BadSignature:
+        return None
+    if payload.get('role') != role:
+        return None
+    return payload.get('user')
+
+
+class Subscription:
+    """
+    One connection's queue of messages for a set of channels
+    """
+    def __init__(self, broker, channels, max_pending):
+        self.broker = broker
+        self.channels = list(channels)
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=max_pending)
+
+    def deliver(self, message):
+        # Called from any thread; hands the message to the subscriber's event loop
+        self.loop.call_soon_threadsafe(self._put, message)
+
+    def _put(self, message):
+        if self.queue.full():
+            # A stalled client loses its oldest message rather than growing without bound
+            self.queue.get_nowait()
+        self.queue.put_nowait(message)
+
+    async def get(self, timeout=None):
+        """
+        Next message, or None if nothing arrived within timeout seconds
+        """
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class InProcessBroker:
+    """
+    Fan messages out to the subscriptions held by this process
+    """
+    max_pending = 100
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscribers = {}
+
+    def subscribe(self, channels):
+        """
+        Must be called from the event loop that will read the subscription
+        """
+        subscription = Subscription(self, channels, self.max_pending)
+        with self.lock:
+            for channel in subscription.channels:
+                self.subscribers.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            for channel in subscription.channels:
+                subscribers = self.subscribers.get(channel)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self.subscribers[channel]
+
+    def publish(self, channel, message):
+        with self.lock:
+            subscribers = list(self.subscribers.get(channel, ()))
+        for subscription in subscribers:
+            try:
+                subscription.deliver(message)
+            except RuntimeError:
+                # The subscriber's event loop has shut down
+                self.unsubscribe(subscription)
+        return len(subscribers)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                backend = getattr(settings, 'NOTIFICATION_BROKER', 'accounts.notifications.InProcessBroker')
+                _broker = import_string(backend)()
+    return _broker
+
+
+def serialize(event):
+    return {
+        'id': event.pk,
+        'event_type': event.event_type,
+        'event_type_display': event.get_event_type_display(),
+        'object_id': event.object_id,
+        'summary': event.summary,
+        'amount': str(event.amount) if event.amount is not None else None,
+        'created_at': event.created_at.isoformat(),
+    }
+
+
+def publish_events(events, using='default'):
+    """
+    Publish the notification-worthy activity events once the current
+    transaction commits, so subscribers never hear about rolled-back work
+    """
+    messages = []
+    for event in events:
+        if event.event_type not in NOTIFICATION_EVENT_TYPES:
+            continue
+        channels = [ADMIN_CHANNEL]
+        if event.landlord_id is not None:
+            channels.append(landlord_channel(event.landlord_id))
+        if event.tenant_id is not None:
+            channels.append(tenant_channel(event.tenant_id))
+        messages.append((channels, serialize(event)))
+    if not messages:
+        return
+
+    def send():
+        broker = get_broker()
+        for channels, message in messages:
+            for channel in channels:
+                broker.publish(channel, message)
+
+    transaction.on_commit(send, using=using)
+
+
+def sse_message(message):
+    """
+    Encode a message as an SSE frame; the event id lets clients resume with Last-Event-ID
+    """
+    return f"id: {message['id']}\nevent: {message['event_type']}\ndata: {json.dumps(message)}\n\n"
@@ -0,0 +1,67 @@
+"""
+Vacancy and occupancy per apartment over a period, from the house occupancy
+intervals House.save() records.
+
+Every interval overlapping the period is clipped to it in SQL and summed per
+status, grouped by apartment, so a report over any range is one query over
+the (started_at, ended_at) index instead of a replay of bookings or history:
+
+* vacancy_rate: vacant house-days as a percentage of all house-days
+* average_days_vacant: vacant house-days per vacant spell in the period
+* move_ins: occupied intervals that started in the period
+"""
+from django.db.models import Count, DateTimeField, DurationField, ExpressionWrapper, Q, Sum, Value
+from django.db.models.functions import Coalesce, Greatest, Least
+from django.utils import timezone
+
+from .models import HouseOccupancyInterval
+
+SECONDS_PER_DAY = 86400
+
+
+def days(duration):
+    return round(duration.total_seconds() / SECONDS_PER_DAY, 2) if duration else 0.0
+
+
+def occupancy_report(start, end, intervals=None):
+    """
+    Occupancy figures per apartment for [start, end) (aware datetimes; `end`
+    is capped at now), among `intervals` (default: all), in one query
+    """
+    end = min(end, timezone.now())
+    intervals = HouseOccupancyInterval.objects.all() if intervals is None else intervals
+    bound = {'output_field': DateTimeField()}
+    clipped = ExpressionWrapper(
+        Least(Coalesce('ended_at', Value(end, **bound)), Value(end, **bound))
+        - Greatest('started_at', Value(start, **bound)),
+        output_field=DurationField(),
+    )
+    rows = (
+        intervals.filter(Q(ended_at__isnull=True) | Q(ended_at__gt=start), started_at__lt=end)
+        .values_list('house__apartment_id', 'house__apartment__name')
+        .annotate(
+            total=Sum(clipped),
+            occupied=Sum(clipped, filter=Q(status='occupied')),
+            vacant=Sum(clipped, filter=Q(status='vacant')),
+            maintenance=Sum(clipped, filter=Q(status='maintenance')),
+            vacant_spells=Count('pk', filter=Q(status='vacant')),
+            move_ins=Count('pk', filter=Q(status='occupied', started_at__gte=start)),
+            houses=Count('house', distinct=True),
+        )
+        .order_by('house__apartment__name')
+    )
+    report = []
+    for apartment_id, name, total, occupied, vacant, maintenance, vacant_spells, move_ins, houses in rows:
+        report.append({
+            'apartment_id': apartment_id,
+            'name': name,
+            'houses': houses,
+            'house_days': days(total),
+            'occupied_days': days(occupied),
+            'vacant_days': days(vacant),
+            'maintenance_days': days(maintenance),
+            'vacancy_rate': round(vacant / total * 100, 1) if vacant and total else 0.0,
+            'average_days_vacant': round(days(vacant) / vacant_spells, 2) if vacant_spells else 0.0,
+            'move_ins': move_ins,
+        })
+    return report
@@ -0,0 +1,145 @@
+"""
+Batched, idempotent payment ingestion.
+
+A batch of provider callbacks (or a replay of a whole day of them) becomes
+one transaction: existing references are looked up in one query against the
+payment_unique_reference index, new payments are inserted with one
+bulk_create, and the invoices touched get their ledger totals in one UPDATE
+per distinct amount (Invoice.apply_payments) instead of a Payment.save() per
+row. Every item gets an outcome, so a caller can retry the failures and
+ignore the duplicates.
+"""
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+
+from django.db import IntegrityError, transaction
+
+from . import activity
+from .models import Invoice, Payment
+
+# Largest batch ingest_payments() accepts in one call
+MAX_BATCH_SIZE = 5000
+
+PAYMENT_METHODS = dict(Payment.PAYMENT_METHOD_CHOICES)
+
+
+def clean_item(item):
+    """
+    (payment fields, errors) for one raw item
+    """
+    if not isinstance(item, dict):
+        return None, {'non_field_errors': ['Expected an object']}
+    errors = {}
+    invoice_id = item.get('invoice', item.get('invoice_id'))
+    if not str(invoice_id).isdigit():
+        errors['invoice'] = ['A valid invoice id is required']
+    try:
+        amount = Decimal(str(item.get('amount')))
+        if not amount.is_finite() or amount <= 0:
+            raise InvalidOperation
+        amount = amount.quantize(Decimal('0.01'))
+    except (InvalidOperation, ValueError):
+        errors['amount'] = ['A positive amount is required']
+    method = item.get('payment_method', 'mobile_money')
+    if method not in PAYMENT_METHODS:
+        errors['payment_method'] = [f'"{method}" is not a valid choice']
+    reference = str(item.get('transaction_reference') or '').strip()
+    if not reference:
+        errors['transaction_reference'] = ['A transaction reference is required for deduplication']
+    elif len(reference) > 100:
+        errors['transaction_reference'] = ['Ensure this field has no more than 100 characters']
+    if errors:
+        return None, errors
+    return {
+        'invoice_id': int(invoice_id),
+        'amount': amount,
+        'payment_method': method,
+        'transaction_reference': reference,
+        'notes': item.get('notes') or None,
+    }, None
+
+
+def ingest_payments(items, invoices=None):
+    """
+    Record a batch of payments, skipping any whose (payment_method,
+    transaction_reference) is already recorded, in this batch or before.
+
+    `invoices` limits which invoices may be paid (e.g. a landlord's); it
+    defaults to all of them. Returns counts and one result per item, in
+    order: {'index', 'status': 'created'|'duplicate'|'invalid', 'payment_id'
+    or 'errors'}.
+    """
+    if len(items) > MAX_BATCH_SIZE:
+        raise ValueError(f"At most {MAX_BATCH_SIZE} payments can be ingested at once")
+    invoices = Invoice.objects.all() if invoices is None else invoices
+
+    results = [None] * len(items)
+    cleaned = []
+    for index, item in enumerate(items):
+        fields, errors = clean_item(item)
+        if errors:
+            results[index] = {'index': index, 'status': 'invalid', 'errors': errors}
+        else:
+            cleaned.append((index, fields))
+
+    try:
+        ingest_cleaned(cleaned, invoices, results)
+    except IntegrityError:
+        # A concurrent ingest inserted one of our references between the
+        # lookup and the insert; the retry sees it and reports a duplicate
+        ingest_cleaned(cleaned, invoices, results)
+
+    counts = defaultdict(int)
+    for result in results:
+        counts[result['status']] += 1
+    return {
+        'created': counts['created'],
+        'duplicates': counts['duplicate'],
+        'invalid': counts['invalid'],
+        'results': results,
+    }
+
+
+def ingest_cleaned(cleaned, invoices, results):
+    with transaction.atomic():
+        known_invoices = set(
+            invoices.filter(pk__in={fields['invoice_id'] for _, fields in cleaned})
+            .values_list('pk', flat=True)
+        )
+        existing = dict(
+            (((method, reference), pk) for method, reference, pk in Payment.objects.filter(
+                payment_method__in={fields['payment_method'] for _, fields in cleaned},
+                transaction_reference__in={fields['transaction_reference'] for _, fields in cleaned},
+            ).values_list('payment_method', 'transaction_reference', 'pk'))
+        )
+
+        new_payments = []
+        pending = {}
+        for index, fields in cleaned:
+            key = (fields['payment_method'], fields['transaction_reference'])
+            if key in existing:
+                results[index] = {'index': index, 'status': 'duplicate', 'payment_id': existing[key]}
+            elif key in pending:
+                # Repeated within the batch; resolved to the first one's id after the insert
+                results[index] = {'index': index, 'status': 'duplicate', 'payment_id': key}
+            elif fields['invoice_id'] not in known_invoices:
+                results[index] = {'index': index, 'status': 'invalid', 'errors': {'invoice': ['Invoice not found']}}
+            else:
+                pending[key] = index
+                new_payments.append(Payment(**fields))
+
+        # bulk_create skips Payment.save(), so apply the ledger per invoice here
+        created = Payment.objects.bulk_create(new_payments)
+        totals = defaultdict(Decimal)
+        for payment in created:
+            totals[payment.invoice_id] += payment.amount
+        Invoice.apply_payments(totals)
+        activity.record_payments_created(created)
+
+    ids = {(payment.payment_method, payment.transaction_reference): payment.pk for payment in created}
+    for payment in created:
+        index = pending[(payment.payment_method, payment.transaction_reference)]
+        results[index] = {'index': index, 'status': 'created', 'payment_id': payment.pk}
+    for result in results:
+        if result['status'] == 'duplicate' and isinstance(result['payment_id'], tuple):
+            result['payment_id'] = ids[result['payment_id']]
@@ -0,0 +1,241 @@
+"""
+Match bank or mobile-money statement lines to open invoices.
+
+The statement CSV is read line by line, never loaded whole. Before the first
+line, the open invoices in scope are loaded once into in-memory hash indexes:
+
+* invoice id, for lines whose reference or description names an invoice
+  ("Invoice-123", "INV 123")
+* tenant phone (normalized), for lines that only identify the payer
+* (tenant phone, balance in cents), so a payment of exactly the outstanding
+  balance is matched without comparing decimals
+
+Each line is then a few dict lookups. Balances are tracked in memory as lines
+are matched, so two lines never pay the same balance twice. Matches are
+written through payments.ingest_payments() in chunks, which dedups on the
+line's reference; anything that cannot be placed goes to the review report.
+"""
+import csv
+import io
+import re
+import time
+from collections import defaultdict
+from decimal import Decimal
+
+from .models import Invoice, Payment
+from .mpesa import normalize_phone
+from .payments import MAX_BATCH_SIZE, ingest_payments
+
+OPEN_STATUSES = ['unpaid', 'partial', 'overdue']
+
+# Statement header names understood for each field, lowercased
+COLUMN_ALIASES = {
+    'reference': ['reference', 'transaction_reference', 'receipt', 'receipt no.', 'receipt_number', 'transaction id', 'ref'],
+    'amount': ['amount', 'paid in', 'credit', 'paid_in'],
+    'phone': ['phone', 'phone_number', 'msisdn', 'payer phone', 'from'],
+    'description': ['description', 'details', 'narrative', 'account', 'account reference', 'bill ref number'],
+    'date': ['date', 'completion time', 'transaction date', 'value date'],
+}
+
+INVOICE_REFERENCE = re.compile(r'\bINV(?:OICE)?[\s#:-]*(\d+)\b', re.IGNORECASE)
+
+# A statement amount: an optional currency label, thousands separated by
+# commas or not, and a debit shown as a minus sign or in parentheses
+STATEMENT_AMOUNT = re.compile(r"""
+    (?P<open>\()?\s*
+    (?P<lead>-)?\s*
+    (?:(?:KES|KSHS?)\.?\s*)?
+    (?P<after_currency>-)?\s*
+    (?P<whole>\d{1,3}(?:,\d{3})+|\d+)(?P<fraction>\.\d+)?
+    \s*(?P<trail>-)?\s*
+    (?P<close>\))?
+""", re.IGNORECASE | re.VERBOSE)
+
+REPORT_FIELDS = ['line', 'date', 'reference', 'phone', 'amount', 'description', 'reason']
+
+
+def cents(amount):
+    return int((amount * 100).to_integral_value())
+
+
+def parse_amount(text):
+    """
+    The amount as a Decimal, negative for a debit, or None unless the text
+    is a single well-formed number ("KES 1,000.00", "Ksh. 1000", "(250.00)",
+    "250.00-")
+    """
+    match = STATEMENT_AMOUNT.fullmatch(text.strip())
+    if match is None or bool(match['open']) != bool(match['close']):
+        return None
+    debit_marks = [mark for mark in ('open', 'lead', 'after_currency', 'trail') if match[mark]]
+    if len(debit_marks) > 1:
+        return None
+    amount = Decimal(match['whole'].replace(',', '') + (match['fraction'] or ''))
+    return -amount if debit_marks else amount
+
+
+def phone_key(phone_number):
+    if not phone_number:
+        return None
+    return normalize_phone(phone_number) or ''.join(ch for ch in str(phone_number) if ch.isdigit()) or None
+
+
+def resolve_columns(header):
+    """
+    Map each known field to its column index in the statement header
+    """
+    positions = {name.strip().lower(): index for index, name in enumerate(header)}
+    columns = {}
+    for field, aliases in COLUMN_ALIASES.items():
+        for alias in aliases:
+            if alias in positions:
+                columns[field] = positions[alias]
+                break
+    missing = {'reference', 'amount'} - set(columns)
+    if missing:
+        raise ValueError(f"Statement is missing column(s): {', '.join(sorted(missing))}")
+    return columns
+
+
+class InvoiceIndex:
+    """
+    Hash indexes over the open invoices in scope, built in one query
+    """
+    def __init__(self, invoices):
+        self.balance = {}
+        self.by_phone = defaultdict(list)
+        self.by_phone_balance = defaultdict(list)
+        rows = (
+            invoices.filter(payment_status__in=OPEN_STATUSES).order_by('period', 'pk')
+            .values_list('pk', 'total_payable', 'amount_paid', 'tenant__phone_number')
+        )
+        for pk, total, paid, phone_number in rows.iterator(chunk_size=5000):
+            self.balance[pk] = cents(total - paid)
+            key = phone_key(phone_number)
+            if key:
+                self.by_phone[key].append(pk)
+                self.by_phone_balance[key, self.balance[pk]].append(pk)
+
+    def settle(self, invoice_id, amount_cents):
+        self.balance[invoice_id] -= amount_cents
+
+    def match(self, reference_text, phone, amount_cents):
+        """
+        (invoice id, rule) for a line, or (None, reason)
+        """
+        for text in reference_text:
+            found = INVOICE_REFERENCE.search(text or '')
+            if found:
+                invoice_id = int(found.group(1))
+                if invoice_id not in self.balance:
+                    return None, 'Referenced invoice is not open'
+                if self.balance[invoice_id] < amount_cents:
+                    return None, 'Amount exceeds the referenced invoice balance'
+                return invoice_id, 'reference'
+
+        key = phone_key(phone)
+        if not key or key not in self.by_phone:
+            return None, 'No open invoice for this reference or phone'
+        # Exactly the outstanding balance of one of the payer's invoices, oldest first
+        for invoice_id in self.by_phone_balance.get((key, amount_cents), ()):
+            if self.balance[invoice_id] == amount_cents:
+                return invoice_id, 'phone_amount'
+        # Otherwise the oldest open invoice the amount fits into
+        for invoice_id in self.by_phone[key]:
+            if 0 < amount_cents <= self.balance[invoice_id]:
+                return invoice_id, 'phone_oldest'
+        return None, 'Amount exceeds every open balance for this phone'
+
+
+def reconcile_statement(lines, invoices=None, payment_method='bank_transfer', dry_run=False, chunk_size=MAX_BATCH_SIZE):
+    """
+    Reconcile an iterable of CSV text lines (e.g. an open file) against
+    `invoices` (default: all). Returns a summary and the unmatched lines with
+    the reason each one needs review. With dry_run nothing is written.
+    """
+    started = time.monotonic()
+    invoices = Invoice.objects.all() if invoices is None else invoices
+    reader = csv.reader(lines)
+    try:
+        columns = resolve_columns(next(reader))
+    except StopIteration:
+        raise ValueError("Statement is empty")
+    index = InvoiceIndex(invoices)
+    recorded = set(
+        Payment.objects.filter(payment_method=payment_method)
+        .exclude(transaction_reference__isnull=True).exclude(transaction_reference='')
+        .values_list('transaction_reference', flat=True).iterator(chunk_size=5000)
+    )
+
+    def field(row, name):
+        position = columns.get(name)
+        return row[position].strip() if position is not None and position < len(row) else ''
+
+    summary = defaultdict(int, dict.fromkeys(('lines', 'matched', 'created', 'duplicates', 'already_recorded'), 0))
+    unmatched = []
+    batch = []
+
+    def flush():
+        if batch and not dry_run:
+            result = ingest_payments(batch)
+            summary['created'] += result['created']
+            summary['duplicates'] += result['duplicates']
+        batch.clear()
+
+    for row in reader:
+        if not any(cell.strip() for cell in row):
+            continue
+        number = reader.line_num
+        summary['lines'] += 1
+        line = {
+            'line': number, 'date': field(row, 'date'), 'reference': field(row, 'reference'),
+            'phone': field(row, 'phone'), 'amount': field(row, 'amount'), 'description': field(row, 'description'),
+        }
+        amount = parse_amount(line['amount'])
+        if amount is None:
+            reason = 'Unreadable amount'
+        elif amount <= 0:
+            reason = 'Not a credit'
+        elif not line['reference']:
+            reason = 'Missing transaction reference'
+        elif line['reference'] in recorded:
+            summary['already_recorded'] += 1
+            continue
+        else:
+            invoice_id, reason = index.match(
+                [line['reference'], line['description']], line['phone'], cents(amount)
+            )
+            if invoice_id is not None:
+                index.settle(invoice_id, cents(amount))
+                recorded.add(line['reference'])
+                summary['matched'] += 1
+                summary[f'matched_by_{reason}'] += 1
+                batch.append({
+                    'invoice': invoice_id, 'amount': str(amount), 'payment_method': payment_method,
+                    'transaction_reference': line['reference'],
+                    'notes': f"Reconciled from statement line {number} ({reason})",
+                })
+                if len(batch) >= chunk_size:
+                    flush()
+                continue
+        unmatched.append({**line, 'reason': reason})
+    flush()
+
+    elapsed = time.monotonic() - started
+    summary['unmatched'] = len(unmatched)
+    summary['elapsed_seconds'] = round(elapsed, 3)
+    summary['lines_per_second'] = round(summary['lines'] / elapsed, 1) if elapsed else None
+    summary['dry_run'] = dry_run
+    return dict(summary), unmatched
+
+
+def write_report(unmatched, stream):
+    writer = csv.DictWriter(stream, fieldnames=REPORT_FIELDS)
+    writer.writeheader()
+    writer.writerows(unmatched)
+
+
+def report_csv(unmatched):
+    stream = io.StringIO()
+    write_report(unmatched, stream)
+    return stream.getvalue()
@@ -0,0 +1,356 @@
+"""
+django-import-export resources for the admin, with a bulk mode for large files.
+
+The standard resources import the way django-import-export does by default:
+each row is looked up, validated and save()d on its own, so every House also
+moves its apartment's counter and every Invoice runs its status logic. Fine
+for a few rows; minutes for a portfolio.
+
+The Bulk* resources take the same columns but:
+
+* look up existing rows (CachedInstanceLoader) and foreign keys
+  (PrimedForeignKeyWidget) with one query per column per chunk
+* validate fields in memory, including unique fields and unique_together
+  against both the stored rows and the rest of the file
+* write with bulk_create / bulk_update
+* then refresh, set-based, what save() and the signals would have kept up:
+  Apartment.total_houses, Invoice total_payable and payment_status, house
+  occupancy intervals, the search index and the activity log
+
+stream_import() feeds a CSV through a bulk resource a chunk at a time, each
+chunk in its own short transaction; `manage.py bulk_import` wraps it and
+`manage.py benchmark_import` compares it with the standard path.
+"""
+import csv
+import time
+from collections import defaultdict
+from functools import partial
+
+import tablib
+from django.core.exceptions import NON_FIELD_ERRORS, ValidationError
+from import_export import resources, widgets
+from import_export.instance_loaders import CachedInstanceLoader
+
+from . import activity, search
+from .models import Apartment, House, HouseOccupancyInterval, Invoice, Tenant, billing_period
+
+DEFAULT_CHUNK_SIZE = 2000
+
+# Ids per set-based refresh statement
+REFRESH_CHUNK_SIZE = 500
+
+
+class PrimedForeignKeyWidget(widgets.ForeignKeyWidget):
+    """
+    ForeignKeyWidget that resolves values from a cache primed with one query
+    per chunk, instead of a get() per row
+    """
+    def __init__(self, model, field='pk', **kwargs):
+        super().__init__(model, field=field, **kwargs)
+        self.cache = {}
+
+    def prime(self, values):
+        missing = {str(value).strip() for value in values if value not in (None, '')} - self.cache.keys()
+        if not missing:
+            return
+        try:
+            for obj in self.model.objects.filter(**{f'{self.field}__in': missing}):
+                self.cache[str(getattr(obj, self.field))] = obj
+        except (ValueError, ValidationError):
+            # A malformed key; leave those rows to clean(), which reports them one by one
+            pass
+
+    def clean(self, value, row=None, **kwargs):
+        if value not in (None, '') and not self.use_natural_foreign_keys:
+            obj = self.cache.get(str(value).strip())
+            if obj is not None:
+                return obj.pk if self.key_is_id else obj
+        return super().clean(value, row, **kwargs)
+
+
+class BulkModelResource(resources.ModelResource):
+    """
+    Base for the bulk resources. Subclasses fill in derived fields in
+    prepare_instance() and refresh what depends on the written rows in
+    refresh().
+    """
+    class Meta:
+        name = "Bulk (large files)"
+        use_bulk = True
+        batch_size = 1000
+        skip_diff = True
+        instance_loader_class = CachedInstanceLoader
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        # (unique field names) -> {stored or imported key: pk or instance}
+        self.unique_keys = defaultdict(dict)
+        self.primed_fields = []
+        self.imported = []
+
+    @classmethod
+    def get_fk_widget(cls, field):
+        return partial(PrimedForeignKeyWidget, model=field.related_model)
+
+    def unique_checks(self):
+        opts = self._meta.model._meta
+        checks = [(field.name,) for field in opts.local_fields if field.unique and not field.primary_key]
+        return checks + [tuple(together) for together in opts.unique_together]
+
+    def before_import(self, dataset, **kwargs):
+        self.imported = []
+        self.primed_fields = [
+            field for field in self.get_import_fields()
+            if isinstance(field.widget, PrimedForeignKeyWidget) and field.column_name in dataset.headers
+        ]
+        for field in self.primed_fields:
+            field.widget.prime(dataset[field.column_name])
+        self.load_unique_keys(dataset)
+
+    def load_unique_keys(self, dataset):
+        """
+        Load the stored keys the dataset could collide with, one query per
+        unique check, narrowed on the check's first field
+        """
+        opts = self._meta.model._meta
+        columns = {field.attribute: field for field in self.get_import_fields()}
+        for check in self.unique_checks():
+            first = opts.get_field(check[0])
+            field = columns.get(first.attname) or columns.get(first.name)
+            if field is not None and field.column_name in dataset.headers:
+                values = set()
+                for value in dataset[field.column_name]:
+                    try:
+                        value = field.widget.clean(value)
+                    except Exception:
+                        continue
+                    values.add(getattr(value, 'pk', value))
+            else:
+                values = {first.get_default()}
+            values.discard(None)
+            if not values:
+                continue
+            attnames = [opts.get_field(name).attname for name in check]
+            stored = self._meta.model.objects.filter(**{f'{first.attname}__in': values})
+            for *key, pk in stored.values_list(*attnames, 'pk').iterator(chunk_size=DEFAULT_CHUNK_SIZE):
+                self.unique_keys[check].setdefault(tuple(key), pk)
+
+    def import_instance(self, instance, row, **kwargs):
+        super().import_instance(instance, row, **kwargs)
+        # Foreign keys are imported as <field>_id; attach the primed objects as
+        # well, so str(instance) for the row result does not fetch them one by one
+        for field in self.primed_fields:
+            if field.widget.key_is_id:
+                obj = field.widget.cache.get(str(getattr(instance, field.attribute)))
+                if obj is not None:
+                    setattr(instance, field.attribute.removesuffix('_id'), obj)
+
+    def prepare_instance(self, instance):
+        """
+        Set the fields save() would derive. Does nothing by default.
+        """
+
+    def validate_instance(self, instance, import_validation_errors=None, validate_unique=True):
+        errors = dict(import_validation_errors or {})
+        self.prepare_instance(instance)
+        opts = self._meta.model._meta
+        # Relations were resolved by the widgets; clean_fields() would query each one again
+        relations = [field for field in opts.local_fields if field.is_relation]
+        for field in relations:
+            if not field.null and getattr(instance, field.attname) is None and field.name not in errors:
+                errors[field.name] = [field.error_messages['null']]
+        try:
+            instance.clean_fields(exclude=[field.name for field in relations] + list(errors))
+        except ValidationError as e:
+            errors = e.update_error_dict(errors)
+        if validate_unique and not errors:
+            errors = self.unique_errors(instance)
+        if errors:
+            raise ValidationError(errors)
+
+    def unique_errors(self, instance):
+        opts = self._meta.model._meta
+        owner = instance.pk if instance.pk is not None else instance
+        errors = {}
+        for check in self.unique_checks():
+            key = tuple(getattr(instance, opts.get_field(name).attname) for name in check)
+            if None in key:
+                continue
+            holder = self.unique_keys[check].setdefault(key, owner)
+            if holder != owner:
+                field = check[0] if len(check) == 1 else NON_FIELD_ERRORS
+                errors[field] = [instance.unique_error_message(self._meta.model, check)]
+        return errors
+
+    def save_instance(self, instance, is_create, row, **kwargs):
+        super().save_instance(instance, is_create, row, **kwargs)
+        self.imported.append((instance, is_create))
+
+    def after_import(self, dataset, result, **kwargs):
+        if self._is_dry_run(kwargs) and not self._is_using_transactions(kwargs):
+            return
+        # Instances whose batch failed to insert have no pk
+        written = [(instance, created) for instance, created in self.imported if instance.pk is not None]
+        for start in range(0, len(written), REFRESH_CHUNK_SIZE):
+            chunk = written[start:start + REFRESH_CHUNK_SIZE]
+            self.refresh([instance for instance, _ in chunk], [instance.pk for instance, created in chunk if created])
+            search.index_queryset(self._meta.model.objects.filter(pk__in=[instance.pk for instance, _ in chunk]))
+        self.imported = []
+
+    def refresh(self, instances, created_ids):
+        """
+        Bring derived data up to date for a chunk of written instances.
+        Does nothing by default.
+        """
+
+
+class ApartmentResource(resources.ModelResource):
+    class Meta:
+        model = Apartment
+        name = "Standard"
+
+
+class BulkApartmentResource(BulkModelResource):
+    class Meta:
+        model = Apartment
+
+    def refresh(self, instances, created_ids):
+        # An imported total_houses column is not trusted
+        Apartment.refresh_house_counts([apartment.pk for apartment in instances])
+
+
+class HouseResource(resources.ModelResource):
+    class Meta:
+        model = House
+        name = "Standard"
+
+
+class BulkHouseResource(BulkModelResource):
+    class Meta:
+        model = House
+
+    def prepare_instance(self, instance):
+        # As House.save()
+        if instance.tenant_id:
+            instance.status = 'occupied'
+        elif instance.status != 'maintenance':
+            instance.status = 'vacant'
+
+    def refresh(self, instances, created_ids):
+        apartment_ids = set()
+        for house in instances:
+            apartment_ids.add(house.apartment_id)
+            previous = getattr(house, '_saved_apartment_id', None)
+            if previous is not None:
+                apartment_ids.add(previous)
+            house._saved_apartment_id = house.apartment_id
+        Apartment.refresh_house_counts(apartment_ids)
+        HouseOccupancyInterval.record_transitions(instances)
+        activity.record_tenancy_changes(instances)
+
+
+class TenantResource(resources.ModelResource):
+    class Meta:
+        model = Tenant
+        name = "Standard"
+
+
+class BulkTenantResource(BulkModelResource):
+    class Meta:
+        model = Tenant
+
+
+class InvoiceResource(resources.ModelResource):
+    class Meta:
+        model = Invoice
+        name = "Standard"
+
+
+class BulkInvoiceResource(BulkModelResource):
+    class Meta:
+        model = Invoice
+
+    def prepare_instance(self, instance):
+        instance.period = billing_period(instance.month, instance.year)
+        # total_payable is NOT NULL, so it is set here too; refresh() recomputes
+        # it with the status in SQL
+        try:
+            instance.total_payable = instance.rent + instance.additional_charges - instance.discount
+        except TypeError:
+            pass
+
+    def refresh(self, instances, created_ids):
+        Invoice.refresh_totals([invoice.pk for invoice in instances])
+        if created_ids:
+            activity.record_invoices_created(Invoice.objects.filter(pk__in=created_ids))
+
+
+BULK_RESOURCES = {
+    'apartment': BulkApartmentResource,
+    'house': BulkHouseResource,
+    'tenant': BulkTenantResource,
+    'invoice': BulkInvoiceResource,
+}
+
+
+def stream_import(resource_class, lines, chunk_size=DEFAULT_CHUNK_SIZE, dry_run=False):
+    """
+    Import an iterable of CSV text lines (e.g. an open file) through a bulk
+    resource, chunk_size rows at a time. Each chunk is its own transaction, so
+    a large file never holds one long write lock, and the file is never
+    loaded whole. Returns a summary and one entry per rejected line:
+    {'line', 'errors': {field: [messages]}}.
+    """
+    started = time.monotonic()
+    reader = csv.reader(lines)
+    try:
+        header = [name.strip() for name in next(reader)]
+    except StopIteration:
+        raise ValueError("File is empty")
+    resource = resource_class()
+    summary = defaultdict(int)
+    problems = []
+
+    def run(rows, line_numbers):
+        result = resource.import_data(
+            tablib.Dataset(*rows, headers=header), dry_run=dry_run, use_transactions=True, raise_errors=False,
+        )
+        for import_type, count in result.totals.items():
+            summary[import_type] += count
+        for row in result.invalid_rows:
+            problems.append({'line': line_numbers[row.number - 1], 'errors': row.error_dict})
+        for row in result.error_rows:
+            problems.append({'line': line_numbers[row.number - 1], 'errors': {
+                NON_FIELD_ERRORS: [str(error.error) for error in row.errors],
+            }})
+        for error in result.base_errors:
+            summary['error'] += 1
+            problems.append({'line': None, 'errors': {NON_FIELD_ERRORS: [str(error.error)]}})
+
+    rows, line_numbers = [], []
+    for row in reader:
+        if not any(cell.strip() for cell in row):
+            continue
+        summary['rows'] += 1
+        if len(row) > len(header):
+            summary['invalid'] += 1
+            problems.append({'line': reader.line_num, 'errors': {
+                NON_FIELD_ERRORS: [f"Expected {len(header)} columns, found {len(row)}"],
+            }})
+            continue
+        # Spreadsheets drop trailing empty cells
+        rows.append(row + [''] * (len(header) - len(row)))
+        line_numbers.append(reader.line_num)
+        if len(rows) >= chunk_size:
+            run(rows, line_numbers)
+            rows, line_numbers = [], []
+    if rows:
+        run(rows, line_numbers)
+
+    elapsed = time.monotonic() - started
+    for key in ('rows', 'new', 'update', 'skip', 'invalid', 'error'):
+        summary[key] += 0
+    summary['elapsed_seconds'] = round(elapsed, 3)
+    summary['rows_per_second'] = round(summary['rows'] / elapsed, 1) if elapsed else None
+    summary['dry_run'] = dry_run
+    return dict(summary), problems
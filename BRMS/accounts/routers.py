@@ -0,0 +1,100 @@
+"""
+Read/write splitting between the primary database ('default') and a read
+replica.
+
+Every write goes to the primary. Reads go to the primary too, unless the code
+running them has opted in to the replica:
+
+* safe (GET/HEAD/OPTIONS) actions of the viewsets with ReplicaReadMixin, once
+  authentication and permission checks have run on the primary
+* the report commands, inside replica_reads()
+
+Within an opted-in request or command, the first write pins every later read
+to the primary, so a view never reads back a row older than the one it just
+wrote, and reads inside a transaction on the primary stay on it.
+
+The read alias is the READ_DATABASE setting (default 'replica'); setting it
+to 'default' turns the split off. DatabaseRoutingMiddleware gives each request
+its own routing state, so nothing carries over between requests.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# {'replica': reads may use the replica, 'wrote': a write has happened since}
+_state = ContextVar('database_routing', default=None)
+
+
+def read_database():
+    return getattr(settings, 'READ_DATABASE', DEFAULT_DB_ALIAS)
+
+
+def enter(replica=False):
+    """
+    Start a fresh routing scope in the current context; returns the token to
+    pass to leave()
+    """
+    return _state.set({'replica': replica, 'wrote': False})
+
+
+def leave(token):
+    _state.reset(token)
+
+
+@contextmanager
+def routing(replica=False):
+    token = enter(replica)
+    try:
+        yield
+    finally:
+        leave(token)
+
+
+def replica_reads():
+    """
+    Send the reads in this block to the replica, until the block writes
+    """
+    return routing(replica=True)
+
+
+def use_replica():
+    """
+    Let the rest of the current scope read from the replica. Does nothing
+    outside a scope.
+    """
+    state = _state.get()
+    if state is not None:
+        state['replica'] = True
+
+
+def reading_from_replica():
+    state = _state.get()
+    return bool(state and state['replica'] and not state['wrote'])
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if not reading_from_replica() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return read_database()
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state['wrote'] = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same rows as the primary
+        return True
+
+
+class DatabaseRoutingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with routing():
+            return self.get_response(request)
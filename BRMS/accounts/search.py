@@ -0,0 +1,190 @@
+"""
+SQLite FTS5 full-text index for houses, apartments, tenants and invoices.
+
+Each model has its own FTS5 table whose rowid is the model's primary key, so
+keeping a document in sync is a single INSERT OR REPLACE / DELETE by rowid.
+Documents are the text of the model's search fields (including joined ones,
+e.g. a house's apartment location) and are refreshed on save and delete,
+including when a related row they copy text from changes.
+
+On other database backends is_available() is False and callers fall back to
+DRF's SearchFilter.
+"""
+from django.contrib.auth.models import User
+from django.db import DatabaseError, connections
+from django.db.models import FloatField
+from django.db.models.expressions import RawSQL
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Apartment, House, Invoice, Tenant
+
+# Model -> (FTS5 table, fields concatenated into the document)
+SEARCH_INDEXES = {
+    House: ('accounts_house_fts', ['number', 'description', 'apartment__name', 'apartment__location']),
+    Apartment: ('accounts_apartment_fts', ['name', 'location', 'description']),
+    Tenant: ('accounts_tenant_fts', [
+        'first_name', 'last_name', 'email', 'phone_number',
+        'user__username', 'user__first_name', 'user__last_name',
+    ]),
+    Invoice: ('accounts_invoice_fts', [
+        'tenant__user__username', 'tenant__first_name', 'tenant__last_name', 'house__number', 'month',
+    ]),
+}
+
+INDEX_CHUNK_SIZE = 2000
+
+
+def is_available(model, using='default'):
+    return model in SEARCH_INDEXES and connections[using].vendor == 'sqlite'
+
+
+def match_expression(terms):
+    """
+    Turn search terms into an FTS5 MATCH expression: every term must match,
+    as a prefix so results update on each keystroke.
+    """
+    tokens = []
+    for term in terms:
+        for word in term.split():
+            word = word.replace('"', '""')
+            if word:
+                tokens.append(f'"{word}"*')
+    return ' '.join(tokens)
+
+
+def matching(queryset, terms):
+    """
+    The rows of `queryset` matching the terms, annotated with their FTS5
+    `search_rank` (lower is better).
+
+    The MATCH runs inside the queryset's own SQL, so any scoping already on
+    it (e.g. a landlord's houses) applies before ranking and nothing is cut
+    off ahead of pagination.
+    """
+    expression = match_expression(terms)
+    if not expression:
+        return queryset.none().annotate(search_rank=RawSQL('0', [], output_field=FloatField()))
+    table, _ = SEARCH_INDEXES[queryset.model]
+    pk_column = f'"{queryset.model._meta.db_table}"."{queryset.model._meta.pk.column}"'
+    return queryset.filter(
+        pk__in=RawSQL(f'SELECT rowid FROM {table} WHERE {table} MATCH %s', [expression])
+    ).annotate(search_rank=RawSQL(
+        f'SELECT rank FROM {table} WHERE {table} MATCH %s AND rowid = {pk_column}',
+        [expression], output_field=FloatField(),
+    ))
+
+
+def search_ids(model, terms, using='default', limit=None):
+    """
+    Primary keys of `model` rows matching the terms, best match first
+    """
+    expression = match_expression(terms)
+    if not expression:
+        return []
+    table, _ = SEARCH_INDEXES[model]
+    sql = f'SELECT rowid FROM {table} WHERE {table} MATCH %s ORDER BY rank'
+    params = [expression]
+    if limit is not None:
+        sql += ' LIMIT %s'
+        params.append(limit)
+    with connections[using].cursor() as cursor:
+        try:
+            cursor.execute(sql, params)
+        except DatabaseError:
+            # Input FTS5 still cannot parse matches nothing rather than erroring
+            return []
+        return [row[0] for row in cursor.fetchall()]
+
+
+def write_documents(cursor, table, rows):
+    """
+    INSERT OR REPLACE (pk, *field values) rows as documents, in chunks.
+    Returns the number written.
+    """
+    written = 0
+    batch = []
+    for pk, *values in rows:
+        batch.append((pk, ' '.join(str(value) for value in values if value)))
+        if len(batch) >= INDEX_CHUNK_SIZE:
+            cursor.executemany(f'INSERT OR REPLACE INTO {table}(rowid, body) VALUES (%s, %s)', batch)
+            written += len(batch)
+            batch = []
+    if batch:
+        cursor.executemany(f'INSERT OR REPLACE INTO {table}(rowid, body) VALUES (%s, %s)', batch)
+        written += len(batch)
+    return written
+
+
+def index_queryset(queryset):
+    """
+    (Re)index every row of the queryset. Returns the number of documents written.
+    """
+    model = queryset.model
+    using = queryset.db
+    if not is_available(model, using):
+        return 0
+    table, fields = SEARCH_INDEXES[model]
+    rows = queryset.order_by().values_list('pk', *fields).iterator(chunk_size=INDEX_CHUNK_SIZE)
+    with connections[using].cursor() as cursor:
+        return write_documents(cursor, table, rows)
+
+
+def remove_ids(model, pks, using='default'):
+    if not pks or not is_available(model, using):
+        return
+    table, _ = SEARCH_INDEXES[model]
+    with connections[using].cursor() as cursor:
+        cursor.executemany(f'DELETE FROM {table} WHERE rowid = %s', [(pk,) for pk in pks])
+
+
+def rebuild(model, using='default'):
+    """
+    Drop and rebuild the whole index for a model
+    """
+    if not is_available(model, using):
+        return 0
+    table, _ = SEARCH_INDEXES[model]
+    with connections[using].cursor() as cursor:
+        cursor.execute(f'DELETE FROM {table}')
+    written = index_queryset(model.objects.using(using).all())
+    with connections[using].cursor() as cursor:
+        cursor.execute(f"INSERT INTO {table}({table}) VALUES ('optimize')")
+    return written
+
+
+# Keep the index in sync with saves and deletes
+@receiver(post_save, sender=House)
+@receiver(post_save, sender=Invoice)
+def index_saved_document(sender, instance, raw=False, using='default', **kwargs):
+    if not raw:
+        index_queryset(sender.objects.using(using).filter(pk=instance.pk))
+
+@receiver(post_save, sender=Apartment)
+def index_saved_apartment(sender, instance, raw=False, using='default', **kwargs):
+    if not raw:
+        index_queryset(Apartment.objects.using(using).filter(pk=instance.pk))
+        index_queryset(House.objects.using(using).filter(apartment=instance))
+
+@receiver(post_save, sender=Tenant)
+def index_saved_tenant(sender, instance, raw=False, using='default', **kwargs):
+    if not raw:
+        index_queryset(Tenant.objects.using(using).filter(pk=instance.pk))
+        index_queryset(Invoice.objects.using(using).filter(tenant=instance))
+
+@receiver(post_save, sender=User)
+def index_saved_user(sender, instance, raw=False, using='default', created=False, update_fields=None, **kwargs):
+    # A new user has no tenant profile yet, and e.g. last_login updates change no text
+    if raw or created:
+        return
+    if update_fields and not {'username', 'first_name', 'last_name'} & set(update_fields):
+        return
+    index_queryset(Tenant.objects.using(using).filter(user=instance))
+    index_queryset(Invoice.objects.using(using).filter(tenant__user=instance))
+
+@receiver(post_delete, sender=House)
+@receiver(post_delete, sender=Apartment)
+@receiver(post_delete, sender=Tenant)
+@receiver(post_delete, sender=Invoice)
+def remove_deleted_document(sender, instance, using='default', **kwargs):
+    remove_ids(sender, [instance.pk], using)
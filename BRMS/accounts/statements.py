@@ -0,0 +1,181 @@
+"""
+Monthly landlord payout statements.
+
+For a batch of landlords, a statement month costs three grouped queries,
+however many payments there are: rent collected per house (payments received
+in the month, grouped over Payment -> Invoice -> House -> Apartment), rent
+billed per house (invoices for the month) and the apartments with their
+management_fee_percentage. The fee is worked out per house and summed, so the
+house, apartment and landlord figures always add up.
+
+generate_statements() splits the landlords into batches and, with workers > 1,
+computes the batches in a process pool. Workers only read; the parent writes
+every statement in one transaction (an upsert on landlord and period), so a
+month-end run for every owner is one batch and re-running it is harmless.
+"""
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from decimal import Decimal
+
+import django
+from django.apps import apps
+from django.db import connections, transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from . import routers
+from .models import Apartment, Invoice, Landlord, LandlordStatement, Payment, billing_period
+from .stats import cents
+
+# Landlords per worker task
+DEFAULT_BATCH_SIZE = 50
+
+ZERO = Decimal('0.00')
+
+STATEMENT_FIELDS = [
+    'rent_billed', 'rent_collected', 'management_fee', 'net_payout', 'payments_count', 'apartments', 'generated_at',
+]
+
+
+def statement_period(month, year):
+    """
+    First day of the statement month, from a month number or name and a year
+    """
+    period = billing_period(month, year)
+    if period is None:
+        raise ValueError(f"Invalid statement month: {month!r} {year!r}")
+    return period
+
+
+def next_period(period):
+    return period.replace(year=period.year + 1, month=1) if period.month == 12 else period.replace(month=period.month + 1)
+
+
+def management_fee(collected, percentage):
+    return cents(collected * percentage / 100)
+
+
+def compute_statements(landlord_ids, period):
+    """
+    Statement figures for each landlord in `landlord_ids` for the month
+    starting on `period`, as dicts of LandlordStatement fields. Landlords with
+    no apartments get an empty statement.
+    """
+    landlord_ids = list(landlord_ids)
+    start = timezone.make_aware(datetime(period.year, period.month, 1))
+    end = next_period(start)
+
+    houses = defaultdict(lambda: {
+        'number': None, 'rent_billed': ZERO, 'rent_collected': ZERO, 'payments_count': 0,
+    })
+    collected = (
+        Payment.objects.filter(
+            invoice__house__apartment__owner_id__in=landlord_ids, payment_date__gte=start, payment_date__lt=end,
+        )
+        .order_by()
+        .values_list('invoice__house__apartment_id', 'invoice__house_id', 'invoice__house__number')
+        .annotate(collected=Sum('amount'), count=Count('pk'))
+    )
+    for apartment_id, house_id, number, amount, count in collected:
+        house = houses[apartment_id, house_id]
+        house.update(number=number, rent_collected=cents(amount), payments_count=count)
+    billed = (
+        Invoice.objects.filter(house__apartment__owner_id__in=landlord_ids, period=period)
+        .order_by()
+        .values_list('house__apartment_id', 'house_id', 'house__number')
+        .annotate(billed=Sum('total_payable'))
+    )
+    for apartment_id, house_id, number, amount in billed:
+        house = houses[apartment_id, house_id]
+        house.update(number=number, rent_billed=cents(amount))
+
+    by_apartment = defaultdict(list)
+    for (apartment_id, house_id), house in sorted(houses.items(), key=lambda item: (item[0][0], item[1]['number'])):
+        by_apartment[apartment_id].append({'house_id': house_id, **house})
+
+    statements = {
+        landlord_id: {
+            'landlord_id': landlord_id, 'period': period, 'rent_billed': ZERO, 'rent_collected': ZERO,
+            'management_fee': ZERO, 'net_payout': ZERO, 'payments_count': 0, 'apartments': [],
+        }
+        for landlord_id in landlord_ids
+    }
+    apartments = (
+        Apartment.objects.filter(owner_id__in=landlord_ids).order_by('name')
+        .values_list('pk', 'owner_id', 'name', 'management_fee_percentage')
+    )
+    for apartment_id, owner_id, name, percentage in apartments:
+        apartment = {
+            'apartment_id': apartment_id, 'name': name, 'management_fee_percentage': percentage,
+            'rent_billed': ZERO, 'rent_collected': ZERO, 'management_fee': ZERO,
+            'net_payout': ZERO, 'payments_count': 0, 'houses': by_apartment.get(apartment_id, []),
+        }
+        for house in apartment['houses']:
+            house['management_fee'] = management_fee(house['rent_collected'], percentage)
+            house['net_payout'] = house['rent_collected'] - house['management_fee']
+            for key in ('rent_billed', 'rent_collected', 'management_fee', 'net_payout', 'payments_count'):
+                apartment[key] += house[key]
+
+        statement = statements[owner_id]
+        statement['apartments'].append(apartment)
+        for key in ('rent_billed', 'rent_collected', 'management_fee', 'net_payout', 'payments_count'):
+            statement[key] += apartment[key]
+    return list(statements.values())
+
+
+def _setup_worker(replica_reads=False):
+    # Under the spawn start method (macOS, Windows) workers begin without Django set up
+    if not apps.ready:
+        django.setup()
+    # Spawned workers do not inherit the parent's routing; they only read
+    if replica_reads:
+        routers.enter(replica=True)
+
+
+def generate_statements(period, landlord_ids=None, workers=1, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Compute and store the statements for the month starting on `period`, for
+    `landlord_ids` (default: every landlord). With workers > 1 the landlord
+    batches are computed in that many processes.
+
+    Returns the number of statements written, the workers used, the elapsed
+    seconds and statements per second.
+    """
+    started = time.monotonic()
+    if landlord_ids is None:
+        landlord_ids = Landlord.objects.order_by('pk').values_list('pk', flat=True)
+    landlord_ids = list(landlord_ids)
+    batches = [landlord_ids[start:start + batch_size] for start in range(0, len(landlord_ids), batch_size)]
+
+    workers = min(workers, len(batches))
+    # Workers cannot see rows uncommitted in this process's transaction
+    if workers > 1 and not transaction.get_connection().in_atomic_block:
+        # Children start from a copy of this process; no connection may be shared
+        connections.close_all()
+        with ProcessPoolExecutor(
+            max_workers=workers, initializer=_setup_worker, initargs=(routers.reading_from_replica(),),
+        ) as pool:
+            results = pool.map(compute_statements, batches, [period] * len(batches))
+            computed = [statement for batch in results for statement in batch]
+    else:
+        workers = 1
+        computed = [statement for batch in batches for statement in compute_statements(batch, period)]
+
+    generated_at = timezone.now()
+    statements = [LandlordStatement(generated_at=generated_at, **statement) for statement in computed]
+    with transaction.atomic():
+        LandlordStatement.objects.bulk_create(
+            statements, batch_size=500, update_conflicts=True,
+            unique_fields=['landlord', 'period'], update_fields=STATEMENT_FIELDS,
+        )
+
+    elapsed = time.monotonic() - started
+    return {
+        'period': period,
+        'statements': len(statements),
+        'workers': workers,
+        'elapsed_seconds': round(elapsed, 3),
+        'statements_per_second': round(len(statements) / elapsed, 1) if elapsed else None,
+    }
@@ -0,0 +1,108 @@
+from datetime import datetime
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, DecimalField, F, Q, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import House, HouseBooking, Invoice, Landlord, Payment, Tenant
+
+# Seconds a computed dashboard is served from cache
+DASHBOARD_STATS_TTL = getattr(settings, 'DASHBOARD_STATS_TTL', 60)
+
+# How each model reaches the landlord/tenant it belongs to
+SCOPE_LOOKUPS = {
+    House: {'landlord': 'apartment__owner', 'tenant': 'tenant'},
+    Invoice: {'landlord': 'house__apartment__owner', 'tenant': 'tenant'},
+    Payment: {'landlord': 'invoice__house__apartment__owner', 'tenant': 'invoice__tenant'},
+    HouseBooking: {'landlord': 'house__apartment__owner', 'tenant': 'tenant'},
+}
+
+OUTSTANDING_STATUSES = ['unpaid', 'partial', 'overdue']
+
+CENT = Decimal('0.01')
+
+
+def money(expression, **extra):
+    return Coalesce(Sum(expression, **extra), Value(0), output_field=DecimalField(max_digits=14, decimal_places=2))
+
+
+def cents(amount):
+    """
+    Round an amount to cents; SQLite sums come back without their scale
+    """
+    return Decimal(amount).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def scoped(model, landlord=None, tenant=None):
+    queryset = model.objects.all()
+    if landlord is not None:
+        queryset = queryset.filter(**{SCOPE_LOOKUPS[model]['landlord']: landlord})
+    elif tenant is not None:
+        queryset = queryset.filter(**{SCOPE_LOOKUPS[model]['tenant']: tenant})
+    return queryset
+
+
+def compute_dashboard_stats(landlord=None, tenant=None):
+    """
+    Occupancy, rent billed vs collected, arrears and pending bookings for a
+    landlord, a tenant, or (with neither) the whole portfolio. One aggregate
+    query per model, however many rows are involved.
+    """
+    today = timezone.localdate()
+    month_start = today.replace(day=1)
+    # Payments are bounded by datetimes so the payment_date index applies
+    month_start_at = timezone.make_aware(datetime(month_start.year, month_start.month, 1))
+    next_month_at = timezone.make_aware(
+        datetime(month_start.year + month_start.month // 12, month_start.month % 12 + 1, 1)
+    )
+
+    houses = scoped(House, landlord, tenant).aggregate(
+        total=Count('pk'),
+        occupied=Count('pk', filter=Q(status='occupied')),
+        vacant=Count('pk', filter=Q(status='vacant')),
+        maintenance=Count('pk', filter=Q(status='maintenance')),
+    )
+    invoices = scoped(Invoice, landlord, tenant).aggregate(
+        billed_this_month=money('total_payable', filter=Q(period=month_start)),
+        paid_this_month=money('amount_paid', filter=Q(period=month_start)),
+        arrears=money(F('total_payable') - F('amount_paid'), filter=Q(payment_status__in=OUTSTANDING_STATUSES)),
+        outstanding_invoices=Count('pk', filter=Q(payment_status__in=OUTSTANDING_STATUSES)),
+        overdue_invoices=Count('pk', filter=Q(payment_status='overdue')),
+    )
+    payments = scoped(Payment, landlord, tenant).aggregate(
+        collected_this_month=money(
+            'amount', filter=Q(payment_date__gte=month_start_at, payment_date__lt=next_month_at)
+        ),
+    )
+    bookings = scoped(HouseBooking, landlord, tenant).aggregate(
+        pending_bookings=Count('pk', filter=Q(status='pending')),
+    )
+
+    stats = {
+        'houses': houses,
+        'occupancy_rate': round(houses['occupied'] * 100 / houses['total'], 1) if houses['total'] else 0.0,
+        **invoices,
+        **payments,
+        **bookings,
+        'generated_at': timezone.now(),
+    }
+    if landlord is None and tenant is None:
+        stats['landlords'] = Landlord.objects.count()
+        stats['tenants'] = Tenant.objects.count()
+    return stats
+
+
+def dashboard_stats(role, landlord=None, tenant=None):
+    """
+    Cached compute_dashboard_stats(); dashboards under load share one computation per TTL
+    """
+    owner = landlord or tenant
+    key = f'dashboard-stats:{role}:{owner.pk if owner else "all"}'
+    stats = cache.get(key)
+    if stats is None:
+        stats = compute_dashboard_stats(landlord=landlord, tenant=tenant)
+        cache.set(key, stats, DASHBOARD_STATS_TTL)
+    return stats
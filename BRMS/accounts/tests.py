@@ -1,3 +1,1719 @@
-from django.test import TestCase
+import asyncio
+import csv
+import io
+import json
+import os
+import tempfile
+import threading
+from io import BytesIO
+from datetime import date, datetime, timedelta
+from importlib import import_module
+from types import SimpleNamespace
+from unittest import mock
+from decimal import Decimal
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, connections, router, transaction
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+from rest_framework.validators import UniqueTogetherValidator
+
+from . import notifications, routers
+from .aging import aging_report, take_snapshot
+from .billing import generate_invoices, sweep_overdue_invoices
+from .checks import check_mpesa_callback_token
+from .api.filters import parse_period
+from .api.mixins import stream_csv
+from .api.views import PaymentViewSet
+from .bookings import BookingConflict, approve_booking, promote_next
+from .fake_mpesa import FakeMpesaServer
+from .occupancy import occupancy_report
+from .reconciliation import parse_amount
+from .resources import BulkHouseResource, BulkInvoiceResource, stream_import
+from .search import search_ids
+from .statements import generate_statements
+from .stats import compute_dashboard_stats
+from .views import stream_user
+from .models import (
+    Landlord, Tenant, ApartmentType, Apartment, HouseType, House, HouseBooking,
+    Invoice, Payment, Role, ActivityEvent, LandlordStatement, ArrearsSnapshot, HouseOccupancyInterval, MpesaTransaction,
+    billing_period, defer_house_counts
+)
+
+
+def create_portfolio(houses=1):
+    """
+    Create a landlord with one apartment, `houses` houses and a tenant in the first one.
+    """
+    landlord = Landlord.objects.create(
+        first_name='Jane', id_number='L-1', email='jane@example.com',
+        phone_number='+254700000001', physical_address='Nairobi'
+    )
+    apartment = Apartment.objects.create(
+        name='Sunrise Court', location='Nairobi',
+        apartment_type=ApartmentType.objects.create(name='Flats'),
+        owner=landlord, management_fee_percentage=Decimal('10.00')
+    )
+    house_type = HouseType.objects.create(name='Bedsitter')
+    tenant = Tenant.objects.create(
+        first_name='John', last_name='Doe', id_number_or_passport='T-1',
+        email='john@example.com', phone_number='+254700000002'
+    )
+    for number in range(houses):
+        House.objects.create(
+            apartment=apartment, number=f'A{number}', monthly_rent=Decimal('10000.00'),
+            house_type=house_type, tenant=tenant if number == 0 else None
+        )
+    return landlord, apartment, tenant
+
+
+class PortfolioFixture(TestCase):
+    """
+    A landlord's apartment with `rows` let houses, each tenant with a booking,
+    an invoice and a part payment, plus an admin. Every fixture model has
+    several rows with distinct relations, so per-row queries show up.
+    """
+    rows = 4
+
+    @classmethod
+    def setUpTestData(cls):
+        landlord, apartment, _ = create_portfolio(houses=cls.rows)
+        cls.admin = User.objects.create_user('admin', password='pass', is_staff=True)
+        cls.landlord_user = User.objects.create_user('landlord', password='pass')
+        Role.objects.filter(user=cls.landlord_user).update(role_type='landlord')
+        landlord.user = cls.landlord_user
+        landlord.save()
+
+        for number, house in enumerate(apartment.houses.all()):
+            user = User.objects.create_user(f'tenant{number}', password='pass')
+            tenant = Tenant.objects.create(
+                user=user, id_number_or_passport=f'TB-{number}', email=f'tenant{number}@example.com',
+                phone_number=f'+25471000000{number}'
+            )
+            house.tenant = tenant
+            house.save()
+            HouseBooking.objects.create(
+                house=house, tenant=tenant, deposit_amount=Decimal('1000.00'),
+                rent_amount_paid=Decimal('1000.00')
+            )
+            invoice = Invoice.objects.create(
+                tenant=tenant, house=house, month='January', year=2025, rent=house.monthly_rent
+            )
+            Payment.objects.create(invoice=invoice, amount=Decimal('500.00'))
+
+    def client_for(self, user):
+        client = APIClient()
+        # A fresh user instance so cached profile lookups don't hide queries
+        client.force_authenticate(User.objects.get(pk=user.pk))
+        return client
+
+    def assertBudget(self, user, url, queries):
+        client = self.client_for(user)
+        with self.assertNumQueries(queries):
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response
+
+
+class PaymentLedgerTests(TestCase):
+    def setUp(self):
+        _, apartment, self.tenant = create_portfolio()
+        self.invoice = Invoice.objects.create(
+            tenant=self.tenant, house=apartment.houses.get(), month='January', year=2025,
+            rent=Decimal('10000.00')
+        )
+
+    def test_payments_move_balance_and_status(self):
+        payment = Payment.objects.create(invoice=self.invoice, amount=Decimal('4000.00'))
+        self.invoice.refresh_from_db()
+        self.assertEqual(self.invoice.amount_paid, Decimal('4000.00'))
+        self.assertEqual(self.invoice.payment_status, 'partial')
+
+        payment.amount = Decimal('10000.00')
+        payment.save()
+        self.invoice.refresh_from_db()
+        self.assertEqual(self.invoice.amount_paid, Decimal('10000.00'))
+        self.assertEqual(self.invoice.payment_status, 'paid')
+
+        payment.delete()
+        self.invoice.refresh_from_db()
+        self.assertEqual(self.invoice.amount_paid, Decimal('0.00'))
+        self.assertIn(self.invoice.payment_status, ['unpaid', 'overdue'])
+
+        # The ledger UPDATEs skip post_save; each status they moved is still logged
+        self.assertEqual(
+            list(ActivityEvent.objects.filter(event_type='invoice_status').order_by('pk').values_list('summary', flat=True)),
+            ['Invoice for January 2025 is partially paid', 'Invoice for January 2025 is paid',
+             f'Invoice for January 2025 is {self.invoice.get_payment_status_display().lower()}']
+        )
+
+
+class PaymentLedgerConcurrencyTests(TransactionTestCase):
+    workers = 8
+    payments_per_worker = 10
+
+    def test_parallel_payments_do_not_lose_updates(self):
+        _, apartment, tenant = create_portfolio()
+        invoice = Invoice.objects.create(
+            tenant=tenant, house=apartment.houses.get(), month='January', year=2025,
+            rent=Decimal('100000.00')
+        )
+        start = threading.Barrier(self.workers)
+        errors = []
+
+        def pay():
+            try:
+                start.wait()
+                for _ in range(self.payments_per_worker):
+                    Payment.objects.create(invoice_id=invoice.pk, amount=Decimal('125.50'))
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=pay) for _ in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        invoice.refresh_from_db()
+        expected = Decimal('125.50') * self.workers * self.payments_per_worker
+        self.assertEqual(invoice.payments.count(), self.workers * self.payments_per_worker)
+        self.assertEqual(invoice.amount_paid, expected)
+        self.assertEqual(invoice.payment_status, 'partial')
+
+
+class ApartmentHouseCountTests(TestCase):
+    def setUp(self):
+        _, self.apartment, self.tenant = create_portfolio(houses=2)
+        self.other = Apartment.objects.create(
+            name='Hill View', location='Nakuru', apartment_type=ApartmentType.objects.get(),
+            owner=self.apartment.owner, management_fee_percentage=Decimal('5.00')
+        )
+
+    def counts(self):
+        return dict(Apartment.objects.values_list('name', 'total_houses'))
+
+    def test_counter_follows_house_saves_and_deletes(self):
+        self.assertEqual(self.counts(), {'Sunrise Court': 2, 'Hill View': 0})
+
+        # Vacancy and tenant changes do not move the counter
+        house = House.objects.get(number='A0')
+        house.tenant = None
+        house.save()
+        house.status = 'maintenance'
+        house.save()
+        self.assertEqual(self.counts(), {'Sunrise Court': 2, 'Hill View': 0})
+
+        house.apartment = self.other
+        house.save()
+        self.assertEqual(self.counts(), {'Sunrise Court': 1, 'Hill View': 1})
+
+        House.objects.get(number='A1').delete()
+        self.assertEqual(self.counts(), {'Sunrise Court': 0, 'Hill View': 1})
+
+        with defer_house_counts():
+            for number in range(3):
+                House.objects.create(
+                    apartment=self.other, number=f'H{number}', monthly_rent=Decimal('8000.00'),
+                    house_type=house.house_type
+                )
+        self.assertEqual(self.counts(), {'Sunrise Court': 0, 'Hill View': 4})
+
+    def test_repair_command_fixes_drift(self):
+        Apartment.objects.update(total_houses=7)
+        out = io.StringIO()
+        call_command('repair_house_counts', '--apartment', str(self.other.pk), stdout=out)
+        self.assertIn('1 apartment(s)', out.getvalue())
+        self.assertEqual(self.counts(), {'Sunrise Court': 7, 'Hill View': 0})
+
+        call_command('repair_house_counts', stdout=io.StringIO())
+        self.assertEqual(self.counts(), {'Sunrise Court': 2, 'Hill View': 0})
+
+
+class ApartmentOccupancyTests(PortfolioFixture):
+    def test_counts_come_from_the_list_query(self):
+        House.objects.create(
+            apartment=Apartment.objects.get(), number='V1', monthly_rent=Decimal('9000.00'),
+            house_type=HouseType.objects.get()
+        )
+        response = self.assertBudget(self.admin, '/api/brms/apartments/', 1)
+        apartment = response.data['results'][0]
+        self.assertEqual(apartment['houses_count'], self.rows + 1)
+        self.assertEqual(apartment['occupied_houses'], self.rows)
+        self.assertEqual(apartment['vacant_houses'], 1)
+        self.assertEqual(apartment['occupancy_rate'], round(self.rows * 100 / (self.rows + 1), 1))
+
+
+class InvoiceGenerationTests(TestCase):
+    def setUp(self):
+        self.landlord, self.apartment, self.tenant = create_portfolio(houses=3)
+        second = Tenant.objects.create(first_name='Mary', phone_number='+254700000003')
+        House.objects.filter(number='A1').update(tenant=second, status='occupied')
+        # Billed before the run, e.g. by hand or by another run
+        self.manual = Invoice.objects.create(
+            tenant=second, house=House.objects.get(number='A1'), month='March', year=2025, rent=Decimal('10000.00')
+        )
+
+    def test_generation_is_idempotent(self):
+        first = generate_invoices('3', 2025)
+        self.assertEqual((first['created'], first['skipped']), (1, 1))
+        second = generate_invoices('March', 2025)
+        self.assertEqual((second['created'], second['skipped']), (0, 2))
+
+        self.assertEqual(Invoice.objects.filter(month='March', year=2025).count(), 2)
+        created = Invoice.objects.exclude(pk=self.manual.pk).get()
+        self.assertEqual((created.tenant, created.total_payable), (self.tenant, Decimal('10000.00')))
+        # Events and index entries for the inserted invoice only
+        self.assertEqual(
+            list(ActivityEvent.objects.filter(event_type='invoice_created').order_by('pk').values_list('object_id', flat=True)),
+            [self.manual.pk, created.pk]
+        )
+        self.assertEqual(search_ids(Invoice, ['doe']), [created.pk])
+
+    def test_generate_action(self):
+        landlord_user = User.objects.create_user('landlord', password='pass')
+        Role.objects.filter(user=landlord_user).update(role_type='landlord')
+        self.landlord.user = landlord_user
+        self.landlord.save()
+        client = APIClient()
+        client.force_authenticate(User.objects.get(pk=landlord_user.pk))
+
+        response = client.post('/api/brms/invoices/generate/', {'month': 'March', 'year': 2025}, format='json')
+        self.assertEqual((response.status_code, response.data['created']), (201, 1))
+        response = client.post('/api/brms/invoices/generate/', {'month': 'March', 'year': 2025}, format='json')
+        self.assertEqual((response.status_code, response.data['created']), (201, 0))
+        self.assertEqual(client.post('/api/brms/invoices/generate/', {'month': 'Smarch', 'year': 2025}).status_code, 400)
+
+        tenant_client = APIClient()
+        tenant_client.force_authenticate(User.objects.create_user('tenant', password='pass'))
+        response = tenant_client.post('/api/brms/invoices/generate/', {'month': 'April', 'year': 2025}, format='json')
+        self.assertEqual(response.status_code, 403)
+
+
+class OverdueSweepTests(TestCase):
+    def setUp(self):
+        _, apartment, tenant = create_portfolio()
+        house = apartment.houses.get()
+        self.invoices = {}
+        for month, due, paid in [
+            ('January', '2025-01-05', '0'), ('February', '2025-02-05', '0'), ('March', '2025-03-05', '4000'),
+            ('April', '2025-04-05', '10000'), ('May', '2025-05-05', '0'),
+        ]:
+            self.invoices[month] = Invoice.objects.create(
+                tenant=tenant, house=house, month=month, year=2025, rent=Decimal('10000.00'),
+                amount_paid=Decimal(paid), due_date=datetime.fromisoformat(due).date(),
+            ).pk
+        ActivityEvent.objects.all().delete()
+
+    def statuses(self):
+        return dict(Invoice.objects.values_list('month', 'payment_status'))
+
+    def test_sweep_marks_past_due_unpaid_invoices_once(self):
+        self.assertEqual(set(self.statuses().values()), {'overdue', 'partial', 'paid'})
+        # Created before they fell due
+        Invoice.objects.filter(payment_status='overdue').update(payment_status='unpaid')
+
+        result = sweep_overdue_invoices(today=datetime(2025, 4, 1).date(), chunk_size=1)
+        self.assertEqual(result['updated'], 2)
+        self.assertEqual(self.statuses(), {
+            'January': 'overdue', 'February': 'overdue', 'March': 'partial', 'April': 'paid', 'May': 'unpaid',
+        })
+        self.assertEqual(
+            sorted(ActivityEvent.objects.filter(event_type='invoice_status').values_list('object_id', 'summary')),
+            [(self.invoices['January'], 'Invoice for January 2025 is overdue'),
+             (self.invoices['February'], 'Invoice for February 2025 is overdue')]
+        )
+
+        self.assertEqual(sweep_overdue_invoices(today=datetime(2025, 4, 1).date())['updated'], 0)
+        self.assertEqual(ActivityEvent.objects.count(), 2)
+
+        out = io.StringIO()
+        call_command('sweep_overdue_invoices', stdout=out)
+        self.assertIn('Marked 1 invoice(s) overdue', out.getvalue())
+        self.assertEqual(self.statuses()['May'], 'overdue')
+
+
+class InvoicePeriodTests(TestCase):
+    def setUp(self):
+        _, apartment, self.tenant = create_portfolio()
+        self.house = apartment.houses.get()
+        for month in ('January', 'February', 'March', 'April'):
+            Invoice.objects.create(tenant=self.tenant, house=self.house, month=month, year=2025, rent=Decimal('10000.00'))
+
+    def test_period_backfill_parses_numeric_months(self):
+        Invoice.objects.filter(month='February').update(month='02', period=None)
+        Invoice.objects.filter(month='March').update(month='2025-03', period=None)
+        Invoice.objects.filter(month='April').update(month='Smarch', period=None)
+
+        backfill = import_module('accounts.migrations.0013_invoice_period').populate_period
+        backfill(django_apps, None)
+        self.assertEqual(
+            dict(Invoice.objects.values_list('month', 'period')),
+            {'January': date(2025, 1, 1), '02': date(2025, 2, 1), '2025-03': date(2025, 3, 1), 'Smarch': None}
+        )
+
+    def test_period_filter(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user('admin', password='pass', is_staff=True))
+
+        def months(query):
+            response = client.get(f'/api/brms/invoices/?{query}')
+            self.assertEqual(response.status_code, 200, response.content)
+            return {invoice['month'] for invoice in response.data['results']}
+
+        self.assertEqual(months('period_from=2025-02&period_to=2025-03'), {'February', 'March'})
+        self.assertEqual(months('period_from=2025-03-15'), {'March', 'April'})
+        self.assertEqual(months('period_to=2025-01'), {'January'})
+        for query in ('period_from=March', 'period_to=2025-13', 'period_from=2025'):
+            response = client.get(f'/api/brms/invoices/?{query}')
+            self.assertEqual(response.status_code, 400, query)
+
+        self.assertEqual(parse_period('2025-3', 'period_from'), date(2025, 3, 1))
+        self.assertEqual(billing_period('03', 2025), date(2025, 3, 1))
+        self.assertIsNone(billing_period('13', 2025))
+
+
+class FullTextSearchTests(TestCase):
+    def setUp(self):
+        landlord, self.apartment, _ = create_portfolio(houses=3)
+        landlord_user = User.objects.create_user('landlord', password='pass')
+        Role.objects.filter(user=landlord_user).update(role_type='landlord')
+        landlord.user = landlord_user
+        landlord.save()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.get(pk=landlord_user.pk))
+
+        # More (and better) matches from another landlord than any fixed cap on hits
+        other = Apartment.objects.create(
+            name='Sunrise Gardens', location='Mombasa', apartment_type=self.apartment.apartment_type,
+            management_fee_percentage=Decimal('10.00'),
+            owner=Landlord.objects.create(
+                first_name='Other', id_number='L-2', email='other@example.com',
+                phone_number='+254700000009', physical_address='Mombasa'
+            ),
+        )
+        House.objects.bulk_create(
+            House(
+                apartment=other, number=f'S{number}', description='Sunrise sunrise sunrise',
+                monthly_rent=Decimal('5000.00'), house_type=HouseType.objects.get(),
+            )
+            for number in range(600)
+        )
+        call_command('rebuild_search_index', stdout=io.StringIO())
+
+    def house_numbers(self, search):
+        numbers = []
+        url = f'/api/brms/houses/?search={search}&page_size=2'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, response.content)
+            numbers += [house['number'] for house in response.data['results']]
+            url = response.data['next']
+        return numbers
+
+    def test_search_is_scoped_before_ranking(self):
+        self.assertEqual(len(search_ids(House, ['sunrise'])), 603)
+        self.assertEqual(sorted(self.house_numbers('sunri')), ['A0', 'A1', 'A2'])
+        self.assertEqual(self.house_numbers('mombasa'), [])
+        self.assertEqual(self.house_numbers('"'), [])
+
+    def test_index_follows_saves_and_deletes(self):
+        self.apartment.refresh_from_db()
+        self.apartment.location = 'Kisumu'
+        self.apartment.save()
+        self.assertEqual(sorted(self.house_numbers('kisumu')), ['A0', 'A1', 'A2'])
+        House.objects.get(number='A2').delete()
+        self.assertEqual(sorted(self.house_numbers('kisumu')), ['A0', 'A1'])
+
+        tenant = Tenant.objects.get()
+        tenant.last_name = 'Kamau'
+        tenant.save()
+        self.assertEqual(search_ids(Tenant, ['kamau']), [tenant.pk])
+
+    def test_rebuild_and_migration_backfill(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM accounts_house_fts')
+        self.assertEqual(self.house_numbers('sunrise'), [])
+
+        out = io.StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        self.assertIn('Indexed 603 houses', out.getvalue())
+        self.assertEqual(len(self.house_numbers('sunrise')), 3)
+
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM accounts_house_fts')
+        build_search_index = import_module('accounts.migrations.0016_search_index').build_search_index
+        build_search_index(django_apps, SimpleNamespace(connection=connection))
+        self.assertEqual(len(self.house_numbers('sunrise')), 3)
+        self.assertEqual(len(search_ids(Invoice, ['doe'])), 0)
+        self.assertEqual(search_ids(Tenant, ['doe']), [Tenant.objects.get().pk])
+
+
+class RoleScopingTests(TestCase):
+    """
+    Each role sees only its own rows on every role-scoped endpoint
+    """
+    def setUp(self):
+        self.portfolios = [create_portfolio(houses=2)]
+        landlord = Landlord.objects.create(
+            first_name='Other', id_number='L-2', email='other@example.com',
+            phone_number='+254700000009', physical_address='Mombasa'
+        )
+        apartment = Apartment.objects.create(
+            name='Ocean View', location='Mombasa', apartment_type=ApartmentType.objects.get(),
+            owner=landlord, management_fee_percentage=Decimal('10.00')
+        )
+        tenant = Tenant.objects.create(
+            first_name='Mary', last_name='Wanjiru', id_number_or_passport='T-2',
+            email='mary@example.com', phone_number='+254700000008'
+        )
+        for number in range(2):
+            House.objects.create(
+                apartment=apartment, number=f'B{number}', monthly_rent=Decimal('8000.00'),
+                house_type=HouseType.objects.get(), tenant=tenant if number == 0 else None
+            )
+        self.portfolios.append((landlord, apartment, tenant))
+
+        self.rows = []
+        for number, (landlord, apartment, tenant) in enumerate(self.portfolios):
+            occupied, vacant = apartment.houses.order_by('number')
+            invoice = Invoice.objects.create(tenant=tenant, house=occupied, month='January', year=2025, rent=occupied.monthly_rent)
+            self.rows.append({
+                'landlords': landlord.pk, 'tenants': tenant.pk, 'apartments': apartment.pk,
+                'houses': {occupied.pk, vacant.pk}, 'invoices': invoice.pk,
+                'payments': Payment.objects.create(invoice=invoice, amount=Decimal('100.00')).pk,
+                'bookings': HouseBooking.objects.create(
+                    house=vacant, tenant=tenant, deposit_amount=Decimal('0.00'), rent_amount_paid=Decimal('0.00')
+                ).pk,
+                'vacant_house': vacant.pk,
+            })
+
+            landlord.user = User.objects.create_user(f'landlord{number}', password='pass')
+            landlord.save()
+            Role.objects.filter(user=landlord.user).update(role_type='landlord')
+            tenant.user = User.objects.create_user(f'tenant{number}', password='pass')
+            tenant.save()
+
+    def visible(self, user, endpoint):
+        client = APIClient()
+        client.force_authenticate(User.objects.get(pk=user.pk))
+        ids = set()
+        url = f'/api/brms/{endpoint}/?page_size=200'
+        while url:
+            response = client.get(url)
+            self.assertEqual(response.status_code, 200, response.data)
+            ids |= {row['id'] for row in response.data['results']}
+            url = response.data['next']
+        return ids
+
+    def expected(self, endpoint, *portfolios):
+        ids = set()
+        for number in portfolios:
+            value = self.rows[number][endpoint]
+            ids |= value if isinstance(value, set) else {value}
+        return ids
+
+    def test_landlord_sees_only_their_portfolio(self):
+        landlord = self.portfolios[0][0].user
+        for endpoint in ('landlords', 'tenants', 'apartments', 'houses', 'bookings', 'invoices', 'payments'):
+            self.assertEqual(self.visible(landlord, endpoint), self.expected(endpoint, 0), endpoint)
+
+    def test_tenant_sees_only_their_rows(self):
+        tenant = self.portfolios[1][2].user
+        for endpoint in ('landlords', 'tenants', 'bookings', 'invoices', 'payments'):
+            self.assertEqual(self.visible(tenant, endpoint), self.expected(endpoint, 1), endpoint)
+        # Browsing shows every apartment, and their own house plus the vacant ones
+        self.assertEqual(self.visible(tenant, 'apartments'), self.expected('apartments', 0, 1))
+        self.assertEqual(
+            self.visible(tenant, 'houses'),
+            self.expected('houses', 1) | {self.rows[0]['vacant_house']}
+        )
+
+    def test_admin_sees_everything_and_others_see_nothing_private(self):
+        admin = User.objects.create_user('admin', password='pass', is_staff=True)
+        for endpoint in ('landlords', 'tenants', 'apartments', 'houses', 'bookings', 'invoices', 'payments'):
+            self.assertEqual(self.visible(admin, endpoint), self.expected(endpoint, 0, 1), endpoint)
+
+        nobody = User.objects.create_user('nobody', password='pass')
+        for endpoint in ('landlords', 'tenants', 'bookings', 'invoices', 'payments'):
+            self.assertEqual(self.visible(nobody, endpoint), set(), endpoint)
+        self.assertEqual(self.visible(nobody, 'houses'), {row['vacant_house'] for row in self.rows})
+
+        # Another landlord's rows are not found, rather than forbidden
+        client = APIClient()
+        client.force_authenticate(User.objects.get(pk=self.portfolios[0][0].user_id))
+        self.assertEqual(client.get(f"/api/brms/invoices/{self.rows[1]['invoices']}/").status_code, 404)
+
+
+class HouseFilterTests(TestCase):
+    def setUp(self):
+        _, self.apartment, tenant = create_portfolio()
+        self.other = Apartment.objects.create(
+            name='Ocean View', location='Mombasa', apartment_type=ApartmentType.objects.get(),
+            owner=self.apartment.owner, management_fee_percentage=Decimal('10.00')
+        )
+        self.bedsitter = HouseType.objects.get()
+        self.one_bedroom = HouseType.objects.create(name='One bedroom')
+        House.objects.filter(number='A0').update(monthly_rent=Decimal('12000.00'))
+        for apartment, number, rent, house_type, status in [
+            (self.apartment, 'A1', '8000.00', self.bedsitter, 'vacant'),
+            (self.apartment, 'A2', '15000.00', self.one_bedroom, 'vacant'),
+            (self.other, 'B0', '9500.00', self.one_bedroom, 'vacant'),
+            (self.other, 'B1', '20000.00', self.one_bedroom, 'maintenance'),
+        ]:
+            House.objects.create(
+                apartment=apartment, number=number, monthly_rent=Decimal(rent), house_type=house_type, status=status
+            )
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('admin', password='pass', is_staff=True))
+
+    def numbers(self, query, path='houses'):
+        response = self.client.get(f'/api/brms/{path}/?{query}')
+        self.assertEqual(response.status_code, 200, response.data)
+        return sorted(house['number'] for house in response.data['results'])
+
+    def test_rent_range_status_type_and_apartment(self):
+        self.assertEqual(self.numbers('min_rent=9500&max_rent=15000'), ['A0', 'A2', 'B0'])
+        self.assertEqual(self.numbers('min_rent=15000.01'), ['B1'])
+        self.assertEqual(self.numbers('status=vacant'), ['A1', 'A2', 'B0'])
+        self.assertEqual(self.numbers('status=occupied,maintenance'), ['A0', 'B1'])
+        self.assertEqual(self.numbers(f'house_type={self.one_bedroom.pk}'), ['A2', 'B0', 'B1'])
+        self.assertEqual(self.numbers(f'house_type_id={self.bedsitter.pk}'), ['A0', 'A1'])
+        self.assertEqual(self.numbers(f'apartment={self.other.pk}'), ['B0', 'B1'])
+        self.assertEqual(self.numbers(f'apartment_id={self.apartment.pk}&status=vacant'), ['A1', 'A2'])
+        self.assertEqual(self.numbers('location=momb'), ['B0', 'B1'])
+        self.assertEqual(
+            self.numbers(f'status=vacant&max_rent=10000&house_type={self.one_bedroom.pk}'), ['B0']
+        )
+        # The vacant listing takes the same filters
+        self.assertEqual(self.numbers('max_rent=9999', path='houses/vacant'), ['A1', 'B0'])
+
+    def test_invalid_values_are_rejected(self):
+        for query in ('min_rent=cheap', 'max_rent=', 'apartment=two', 'house_type_id=-1'):
+            response = self.client.get(f'/api/brms/houses/?{query}')
+            self.assertEqual(response.status_code, 200 if query == 'max_rent=' else 400, query)
+        self.assertIn('min_rent', self.client.get('/api/brms/houses/?min_rent=cheap').data)
+
+
+class QueryBudgetTests(PortfolioFixture):
+    """
+    Lock the number of queries each list and detail endpoint costs, so an
+    N+1 in a serializer or a missing select_related fails the build.
+    """
+    def test_admin_list_endpoints(self):
+        for url, queries in [
+            ('/api/accounts/users/', 1),
+            ('/api/accounts/profiles/', 1),
+            ('/api/accounts/roles/', 1),
+            ('/api/brms/tenants/', 1),
+            ('/api/brms/landlords/', 1),
+            ('/api/brms/apartment-types/', 1),
+            ('/api/brms/house-types/', 1),
+            ('/api/brms/apartments/', 1),
+            ('/api/brms/houses/', 1),
+            ('/api/brms/bookings/', 1),
+            ('/api/brms/invoices/', 1),
+            ('/api/brms/invoices/unpaid/', 1),
+            ('/api/brms/houses/vacant/', 1),
+        ]:
+            with self.subTest(url=url):
+                self.assertBudget(self.admin, url, queries)
+
+    def test_admin_detail_endpoints(self):
+        house = House.objects.first()
+        for url, queries in [
+            (f'/api/brms/tenants/{house.tenant_id}/', 1),
+            (f'/api/brms/houses/{house.pk}/', 1),
+            (f'/api/brms/apartments/{house.apartment_id}/', 1),
+            (f'/api/brms/bookings/{HouseBooking.objects.first().pk}/', 1),
+            (f'/api/brms/invoices/{Invoice.objects.first().pk}/', 1),
+        ]:
+            with self.subTest(url=url):
+                self.assertBudget(self.admin, url, queries)
+
+    def test_landlord_list_endpoints(self):
+        # One extra query resolves the landlord profile for scoping
+        for url, queries in [
+            ('/api/brms/tenants/', 2),
+            ('/api/brms/landlords/', 2),
+            ('/api/brms/apartments/', 2),
+            ('/api/brms/houses/', 2),
+            ('/api/brms/bookings/', 2),
+            ('/api/brms/invoices/', 2),
+        ]:
+            with self.subTest(url=url):
+                response = self.assertBudget(self.landlord_user, url, queries)
+                self.assertGreaterEqual(len(response.data['results']), 1)
+
+    def test_payment_endpoints(self):
+        factory = APIRequestFactory()
+        for user, actions, kwargs, queries in [
+            (self.admin, {'get': 'list'}, {}, 1),
+            (self.admin, {'get': 'retrieve'}, {'pk': Payment.objects.first().pk}, 1),
+            (self.landlord_user, {'get': 'list'}, {}, 2),
+        ]:
+            with self.subTest(user=user.username, actions=actions):
+                request = factory.get('/payments/')
+                force_authenticate(request, user=User.objects.get(pk=user.pk))
+                view = PaymentViewSet.as_view(actions)
+                with self.assertNumQueries(queries):
+                    response = view(request, **kwargs)
+                    response.render()
+                self.assertEqual(response.status_code, 200)
+
+
+class CursorPaginationTests(PortfolioFixture):
+    def test_pages_walk_every_row_once(self):
+        client = self.client_for(self.admin)
+        url, seen = '/api/brms/invoices/?page_size=1', []
+        while url:
+            with self.assertNumQueries(1):
+                response = client.get(url)
+            seen.extend(invoice['id'] for invoice in response.data['results'])
+            url = response.data['next']
+        expected = Invoice.objects.order_by('-date_added', '-id').values_list('pk', flat=True)
+        self.assertEqual(seen, list(expected))
+
+
+class DashboardStatsTests(PortfolioFixture):
+    def test_stats_per_role(self):
+        cache.clear()
+        response = self.assertBudget(self.admin, '/api/admin/stats', 6)
+        self.assertEqual(response.data['houses']['occupied'], self.rows)
+        self.assertEqual(response.data['pending_bookings'], self.rows)
+        self.assertEqual(response.data['tenants'], Tenant.objects.count())
+        # Served from cache until the TTL runs out
+        self.assertBudget(self.admin, '/api/admin/stats', 0)
+
+        response = self.assertBudget(self.landlord_user, '/api/landlord/stats', 5)
+        self.assertEqual(response.data['houses']['total'], self.rows)
+        self.assertNotIn('tenants', response.data)
+        self.assertEqual(self.client_for(self.landlord_user).get('/api/tenant/stats').status_code, 403)
+
+    def test_collections_are_bounded_by_datetimes(self):
+        month_start = timezone.make_aware(datetime.combine(timezone.localdate().replace(day=1), datetime.min.time()))
+        earlier, later, *_ = Payment.objects.order_by('pk')
+        Payment.objects.filter(pk=earlier.pk).update(payment_date=month_start - timedelta(seconds=1))
+        Payment.objects.filter(pk=later.pk).update(payment_date=month_start + timedelta(days=40))
+
+        with CaptureQueriesContext(connection) as queries:
+            stats = compute_dashboard_stats()
+        self.assertEqual(stats['collected_this_month'], Decimal('500.00') * (self.rows - 2))
+        payments_sql = next(query['sql'] for query in queries if 'accounts_payment' in query['sql'])
+        self.assertNotIn('cast_date', payments_sql)
+
+
+class ActivityFeedTests(PortfolioFixture):
+    def test_feeds_are_scoped_per_role(self):
+        landlord = self.landlord_user.landlord_profile
+        self.assertEqual(
+            set(ActivityEvent.objects.filter(landlord=landlord).values_list('event_type', flat=True)),
+            {'tenant_assigned', 'tenant_vacated', 'booking_created', 'invoice_created', 'payment_received',
+             'invoice_status'}
+        )
+        response = self.assertBudget(self.landlord_user, '/api/landlord/activities', 2)
+        feed = response.data['results']
+        # The last payment moved its invoice to partially paid
+        self.assertEqual([event['event_type'] for event in feed[:2]], ['invoice_status', 'payment_received'])
+        self.assertEqual(len(feed), min(20, ActivityEvent.objects.filter(landlord=landlord).count()))
+
+        tenant_user = User.objects.get(username='tenant0')
+        response = self.assertBudget(tenant_user, '/api/tenant/activities', 2)
+        self.assertEqual({event['tenant'] for event in response.data['results']}, {tenant_user.tenant_profile.pk})
+        self.assertEqual(self.assertBudget(self.landlord_user, '/api/admin/activities', 0).data['results'], [])
+
+
+class NotificationStreamTests(TestCase):
+    def setUp(self):
+        _, apartment, self.tenant = create_portfolio()
+        self.house = apartment.houses.get()
+        self.invoice = Invoice.objects.create(
+            tenant=self.tenant, house=self.house, month='January', year=2025, rent=Decimal('10000.00')
+        )
+        self.tenant.user = User.objects.create_user('streamer', password='pass')
+        self.tenant.save()
+        self.token = Token.objects.create(user=self.tenant.user)
+
+    def pay(self, amount):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Payment.objects.create(invoice=self.invoice, amount=amount)
+
+    def ticket(self, role='tenant'):
+        response = self.client.post(
+            f'/api/{role}/notifications/stream/ticket', headers={'Authorization': f'Token {self.token.key}'}
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()['ticket']
+
+    def request(self, **params):
+        request = RequestFactory().get('/api/tenant/notifications/stream', params)
+        request.user = AnonymousUser()
+        return request
+
+    async def read_frame(self, stream):
+        return await asyncio.wait_for(anext(stream), timeout=5)
+
+    async def test_payments_are_pushed_to_subscribed_tenant(self):
+        await sync_to_async(self.pay)(Decimal('1000.00'))
+        assigned = await ActivityEvent.objects.aget(event_type='tenant_assigned')
+        ticket = await sync_to_async(self.ticket)()
+        response = await self.async_client.get(
+            f'/api/tenant/notifications/stream?ticket={ticket}',
+            headers={'Last-Event-ID': str(assigned.pk)},
+        )
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+        self.assertEqual(await self.read_frame(stream), b'retry: 5000\n\n')
+        # Events since Last-Event-ID are replayed, then live ones pushed
+        self.assertIn(b'event: invoice_created', await self.read_frame(stream))
+        self.assertIn(b'Payment of 1000.00', await self.read_frame(stream))
+        await sync_to_async(self.pay)(Decimal('2500.00'))
+        frame = await self.read_frame(stream)
+        self.assertIn(b'event: payment_received', frame)
+        self.assertIn(b'Payment of 2500.00', frame)
+        await stream.aclose()
+
+    async def test_stream_requires_matching_role(self):
+        response = await self.async_client.get('/api/tenant/notifications/stream')
+        self.assertEqual(response.status_code, 401)
+        response = await self.async_client.get(
+            '/api/landlord/notifications/stream', headers={'Authorization': f'Token {self.token.key}'}
+        )
+        self.assertEqual(response.status_code, 403)
+
+    def test_stream_tickets_are_scoped_and_short_lived(self):
+        headers = {'Authorization': f'Token {self.token.key}'}
+        self.assertEqual(self.client.post('/api/landlord/notifications/stream/ticket', headers=headers).status_code, 403)
+        self.assertEqual(self.client.post('/api/tenant/notifications/stream/ticket').status_code, 401)
+
+        ticket = self.ticket()
+        self.assertNotIn(self.token.key, ticket)
+        self.assertEqual(stream_user(self.request(ticket=ticket), 'tenant'), self.tenant.user)
+        # Not for another role, not once expired, not tampered with, and the API token is no longer taken
+        self.assertIsNone(stream_user(self.request(ticket=ticket), 'admin'))
+        with mock.patch.object(notifications, 'STREAM_TICKET_MAX_AGE', -1):
+            self.assertIsNone(stream_user(self.request(ticket=ticket), 'tenant'))
+        self.assertIsNone(stream_user(self.request(ticket=ticket[:-1]), 'tenant'))
+        self.assertIsNone(stream_user(self.request(token=self.token.key), 'tenant'))
+
+    def test_stream_is_refused_under_wsgi(self):
+        response = self.client.get(f'/api/tenant/notifications/stream?ticket={self.ticket()}')
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('ASGI', response.json()['error'])
+
+
+class MpesaGatewayTests(TestCase):
+    def setUp(self):
+        _, apartment, tenant = create_portfolio()
+        self.invoice = Invoice.objects.create(
+            tenant=tenant, house=apartment.houses.get(), month='January', year=2025, rent=Decimal('10000.00')
+        )
+        tenant.user = User.objects.create_user('payer', password='pass')
+        tenant.save()
+        self.headers = {'Authorization': f'Token {Token.objects.create(user=tenant.user).key}'}
+        cache.clear()
+
+        self.gateway = FakeMpesaServer().start()
+        self.addCleanup(self.gateway.stop)
+        mpesa_settings = override_settings(MPESA={
+            'BASE_URL': self.gateway.url, 'CONSUMER_KEY': 'key', 'CONSUMER_SECRET': 'secret',
+            'SHORTCODE': '174379', 'PASSKEY': 'passkey', 'CALLBACK_URL': 'http://testserver/api/payments/mpesa/callback/',
+            'CALLBACK_TOKEN': 'callback-secret',
+        })
+        mpesa_settings.enable()
+        self.addCleanup(mpesa_settings.disable)
+
+    def initiate(self, amount='2500'):
+        response = self.client.post('/api/payments/mpesa/initiate/', {
+            'phone_number': '0712345678', 'amount': amount, 'invoice_id': self.invoice.pk,
+        }, content_type='application/json', headers=self.headers)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()['checkout_request_id']
+
+    def status(self, checkout_request_id):
+        # Only the token lookup touches the database
+        with self.assertNumQueries(1):
+            return self.client.get(f'/api/payments/mpesa/status/{checkout_request_id}/', headers=self.headers).json()
+
+    def post_callback(self, payload, token='callback-secret'):
+        return self.client.post(f'/api/payments/mpesa/callback/?token={token}', payload, content_type='application/json')
+
+    def callback(self, payload):
+        response = self.post_callback(payload)
+        self.assertEqual(response.json()['ResultCode'], 0)
+
+    def test_successful_payment_is_recorded_once(self):
+        checkout_request_id = self.initiate()
+        self.assertEqual(self.gateway.pushes[checkout_request_id]['PhoneNumber'], '254712345678')
+        self.assertEqual(self.status(checkout_request_id)['status'], 'pending')
+
+        payload = self.gateway.callback_payload(checkout_request_id)
+        self.callback(payload)
+        self.callback(payload)
+
+        status = self.status(checkout_request_id)
+        self.assertTrue(status['success'])
+        payment = Payment.objects.get()
+        self.assertEqual((payment.amount, payment.payment_method), (Decimal('2500'), 'mobile_money'))
+        self.assertEqual(status['transaction_id'], payment.transaction_reference)
+        self.invoice.refresh_from_db()
+        self.assertEqual(self.invoice.amount_paid, Decimal('2500.00'))
+
+    def test_cancelled_push_and_bad_requests(self):
+        checkout_request_id = self.initiate()
+        self.callback(self.gateway.callback_payload(checkout_request_id, result_code=1032))
+        status = self.status(checkout_request_id)
+        self.assertEqual((status['success'], status['status']), (False, 'failed'))
+        self.assertFalse(Payment.objects.exists())
+
+        response = self.client.post('/api/payments/mpesa/initiate/', {
+            'phone_number': '0712345678', 'amount': '20000', 'invoice_id': self.invoice.pk,
+        }, content_type='application/json', headers=self.headers)
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(f'/api/payments/mpesa/status/{checkout_request_id}/')
+        self.assertEqual(response.status_code, 401)
+
+    def test_forged_callbacks_are_refused(self):
+        checkout_request_id = self.initiate()
+        self.assertIn('?token=callback-secret', self.gateway.pushes[checkout_request_id]['CallBackURL'])
+        # What a tenant who knows their CheckoutRequestID could post, before paying
+        forged = self.gateway.callback_payload(checkout_request_id)
+        del self.gateway.results[checkout_request_id]
+
+        self.assertEqual(self.post_callback(forged, token='guess').status_code, 403)
+        with self.settings(MPESA={**settings.MPESA, 'CALLBACK_TOKEN': ''}):
+            self.assertEqual(self.post_callback(forged, token='').status_code, 403)
+        # Right token, but the push query says the customer has not paid
+        self.assertEqual(self.post_callback(forged).status_code, 400)
+
+        inflated = json.loads(json.dumps(forged))
+        inflated['Body']['stkCallback']['CallbackMetadata']['Item'][0]['Value'] = 250000
+        self.gateway.results[checkout_request_id] = 0
+        with self.assertLogs('accounts.mpesa', 'WARNING'):
+            self.assertEqual(self.post_callback(inflated).status_code, 400)
+
+        self.assertFalse(Payment.objects.exists())
+        self.assertEqual(MpesaTransaction.objects.get().status, 'pending')
+        # The genuine callback still goes through afterwards
+        self.callback(self.gateway.callback_payload(checkout_request_id))
+        self.assertEqual(Payment.objects.get().amount, Decimal('2500'))
+
+    def test_deploy_check_requires_callback_token(self):
+        self.assertEqual(check_mpesa_callback_token(None), [])
+        with self.settings(MPESA={**settings.MPESA, 'CALLBACK_TOKEN': ''}):
+            self.assertEqual([error.id for error in check_mpesa_callback_token(None)], ['accounts.E001'])
+
+
+class PaymentIngestTests(TestCase):
+    def setUp(self):
+        _, apartment, tenant = create_portfolio(houses=2)
+        first, second = apartment.houses.all()
+        self.invoices = [
+            Invoice.objects.create(tenant=tenant, house=house, month='January', year=2025, rent=Decimal('10000.00'))
+            for house in (first, second)
+        ]
+        Payment.objects.create(
+            invoice=self.invoices[0], amount=Decimal('100.00'), payment_method='mobile_money', transaction_reference='OLD1'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('admin', password='pass', is_staff=True))
+
+    def ingest(self, items):
+        return self.client.post('/api/brms/payments/ingest/', {'payments': items}, format='json')
+
+    def test_batch_is_deduplicated_and_replayable(self):
+        first, second = (invoice.pk for invoice in self.invoices)
+        items = [
+            {'invoice': first, 'amount': '1000', 'transaction_reference': 'QA1'},
+            {'invoice': second, 'amount': '2500.50', 'transaction_reference': 'QA2'},
+            {'invoice': first, 'amount': '1000', 'transaction_reference': 'QA1'},
+            {'invoice': first, 'amount': '100', 'transaction_reference': 'OLD1'},
+            {'invoice': first, 'amount': '100', 'transaction_reference': 'OLD1', 'payment_method': 'bank_transfer'},
+            {'invoice': 999999, 'amount': '100', 'transaction_reference': 'QA3'},
+            {'invoice': first, 'amount': '-5', 'transaction_reference': ''},
+        ]
+        response = self.ingest(items)
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual((response.data['created'], response.data['duplicates'], response.data['invalid']), (3, 2, 2))
+        statuses = [result['status'] for result in response.data['results']]
+        self.assertEqual(statuses, ['created', 'created', 'duplicate', 'duplicate', 'created', 'invalid', 'invalid'])
+        self.assertEqual(response.data['results'][2]['payment_id'], response.data['results'][0]['payment_id'])
+        self.assertEqual(set(response.data['results'][6]['errors']), {'amount', 'transaction_reference'})
+
+        for invoice, paid, payment_status in zip(self.invoices, ['1200.00', '2500.50'], ['partial', 'partial']):
+            invoice.refresh_from_db()
+            self.assertEqual((invoice.amount_paid, invoice.payment_status), (Decimal(paid), payment_status))
+        self.assertEqual(ActivityEvent.objects.filter(event_type='payment_received').count(), 4)
+
+        # Replaying the same batch changes nothing
+        response = self.ingest(items)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['created'], response.data['duplicates']), (0, 5))
+        self.assertEqual(Payment.objects.count(), 4)
+
+    def test_single_payment_with_recorded_reference_is_rejected(self):
+        def pay(**fields):
+            return self.client.post('/api/brms/payments/', {'invoice': self.invoices[0].pk, 'amount': '50', **fields}, format='json')
+
+        response = pay(payment_method='mobile_money', transaction_reference='OLD1')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['non_field_errors'][0].code, 'unique')
+        self.assertEqual(pay(payment_method='bank_transfer', transaction_reference='OLD1').status_code, 201)
+        self.assertEqual(pay(transaction_reference='').status_code, 201)
+        self.assertEqual(pay(transaction_reference='').status_code, 201)
+
+        # Recorded by another request between validation and the insert
+        with mock.patch.object(UniqueTogetherValidator, '__call__', return_value=None):
+            response = pay(payment_method='mobile_money', transaction_reference='OLD1')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(Payment.objects.filter(transaction_reference='OLD1').count(), 2)
+        self.invoices[0].refresh_from_db()
+        self.assertEqual(self.invoices[0].amount_paid, Decimal('250.00'))
+
+    def test_query_count_does_not_grow_with_batch(self):
+        items = [
+            {'invoice': self.invoices[number % 2].pk, 'amount': '10', 'transaction_reference': f'BULK{number}'}
+            for number in range(100)
+        ]
+        # Invoice and reference lookups, one insert, one ledger UPDATE (both
+        # invoices are paid the same total) with the status reads around it,
+        # the invoice_status event's lookup and insert, the payment events'
+        # lookup and insert, plus the savepoint pair
+        with self.assertNumQueries(12):
+            response = self.ingest(items)
+        self.assertEqual(response.data['created'], 100)
+
+
+class ReconciliationTests(TestCase):
+    def setUp(self):
+        _, apartment, tenant = create_portfolio(houses=2)
+        first, second = apartment.houses.all()
+        self.january = Invoice.objects.create(tenant=tenant, house=first, month='January', year=2025, rent=Decimal('10000.00'))
+        self.february = Invoice.objects.create(tenant=tenant, house=first, month='February', year=2025, rent=Decimal('10000.00'))
+        self.other = Invoice.objects.create(tenant=tenant, house=second, month='January', year=2025, rent=Decimal('7500.00'))
+        Payment.objects.create(
+            invoice=self.other, amount=Decimal('10.00'), payment_method='bank_transfer', transaction_reference='DONE1'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('admin', password='pass', is_staff=True))
+
+    def reconcile(self, rows, **data):
+        statement = BytesIO('\n'.join(['Date,Receipt No.,Details,Phone,Paid In'] + rows).encode())
+        statement.name = 'statement.csv'
+        return self.client.post('/api/brms/payments/reconcile/', {'statement': statement, **data}, format='multipart')
+
+    def test_statement_lines_are_matched_or_sent_for_review(self):
+        rows = [
+            f'2025-01-05,R1,Rent Invoice-{self.february.pk},,"4,000.00"',
+            '2025-01-05,R2,Rent,0700000002,7490.00',
+            '2025-01-06,R3,Rent,+254700000002,3000',
+            '2025-01-06,R4,Rent,0799999999,3000',
+            '2025-01-07,DONE1,Rent,0700000002,10',
+            '2025-01-07,R5,Rent,0700000002,50000',
+            '2025-01-07,,Rent,0700000002,100',
+        ]
+        response = self.reconcile(rows)
+        self.assertEqual(response.status_code, 200, response.content)
+        summary = response.data['summary']
+        self.assertEqual(
+            (summary['lines'], summary['matched'], summary['created'], summary['already_recorded'], summary['unmatched']),
+            (7, 3, 3, 1, 3)
+        )
+        self.assertEqual(
+            (summary['matched_by_reference'], summary['matched_by_phone_amount'], summary['matched_by_phone_oldest']),
+            (1, 1, 1)
+        )
+        self.assertEqual([line['reference'] for line in response.data['unmatched']], ['R4', 'R5', ''])
+
+        paid = dict(Payment.objects.filter(transaction_reference__startswith='R').values_list('transaction_reference', 'invoice'))
+        self.assertEqual(paid, {'R1': self.february.pk, 'R2': self.other.pk, 'R3': self.january.pk})
+        self.other.refresh_from_db()
+        self.assertEqual(self.other.payment_status, 'paid')
+
+        # A second run only reports what was already recorded
+        response = self.reconcile(rows)
+        self.assertEqual((response.data['summary']['created'], response.data['summary']['already_recorded']), (0, 4))
+
+    def test_statement_amounts_are_parsed_strictly(self):
+        for text, amount in [
+            ('1000', Decimal('1000')), ('KES 1,000.00', Decimal('1000.00')), ('Ksh. 1000', Decimal('1000')),
+            ('kshs 2,500.50', Decimal('2500.50')), ('(1,000.00)', Decimal('-1000.00')),
+            ('1000.00-', Decimal('-1000.00')), ('-KES 50', Decimal('-50')), ('KES -50', Decimal('-50')),
+        ]:
+            self.assertEqual(parse_amount(text), amount, text)
+        for text in ['', 'KES', '1,00', '1.000.00', '10 00', '(100', '-(100)', '--100', '100-200', 'USD 100', 'NaN']:
+            self.assertIsNone(parse_amount(text), text)
+
+        response = self.reconcile([
+            f'2025-01-05,R1,Invoice {self.january.pk},,Ksh. 1000', f'2025-01-05,R2,Invoice {self.january.pk},,"(1,000.00)"',
+            f'2025-01-05,R3,Invoice {self.january.pk},,1000.00-', f'2025-01-05,R4,Invoice {self.january.pk},,"1,00"',
+        ])
+        self.assertEqual(
+            [(line['reference'], line['reason']) for line in response.data['unmatched']],
+            [('R2', 'Not a credit'), ('R3', 'Not a credit'), ('R4', 'Unreadable amount')]
+        )
+        self.assertEqual(Payment.objects.get(transaction_reference='R1').amount, Decimal('1000.00'))
+
+    def test_dry_run_records_nothing(self):
+        response = self.reconcile([f'2025-01-05,R1,Invoice {self.january.pk},,100'], dry_run='true')
+        self.assertEqual((response.data['summary']['matched'], response.data['summary']['created']), (1, 0))
+        self.assertFalse(Payment.objects.filter(transaction_reference='R1').exists())
+
+    def test_command_writes_the_review_report_to_its_stdout(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as statement:
+            statement.write('Date,Receipt No.,Details,Phone,Paid In\n')
+            statement.write(f'2025-01-05,R1,Invoice {self.january.pk},,100\n2025-01-06,R4,Rent,0799999999,3000\n')
+        self.addCleanup(os.remove, statement.name)
+
+        out, err = io.StringIO(), io.StringIO()
+        call_command('reconcile_statement', statement.name, stdout=out, stderr=err)
+        report = list(csv.DictReader(io.StringIO(out.getvalue())))
+        self.assertEqual([line['reference'] for line in report], ['R4'])
+        self.assertIn('matched 1, recorded 1 payment(s)', err.getvalue())
+        self.assertTrue(Payment.objects.filter(transaction_reference='R1', invoice=self.january).exists())
+
+
+class BulkImportTests(TestCase):
+    def setUp(self):
+        _, self.apartment, self.tenant = create_portfolio(houses=1)
+        self.house_type = HouseType.objects.get()
+
+    def import_csv(self, resource_class, rows):
+        return stream_import(resource_class, rows, chunk_size=2)
+
+    def test_houses_refresh_counts_status_and_activity(self):
+        summary, problems = self.import_csv(BulkHouseResource, [
+            'id,apartment,number,monthly_rent,house_type,status,tenant',
+            f',{self.apartment.pk},B1,9000,{self.house_type.pk},vacant,',
+            f',{self.apartment.pk},B2,9000,{self.house_type.pk},vacant,{self.tenant.pk}',
+            f',{self.apartment.pk},B3,-5,{self.house_type.pk},vacant,',
+            f',999999,B4,9000,{self.house_type.pk},vacant,',
+            f',{self.apartment.pk},B5,9000,{self.house_type.pk},maintenance,',
+        ])
+        self.assertEqual((summary['rows'], summary['new']), (5, 3))
+        self.assertEqual([problem['line'] for problem in problems], [4, 5])
+        self.assertIn('monthly_rent', problems[0]['errors'])
+
+        self.apartment.refresh_from_db()
+        self.assertEqual(self.apartment.total_houses, 4)
+        self.assertEqual(
+            dict(House.objects.filter(number__startswith='B').values_list('number', 'status')),
+            {'B1': 'vacant', 'B2': 'occupied', 'B5': 'maintenance'}
+        )
+        self.assertTrue(ActivityEvent.objects.filter(
+            event_type='tenant_assigned', object_id=House.objects.get(number='B2').pk
+        ).exists())
+        self.assertEqual(
+            list(HouseOccupancyInterval.objects.filter(house__number='B2').values_list('status', 'tenant_id', 'ended_at')),
+            [('occupied', self.tenant.pk, None)]
+        )
+
+    def test_invoices_get_totals_status_and_unique_checks(self):
+        house = self.apartment.houses.get()
+        Invoice.objects.create(tenant=self.tenant, house=house, month='January', year=2025, rent=Decimal('10000.00'))
+        summary, problems = self.import_csv(BulkInvoiceResource, [
+            'id,tenant,house,month,year,rent,additional_charges,discount,amount_paid',
+            f',{self.tenant.pk},{house.pk},January,2025,10000,0,0,0',
+            f',{self.tenant.pk},{house.pk},February,2025,10000,500,0,10500',
+            f',{self.tenant.pk},{house.pk},March,2025,10000,0,1000,100',
+            f',{self.tenant.pk},{house.pk},March,2025,10000,0,0,0',
+        ])
+        self.assertEqual(summary['new'], 2)
+        self.assertEqual([problem['line'] for problem in problems], [2, 5])
+
+        february = Invoice.objects.get(month='February')
+        self.assertEqual((february.total_payable, february.payment_status), (Decimal('10500.00'), 'paid'))
+        self.assertEqual(february.period.isoformat(), '2025-02-01')
+        march = Invoice.objects.get(month='March')
+        self.assertEqual((march.total_payable, march.payment_status), (Decimal('9000.00'), 'partial'))
+        self.assertEqual(ActivityEvent.objects.filter(
+            event_type='invoice_created', object_id__in=[february.pk, march.pk]
+        ).count(), 2)
+
+
+class StreamingExportTests(PortfolioFixture):
+    def test_exports_are_scoped_and_read_in_one_query(self):
+        for url, columns in [
+            ('/api/brms/invoices/export/', 18), ('/api/brms/payments/export/', 11),
+            ('/api/brms/tenants/export/', 12), ('/api/brms/houses/export/', 11),
+        ]:
+            # The landlord profile, then one query for the rows however many there are
+            client = self.client_for(self.landlord_user)
+            with self.assertNumQueries(2):
+                response = client.get(url)
+                content = b''.join(response.streaming_content).decode()
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('attachment;', response['Content-Disposition'])
+            header, *rows = csv.reader(io.StringIO(content))
+            self.assertEqual((len(header), len(rows)), (columns, self.rows), url)
+
+        # Tenants only get their own rows
+        tenant = Tenant.objects.get(id_number_or_passport='TB-0')
+        response = self.client_for(tenant.user).get('/api/brms/invoices/export/?file_format=json')
+        invoices = json.loads(b''.join(response.streaming_content))
+        self.assertEqual([invoice['tenant_id'] for invoice in invoices], [tenant.pk])
+        self.assertEqual(invoices[0]['total_payable'], '10000.00')
+
+        response = self.client_for(self.landlord_user).get('/api/brms/invoices/export/?file_format=xlsx')
+        self.assertEqual(response.status_code, 400)
+
+    async def test_exports_stream_chunk_by_chunk_under_asgi(self):
+        token, _ = await Token.objects.aget_or_create(user=self.landlord_user)
+        written = []
+
+        def one_row_per_write(columns, rows):
+            for chunk in stream_csv(columns, rows, rows_per_write=1):
+                written.append(chunk)
+                yield chunk
+
+        with mock.patch('accounts.api.mixins.stream_csv', one_row_per_write):
+            response = await self.async_client.get(
+                '/api/brms/invoices/export/', headers={'Authorization': f'Token {token.key}'}
+            )
+            self.assertTrue(response.is_async)
+            chunks = aiter(response.streaming_content)
+            first = await anext(chunks)
+            # The header and first row were sent while the rest were still unread
+            self.assertEqual(len(written), 1)
+            rest = [chunk async for chunk in chunks]
+        self.assertEqual(len(written), self.rows + 1)
+        header, *rows = csv.reader(io.StringIO(b''.join([first, *rest]).decode()))
+        self.assertEqual((len(header), len(rows)), (18, self.rows))
+
+
+class LandlordStatementTests(TestCase):
+    def setUp(self):
+        self.landlord, apartment, tenant = create_portfolio(houses=2)
+        self.landlord.user = User.objects.create_user('landlord', password='pass')
+        self.landlord.save()
+        Role.objects.filter(user=self.landlord.user).update(role_type='landlord')
+        second = Apartment.objects.create(
+            name='Sunset Court', location='Nairobi', apartment_type=ApartmentType.objects.get(),
+            owner=self.landlord, management_fee_percentage=Decimal('7.50')
+        )
+        other_tenant = Tenant.objects.create(
+            first_name='Mary', id_number_or_passport='T-2', email='mary@example.com', phone_number='+254700000003'
+        )
+        house = House.objects.create(
+            apartment=second, number='B1', monthly_rent=Decimal('8000.00'),
+            house_type=HouseType.objects.get(), tenant=other_tenant
+        )
+        today = timezone.localdate()
+        self.period = today.replace(day=1)
+        for tenant, house, paid in [
+            (tenant, apartment.houses.get(number='A0'), ['6000.00', '4000.00']),
+            (other_tenant, house, ['4999.00']),
+        ]:
+            invoice = Invoice.objects.create(
+                tenant=tenant, house=house, month=today.strftime('%B'), year=today.year, rent=house.monthly_rent
+            )
+            for amount in paid:
+                Payment.objects.create(invoice=invoice, amount=Decimal(amount))
+
+        # Another owner, whose rent must not leak into the statement
+        other = Landlord.objects.create(
+            first_name='Ann', id_number='L-2', email='ann@example.com',
+            phone_number='+254700000009', physical_address='Mombasa'
+        )
+        Apartment.objects.create(
+            name='Harbour View', location='Mombasa', apartment_type=ApartmentType.objects.get(),
+            owner=other, management_fee_percentage=Decimal('12.00')
+        )
+
+    def test_statement_figures(self):
+        # The landlord ids, three grouped queries for the batch, the upsert and the savepoint pair
+        with self.assertNumQueries(7):
+            result = generate_statements(self.period)
+        self.assertEqual(result['statements'], 2)
+
+        statement = LandlordStatement.objects.get(landlord=self.landlord, period=self.period)
+        self.assertEqual(
+            (statement.rent_billed, statement.rent_collected, statement.management_fee, statement.net_payout),
+            (Decimal('18000.00'), Decimal('14999.00'), Decimal('1374.93'), Decimal('13624.07'))
+        )
+        self.assertEqual(statement.payments_count, 3)
+        sunrise, sunset = statement.apartments
+        self.assertEqual((sunrise['name'], sunrise['management_fee'], sunrise['net_payout']), ('Sunrise Court', '1000.00', '9000.00'))
+        self.assertEqual([house['number'] for house in sunrise['houses']], ['A0'])
+        self.assertEqual(sunset['houses'][0]['management_fee'], '374.93')
+
+        # Re-running replaces the stored figures
+        Payment.objects.create(invoice=Invoice.objects.get(house__number='B1'), amount=Decimal('1.00'))
+        generate_statements(self.period, [self.landlord.pk])
+        statement.refresh_from_db()
+        self.assertEqual((statement.rent_collected, statement.payments_count), (Decimal('15000.00'), 4))
+        self.assertEqual(LandlordStatement.objects.count(), 2)
+
+    def test_statement_endpoints(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.get(pk=self.landlord.user_id))
+        response = client.post('/api/brms/statements/generate/', {'month': self.period.month, 'year': self.period.year})
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data['statements'], 1)
+        generate_statements(self.period)
+
+        response = client.get(f'/api/brms/statements/?period_from={self.period:%Y-%m}')
+        self.assertEqual([row['landlord'] for row in response.data['results']], [self.landlord.pk])
+        self.assertEqual(response.data['results'][0]['net_payout'], '13624.07')
+
+        client.force_authenticate(User.objects.create_user('tenant', password='pass'))
+        self.assertEqual(client.get('/api/brms/statements/').data['results'], [])
+        response = client.post('/api/brms/statements/generate/', {'month': self.period.month, 'year': self.period.year})
+        self.assertEqual(response.status_code, 403)
+
+
+class ArrearsAgingTests(TestCase):
+    def setUp(self):
+        self.landlord, apartment, self.tenant = create_portfolio(houses=2)
+        self.landlord.user = User.objects.create_user('landlord', password='pass')
+        self.landlord.save()
+        Role.objects.filter(user=self.landlord.user).update(role_type='landlord')
+        first, second = apartment.houses.all()
+        second.tenant = self.tenant
+        second.save()
+        self.today = timezone.localdate()
+        for house, month, days_past_due, paid in [
+            (first, 'January', 10, '0'),
+            (first, 'February', 45, '4000'),
+            (second, 'March', 75, '0'),
+            (second, 'April', 120, '0'),
+            (second, 'May', -5, '0'),  # Not due yet
+            (first, 'June', 200, '10000'),  # Paid
+        ]:
+            invoice = Invoice.objects.create(
+                tenant=self.tenant, house=house, month=month, year=2025, rent=Decimal('10000.00'),
+                due_date=self.today - timedelta(days=days_past_due)
+            )
+            if paid != '0':
+                Payment.objects.create(invoice=invoice, amount=Decimal(paid))
+
+        # Another owner's arrears
+        other = Landlord.objects.create(
+            first_name='Ann', id_number='L-2', email='ann@example.com',
+            phone_number='+254700000009', physical_address='Mombasa'
+        )
+        house = House.objects.create(
+            apartment=Apartment.objects.create(
+                name='Harbour View', location='Mombasa', apartment_type=ApartmentType.objects.get(),
+                owner=other, management_fee_percentage=Decimal('12.00')
+            ),
+            number='H1', monthly_rent=Decimal('5000.00'), house_type=HouseType.objects.get(), tenant=self.tenant
+        )
+        Invoice.objects.create(
+            tenant=self.tenant, house=house, month='January', year=2025, rent=Decimal('5000.00'),
+            due_date=self.today - timedelta(days=95)
+        )
+
+    def test_buckets_per_scope(self):
+        with self.assertNumQueries(1):
+            houses = aging_report('house', self.today)
+        self.assertEqual(
+            [(row['name'], row['days_0_30'], row['days_31_60'], row['days_61_90'], row['days_over_90']) for row in houses],
+            [
+                ('A1 Sunrise Court', Decimal('0.00'), Decimal('0.00'), Decimal('10000.00'), Decimal('10000.00')),
+                ('A0 Sunrise Court', Decimal('10000.00'), Decimal('6000.00'), Decimal('0.00'), Decimal('0.00')),
+                ('H1 Harbour View', Decimal('0.00'), Decimal('0.00'), Decimal('0.00'), Decimal('5000.00')),
+            ]
+        )
+        # A tenant renting from two landlords has a row with each
+        tenants = aging_report('tenant', self.today)
+        self.assertEqual([(row['total'], row['invoices_count']) for row in tenants], [(Decimal('36000.00'), 4), (Decimal('5000.00'), 1)])
+
+    def test_snapshots_and_endpoints(self):
+        result = take_snapshot(self.today)
+        self.assertEqual(result['rows'], {'tenant': 2, 'house': 3, 'apartment': 2, 'landlord': 2})
+        # Retaking the day's snapshot replaces it
+        Payment.objects.create(invoice=Invoice.objects.get(house__number='H1'), amount=Decimal('5000.00'))
+        take_snapshot(self.today)
+        self.assertEqual(ArrearsSnapshot.objects.filter(snapshot_date=self.today).count(), 5)
+
+        client = APIClient()
+        client.force_authenticate(User.objects.get(pk=self.landlord.user_id))
+        response = client.get(f'/api/brms/arrears/?scope=landlord&date_from={self.today}')
+        self.assertEqual(
+            [(row['object_id'], row['total']) for row in response.data['results']], [(self.landlord.pk, '36000.00')]
+        )
+        response = client.get('/api/brms/arrears/aging/?scope=apartment')
+        self.assertEqual([row['name'] for row in response.data['results']], ['Sunrise Court'])
+        self.assertEqual(client.get('/api/brms/arrears/aging/?scope=planet').status_code, 400)
+
+        client.force_authenticate(User.objects.create_user('tenant', password='pass'))
+        self.assertEqual(client.get('/api/brms/arrears/aging/').status_code, 403)
+
+
+class HouseOccupancyTests(TestCase):
+    def setUp(self):
+        self.landlord, self.apartment, self.tenant = create_portfolio(houses=2)
+        self.landlord.user = User.objects.create_user('landlord', password='pass')
+        self.landlord.save()
+        Role.objects.filter(user=self.landlord.user).update(role_type='landlord')
+
+    def history(self, house):
+        return list(house.occupancy_intervals.order_by('pk').values_list('status', 'tenant_id', 'ended_at'))
+
+    def test_transitions_open_and_close_intervals(self):
+        house = House.objects.get(number='A0')
+        self.assertEqual(self.history(house), [('occupied', self.tenant.pk, None)])
+
+        # Saves that change neither status nor tenant leave the history alone
+        house.description = 'Corner unit'
+        with CaptureQueriesContext(connection) as queries:
+            house.save()
+        self.assertFalse([query for query in queries if 'houseoccupancyinterval' in query['sql']])
+
+        house.tenant = None
+        house.save()
+        house.status = 'maintenance'
+        house.save()
+        history = self.history(house)
+        self.assertEqual([(status, tenant_id) for status, tenant_id, _ in history], [
+            ('occupied', self.tenant.pk), ('vacant', None), ('maintenance', None),
+        ])
+        self.assertEqual([ended_at is None for *_, ended_at in history], [False, False, True])
+
+    def test_approval_vacancy_and_tenant_removal_cut_intervals(self):
+        house = House.objects.get(number='A1')
+        booking = HouseBooking.objects.create(
+            house=house, tenant=self.tenant, deposit_amount=Decimal('1000.00'), rent_amount_paid=Decimal('0.00')
+        )
+        client = APIClient()
+        client.force_authenticate(User.objects.get(pk=self.landlord.user_id))
+
+        # Approval claims the house with a queryset UPDATE, not House.save()
+        response = client.patch(f'/api/brms/bookings/{booking.pk}/update_status/', {'status': 'approved'}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(self.history(house)[-1], ('occupied', self.tenant.pk, None))
+        response = client.post(f'/api/brms/houses/{house.pk}/vacate_house/')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(self.history(house)[-1], ('vacant', None, None))
+
+        # Deleting the tenant clears House.tenant through SET_NULL
+        occupied = House.objects.get(number='A0')
+        self.tenant.delete()
+        occupied.refresh_from_db()
+        self.assertEqual((occupied.status, occupied.tenant_id), ('vacant', None))
+        self.assertEqual(
+            [(status, tenant_id, ended_at is None) for status, tenant_id, ended_at in self.history(occupied)],
+            [('occupied', None, False), ('vacant', None, True)]
+        )
+        self.assertEqual([status for status, *_ in self.history(house)], ['vacant', 'occupied', 'vacant'])
+
+    def test_vacancy_by_apartment_and_period(self):
+        def at(month, day):
+            return timezone.make_aware(datetime(2025, month, day))
+
+        HouseOccupancyInterval.objects.all().delete()
+        first, second = self.apartment.houses.all()
+        HouseOccupancyInterval.objects.bulk_create([
+            HouseOccupancyInterval(house=first, status='vacant', started_at=at(1, 1), ended_at=at(1, 11)),
+            HouseOccupancyInterval(house=first, status='occupied', tenant=self.tenant, started_at=at(1, 11)),
+            HouseOccupancyInterval(house=second, status='vacant', started_at=timezone.make_aware(datetime(2024, 12, 20)), ended_at=at(1, 6)),
+            HouseOccupancyInterval(house=second, status='maintenance', started_at=at(1, 6), ended_at=at(1, 16)),
+            HouseOccupancyInterval(house=second, status='occupied', started_at=at(1, 16)),
+        ])
+        with self.assertNumQueries(1):
+            report = occupancy_report(at(1, 1), at(2, 1))
+        self.assertEqual(report, [{
+            'apartment_id': self.apartment.pk, 'name': 'Sunrise Court', 'houses': 2, 'house_days': 62.0,
+            'occupied_days': 37.0, 'vacant_days': 15.0, 'maintenance_days': 10.0, 'vacancy_rate': 24.2,
+            'average_days_vacant': 7.5, 'move_ins': 2,
+        }])
+
+        client = APIClient()
+        client.force_authenticate(User.objects.get(pk=self.landlord.user_id))
+        response = client.get('/api/brms/apartments/occupancy/?period_from=2025-01&period_to=2025-02')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data['results'][0]['house_days'], 62.0 + 56.0)
+        self.assertEqual(client.get('/api/brms/apartments/occupancy/?period_from=2025-13').status_code, 400)
+
+        client.force_authenticate(User.objects.create_user('tenant', password='pass'))
+        self.assertEqual(client.get('/api/brms/apartments/occupancy/').status_code, 403)
+
+
+def create_competing_bookings(apartment, houses, bookings_per_house):
+    """
+    `houses` vacant houses in the apartment with `bookings_per_house` pending bookings each
+    """
+    house_type = HouseType.objects.get()
+    tenants = Tenant.objects.bulk_create([
+        Tenant(first_name='Bidder', last_name=str(number), id_number_or_passport=f'B-{number}',
+               email=f'bidder{number}@example.com', phone_number=f'+25472{number:07d}')
+        for number in range(houses * bookings_per_house)
+    ])
+    bookings = []
+    for number in range(houses):
+        house = House.objects.create(
+            apartment=apartment, number=f'V{number}', monthly_rent=Decimal('10000.00'), house_type=house_type
+        )
+        bookings.extend(
+            HouseBooking.objects.create(
+                house=house, tenant=tenant, deposit_amount=Decimal('1000.00'), rent_amount_paid=Decimal('0.00')
+            )
+            for tenant in tenants[number * bookings_per_house:(number + 1) * bookings_per_house]
+        )
+    return bookings
+
+
+class BookingApprovalTests(TestCase):
+    def setUp(self):
+        _, self.apartment, _ = create_portfolio()
+        self.bookings = create_competing_bookings(self.apartment, houses=1, bookings_per_house=3)
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('admin', password='pass', is_staff=True))
+
+    def approve(self, booking):
+        return self.client.patch(f'/api/brms/bookings/{booking.pk}/update_status/', {'status': 'approved'}, format='json')
+
+    def test_approval_takes_the_house_and_rejects_the_rest(self):
+        winner, *losers = self.bookings
+        response = self.approve(winner)
+        self.assertEqual((response.status_code, response.data['status']), (200, 'approved'))
+
+        house = House.objects.get(pk=winner.house_id)
+        self.assertEqual((house.status, house.tenant_id), ('occupied', winner.tenant_id))
+        self.assertEqual(
+            list(HouseBooking.objects.filter(pk__in=[booking.pk for booking in losers]).values_list('status', flat=True)),
+            ['rejected', 'rejected']
+        )
+        self.assertEqual(self.approve(losers[0]).status_code, 409)
+        self.assertEqual(
+            list(house.occupancy_intervals.filter(ended_at__isnull=True).values_list('status', 'tenant_id')),
+            [('occupied', winner.tenant_id)]
+        )
+        self.assertEqual(ActivityEvent.objects.filter(event_type='booking_status', summary__endswith='rejected').count(), 2)
+        self.assertTrue(ActivityEvent.objects.filter(event_type='tenant_assigned', tenant_id=winner.tenant_id).exists())
+
+        # New bookings for the taken house join its waitlist
+        self.client.force_authenticate(User.objects.get(is_staff=True))
+        response = self.client.post('/api/brms/bookings/', {
+            'house': house.pk, 'tenant': losers[0].tenant_id, 'deposit_amount': '1000', 'rent_amount_paid': '0',
+        }, format='json')
+        self.assertEqual((response.status_code, response.data['status']), (201, 'waitlisted'))
+
+    def test_generic_update_cannot_change_status_house_or_tenant(self):
+        booking, competitor, _ = self.bookings
+        other_house = self.apartment.houses.get(number='A0')
+        url = f'/api/brms/bookings/{booking.pk}/'
+        response = self.client.patch(url, {
+            'status': 'approved', 'house': other_house.pk, 'tenant': competitor.tenant_id,
+            'waitlist_position': 1, 'deposit_amount': '1500',
+        }, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        response = self.client.put(url, {
+            'house': other_house.pk, 'tenant': competitor.tenant_id, 'status': 'waitlisted',
+            'deposit_amount': '1500', 'rent_amount_paid': '0',
+        }, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+
+        booking.refresh_from_db()
+        self.assertEqual(
+            (booking.status, booking.house_id, booking.tenant_id, booking.waitlist_position, booking.deposit_amount),
+            ('pending', self.bookings[1].house_id, self.bookings[0].tenant_id, None, Decimal('1500.00'))
+        )
+        self.assertEqual(House.objects.get(pk=booking.house_id).status, 'vacant')
+        self.assertEqual(self.approve(booking).status_code, 200)
+
+    def test_no_write_path_approves_a_second_booking(self):
+        winner, loser, late = self.bookings
+        house_id = winner.house_id
+        self.assertEqual(self.approve(winner).status_code, 200)
+
+        # Generic update, and a booking created as approved
+        self.client.patch(f'/api/brms/bookings/{loser.pk}/', {'status': 'approved'}, format='json')
+        response = self.client.post('/api/brms/bookings/', {
+            'house': house_id, 'tenant': loser.tenant_id, 'status': 'approved',
+            'deposit_amount': '1000', 'rent_amount_paid': '0',
+        }, format='json')
+        self.assertEqual((response.status_code, response.data['status']), (201, 'waitlisted'))
+        # Approval action, directly and after reopening a rejected booking
+        self.assertEqual(self.approve(loser).status_code, 409)
+        response = self.client.patch(f'/api/brms/bookings/{late.pk}/update_status/', {'status': 'pending'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.approve(late).status_code, 409)
+        with self.assertRaises(BookingConflict):
+            approve_booking(late.pk)
+        self.assertEqual(self.approve(winner).status_code, 409)
+
+        self.assertEqual(
+            list(HouseBooking.objects.filter(house_id=house_id, status='approved').values_list('pk', flat=True)),
+            [winner.pk]
+        )
+        house = House.objects.get(pk=house_id)
+        self.assertEqual((house.status, house.tenant_id), ('occupied', winner.tenant_id))
+
+
+class BookingWaitlistTests(TestCase):
+    def setUp(self):
+        _, self.apartment, _ = create_portfolio()
+        self.house = self.apartment.houses.get()
+        self.tenants = Tenant.objects.bulk_create([
+            Tenant(first_name='Queued', last_name=str(number), phone_number=f'+25473{number:07d}')
+            for number in range(3)
+        ])
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('admin', password='pass', is_staff=True))
+
+    def book(self, tenant):
+        return self.client.post('/api/brms/bookings/', {
+            'house': self.house.pk, 'tenant': tenant.pk, 'deposit_amount': '1000', 'rent_amount_paid': '0',
+        }, format='json')
+
+    def queue(self):
+        return list(
+            self.house.bookings.order_by('pk').values_list('tenant_id', 'status', 'waitlist_position')
+        )
+
+    def test_vacancy_promotes_the_waitlist_in_order(self):
+        first, second, third = self.tenants
+        for tenant in (first, second):
+            response = self.book(tenant)
+            self.assertEqual((response.status_code, response.data['status']), (201, 'waitlisted'))
+        self.assertEqual(self.book(first).status_code, 400)
+
+        response = self.client.post(f'/api/brms/houses/{self.house.pk}/vacate_house/')
+        self.assertEqual((response.status_code, response.data['status']), (200, 'vacant'))
+        self.assertEqual(self.queue(), [(first.pk, 'pending', None), (second.pk, 'waitlisted', 2)])
+        self.assertTrue(ActivityEvent.objects.filter(summary__endswith='moved off the waitlist', tenant_id=first.pk).exists())
+
+        # The house is vacant, but others are queueing: no jumping the line
+        self.assertEqual(self.book(third).data['waitlist_position'], 3)
+
+        promoted = self.house.bookings.get(tenant=first)
+        response = self.client.patch(f'/api/brms/bookings/{promoted.pk}/update_status/', {'status': 'rejected'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            self.queue(), [(first.pk, 'rejected', None), (second.pk, 'pending', None), (third.pk, 'waitlisted', 3)]
+        )
+
+    def test_promotion_cost_does_not_grow_with_the_queue(self):
+        HouseBooking.objects.bulk_create([
+            HouseBooking(house=self.house, tenant=self.tenants[number % 3], deposit_amount=0, rent_amount_paid=0,
+                         status='cancelled' if number % 2 else 'waitlisted',
+                         waitlist_position=None if number % 2 else number + 1)
+            for number in range(200)
+        ])
+        House.objects.filter(pk=self.house.pk).update(status='vacant', tenant=None)
+        # Vacancy and pending checks, the head of the queue, its update, the house details and the event
+        with self.assertNumQueries(6):
+            promoted = promote_next(self.house.pk)
+        self.assertEqual(HouseBooking.objects.get(pk=promoted).status, 'pending')
+        self.assertIsNone(promote_next(self.house.pk))
+
+
+class BookingApprovalConcurrencyTests(TransactionTestCase):
+    workers = 8
+    houses = 5
+    bookings_per_house = 8
+
+    def test_competing_approvals_allocate_each_house_once(self):
+        _, apartment, _ = create_portfolio()
+        bookings = create_competing_bookings(apartment, self.houses, self.bookings_per_house)
+        start = threading.Barrier(self.workers)
+        approved, conflicts, errors = [], [], []
+
+        def approve(share):
+            try:
+                start.wait()
+                for booking in share:
+                    try:
+                        approve_booking(booking.pk)
+                        approved.append(booking)
+                    except BookingConflict:
+                        conflicts.append(booking)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        # Every worker races for every house
+        threads = [threading.Thread(target=approve, args=(bookings[worker::self.workers],)) for worker in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(approved), self.houses)
+        self.assertEqual(len(conflicts), len(bookings) - self.houses)
+        for house in House.objects.filter(number__startswith='V'):
+            winners = list(house.bookings.filter(status='approved').values_list('tenant_id', flat=True))
+            self.assertEqual(winners, [house.tenant_id])
+            self.assertEqual(house.bookings.filter(status='pending').count(), 0)
+            self.assertEqual(house.occupancy_intervals.filter(ended_at__isnull=True, status='occupied').count(), 1)
+
+
+class DatabaseRoutingTests(TransactionTestCase):
+    # In tests the replica mirrors the default database, so both aliases see the same rows
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        _, apartment, tenant = create_portfolio(houses=2)
+        self.house = apartment.houses.get(number='A1')
+        Invoice.objects.create(tenant=tenant, house=apartment.houses.get(number='A0'), month='January', year=2025,
+                               rent=Decimal('10000.00'), due_date=datetime(2025, 1, 5).date())
+        self.tenant = tenant
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('admin', password='pass', is_staff=True))
+
+    def queries_by_alias(self, action):
+        """
+        Run `action`; return the SQL the primary and the replica ran, as text, and its result
+        """
+        with CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections['replica']) as replica:
+            result = action()
+        return ' '.join(q['sql'] for q in primary), ' '.join(q['sql'] for q in replica), result
+
+    def test_safe_actions_read_from_the_replica(self):
+        primary, replica, response = self.queries_by_alias(lambda: self.client.get('/api/brms/invoices/'))
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertIn('accounts_invoice', replica)
+        self.assertNotIn('accounts_invoice', primary)
+
+        # Streamed after the view returns, still from the replica
+        primary, replica, content = self.queries_by_alias(
+            lambda: b''.join(self.client.get('/api/brms/invoices/export/').streaming_content)
+        )
+        self.assertEqual(len(content.decode().splitlines()), 2)
+        self.assertIn('accounts_invoice', replica)
+        self.assertNotIn('accounts_invoice', primary)
+
+        primary, replica, response = self.queries_by_alias(lambda: self.client.post('/api/brms/bookings/', {
+            'house': self.house.pk, 'tenant': self.tenant.pk, 'deposit_amount': '1000', 'rent_amount_paid': '0',
+        }, format='json'))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(replica, '')
+
+    def test_reads_after_a_write_stay_on_the_primary(self):
+        def reads_then_write():
+            with routers.replica_reads():
+                before = routers.reading_from_replica(), router.db_for_read(Invoice)
+                Tenant.objects.create(first_name='New', phone_number='+254700000099')
+                after = routers.reading_from_replica(), router.db_for_read(Invoice)
+            return before, after
+
+        _, replica, (before, after) = self.queries_by_alias(reads_then_write)
+        self.assertEqual((before, after), ((True, 'replica'), (False, 'default')))
+        self.assertEqual(replica, '')
+        with routers.replica_reads(), transaction.atomic():
+            self.assertEqual(router.db_for_read(Invoice), 'default')
+        self.assertEqual(router.db_for_read(Invoice), 'default')
+
+    def test_report_commands_read_from_the_replica(self):
+        primary, replica, _ = self.queries_by_alias(lambda: call_command('arrears_aging', '--snapshot', stdout=io.StringIO()))
+        self.assertIn('accounts_invoice', replica)
+        self.assertNotIn('accounts_invoice', primary)
+        self.assertIn('INSERT INTO "accounts_arrearssnapshot"', primary)
+        self.assertEqual(ArrearsSnapshot.objects.count(), 4)
@@ -1,3 +1,236 @@
-from django.shortcuts import render
+import json
+from decimal import Decimal, InvalidOperation
 
-# Create your views here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Q
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from rest_framework.authtoken.models import Token
+
+from . import mpesa, notifications
+from .api.scoping import get_landlord, get_tenant
+from .models import ActivityEvent, Invoice, MpesaTransaction
+
+# Events replayed to a reconnecting client that sends Last-Event-ID
+REPLAY_LIMIT = 50
+
+
+def authenticated_user(request, allow_session=True):
+    """
+    The user behind a request to one of these plain Django views, from the
+    Authorization header or (if allowed) the session
+    """
+    keyword, _, key = request.headers.get('Authorization', '').partition(' ')
+    if keyword == 'Token' and key.strip():
+        token = Token.objects.select_related('user').filter(key=key.strip()).first()
+        user = token.user if token else None
+    else:
+        user = request.user if allow_session else None
+    if user is None or not user.is_authenticated or not user.is_active:
+        return None
+    return user
+
+
+def stream_user(request, role):
+    """
+    The user opening a notification stream: EventSource cannot set headers,
+    so browsers pass a ticket from notification_stream_ticket as ?ticket=
+    """
+    ticket = request.GET.get('ticket')
+    if ticket is None:
+        return authenticated_user(request)
+    user_id = notifications.stream_ticket_user_id(ticket, role)
+    if user_id is None:
+        return None
+    return User.objects.filter(pk=user_id, is_active=True).first()
+
+
+def stream_scope(user, role):
+    """
+    (channel, activity filter) for the user in the given role, or an error
+    response
+    """
+    if user is None:
+        return JsonResponse({'error': 'Authentication credentials were not provided'}, status=401)
+
+    if role == 'admin' and user.is_staff:
+        return notifications.ADMIN_CHANNEL, Q()
+    if role == 'landlord':
+        landlord = get_landlord(user)
+        if landlord is not None:
+            return notifications.landlord_channel(landlord.pk), Q(landlord=landlord)
+    if role == 'tenant':
+        tenant = get_tenant(user)
+        if tenant is not None:
+            return notifications.tenant_channel(tenant.pk), Q(tenant=tenant)
+    return JsonResponse({'error': f'No {role} access for this user'}, status=403)
+
+
+@csrf_exempt
+@require_POST
+def notification_stream_ticket(request, role):
+    """
+    Issue a ticket for opening /api/<role>/notifications/stream, valid for
+    notifications.STREAM_TICKET_MAX_AGE seconds
+    """
+    # Token only: the view is CSRF-exempt, so a session cookie must not be enough
+    user = authenticated_user(request, allow_session=False)
+    scope = stream_scope(user, role)
+    if isinstance(scope, JsonResponse):
+        return scope
+    return JsonResponse({
+        'ticket': notifications.issue_stream_ticket(user, role),
+        'expires_in': notifications.STREAM_TICKET_MAX_AGE,
+    })
+
+
+def missed_notifications(scope, last_event_id):
+    if not last_event_id or not last_event_id.isdigit():
+        return []
+    events = ActivityEvent.objects.filter(
+        scope, pk__gt=int(last_event_id), event_type__in=notifications.NOTIFICATION_EVENT_TYPES
+    ).order_by('pk')[:REPLAY_LIMIT]
+    return [notifications.serialize(event) for event in events]
+
+
+@require_GET
+async def notification_stream(request, role):
+    """
+    Server-Sent Events stream of the user's booking, invoice and payment
+    notifications. Served without holding a worker thread when run under
+    ASGI (BRMS/asgi.py); an idle connection only costs a queue and a
+    keep-alive comment every HEARTBEAT_SECONDS.
+
+    Under WSGI Django reads an async stream to the end before sending any of
+    it, which for this endless one means never, so the request is refused.
+    """
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse(
+            {'error': 'Notification streams are only served by the ASGI application (BRMS.asgi)'}, status=503
+        )
+    user = await sync_to_async(stream_user)(request, role)
+    scope = await sync_to_async(stream_scope)(user, role)
+    if isinstance(scope, JsonResponse):
+        return scope
+    channel, activity_filter = scope
+    last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+
+    async def events():
+        # Subscribe before replaying so nothing published in between is lost
+        subscription = notifications.get_broker().subscribe([channel])
+        try:
+            yield 'retry: 5000\n\n'
+            last_sent = 0
+            for message in await sync_to_async(missed_notifications)(activity_filter, last_event_id):
+                yield notifications.sse_message(message)
+                last_sent = message['id']
+            while True:
+                message = await subscription.get(timeout=notifications.HEARTBEAT_SECONDS)
+                if message is None:
+                    yield ': keep-alive\n\n'
+                elif message['id'] > last_sent:
+                    yield notifications.sse_message(message)
+        finally:
+            subscription.close()
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+# M-Pesa STK push
+def payable_invoice(user, invoice_id):
+    """
+    The invoice, if the user is its tenant, its landlord or staff
+    """
+    if not str(invoice_id).isdigit():
+        return None
+    invoices = Invoice.objects.filter(pk=invoice_id)
+    if not user.is_staff:
+        invoices = invoices.filter(Q(tenant__user=user) | Q(house__apartment__owner__user=user))
+    return invoices.first()
+
+
+@csrf_exempt
+@require_POST
+async def mpesa_initiate(request):
+    """
+    Start an STK push for an invoice. Returns as soon as Safaricom accepts the
+    request; the outcome arrives later on the callback.
+    """
+    # Token only: the view is CSRF-exempt, so a session cookie must not be enough
+    user = await sync_to_async(authenticated_user)(request, allow_session=False)
+    if user is None:
+        return JsonResponse({'success': False, 'error': 'Authentication credentials were not provided'}, status=401)
+    try:
+        data = json.loads(request.body)
+        amount = Decimal(str(data.get('amount')))
+    except (ValueError, AttributeError, InvalidOperation):
+        return JsonResponse({'success': False, 'error': 'A JSON body with a numeric amount is required'}, status=400)
+
+    phone_number = mpesa.normalize_phone(data.get('phone_number', ''))
+    if phone_number is None:
+        return JsonResponse({'success': False, 'error': 'Please enter a valid Kenyan phone number'}, status=400)
+    invoice = await sync_to_async(payable_invoice)(user, data.get('invoice_id'))
+    if invoice is None:
+        return JsonResponse({'success': False, 'error': 'Invoice not found'}, status=404)
+    amount = mpesa.whole_shillings(amount)
+    if amount < 1 or amount > invoice.total_payable - invoice.amount_paid:
+        return JsonResponse({'success': False, 'error': 'Amount must be between 1 and the outstanding balance'}, status=400)
+
+    try:
+        ack = await mpesa.MpesaClient().stk_push(
+            phone_number, amount,
+            data.get('account_reference') or f'Invoice-{invoice.pk}',
+            data.get('transaction_desc') or 'Rent payment',
+        )
+    except mpesa.MpesaError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=502)
+
+    transaction_row = await MpesaTransaction.objects.acreate(
+        checkout_request_id=ack['CheckoutRequestID'], merchant_request_id=ack.get('MerchantRequestID', ''),
+        invoice=invoice, requested_by=user, phone_number=phone_number, amount=amount,
+    )
+    await sync_to_async(mpesa.cache_status)(transaction_row)
+    return JsonResponse({
+        'success': True,
+        'checkout_request_id': transaction_row.checkout_request_id,
+        'message': ack.get('CustomerMessage', ''),
+    })
+
+
+@require_GET
+async def mpesa_status(request, checkout_request_id):
+    """
+    Status of an STK push, answered from the cache
+    """
+    user = await sync_to_async(authenticated_user)(request)
+    if user is None:
+        return JsonResponse({'success': False, 'error': 'Authentication credentials were not provided'}, status=401)
+    payload = await sync_to_async(mpesa.status)(checkout_request_id)
+    if payload is None or (payload['user_id'] != user.pk and not user.is_staff):
+        return JsonResponse({'success': False, 'error': 'Unknown transaction'}, status=404)
+    return JsonResponse({key: value for key, value in payload.items() if key != 'user_id'})
+
+
+@csrf_exempt
+@require_POST
+def mpesa_callback(request):
+    """
+    Safaricom's STK result callback. Safe to deliver more than once. Refused
+    unless MPESA['CALLBACK_TOKEN'] is set and passed as ?token=.
+    """
+    expected = mpesa.config().get('CALLBACK_TOKEN')
+    if not expected or not constant_time_compare(request.GET.get('token', ''), expected):
+        return JsonResponse({'ResultCode': 1, 'ResultDesc': 'Rejected'}, status=403)
+    try:
+        mpesa.record_callback(json.loads(request.body))
+    except (ValueError, mpesa.MpesaError) as e:
+        return JsonResponse({'ResultCode': 1, 'ResultDesc': str(e)}, status=400)
+    return JsonResponse({'ResultCode': 0, 'ResultDesc': 'Accepted'})
@@ -34,9 +34,9 @@ function BrowseHouses() {
         // Fetch house types for filtering
         const houseTypesResponse = await axios.get(`${API_BASE_URL}/api/house-types/`);
         
-        setHouses(housesResponse.data);
-        setApartments(apartmentsResponse.data);
-        setHouseTypes(houseTypesResponse.data);
+        setHouses(housesResponse.data.results || housesResponse.data);
+        setApartments(apartmentsResponse.data.results || apartmentsResponse.data);
+        setHouseTypes(houseTypesResponse.data.results || houseTypesResponse.data);
         setLoading(false);
       } catch (err) {
         setError('Failed to load houses. Please try again later.');
@@ -65,25 +65,18 @@ function BrowseHouses() {
         params.house_type_id = filters.houseTypeId;
       }
       
-      // Fetch filtered houses
-      const response = await axios.get(`${API_BASE_URL}/api/houses/`, { params });
-      
-      // Apply client-side price filtering
-      let filteredHouses = response.data;
-      
       if (filters.minPrice) {
-        filteredHouses = filteredHouses.filter(
-          house => house.monthly_rent >= parseFloat(filters.minPrice)
-        );
+        params.min_rent = filters.minPrice;
       }
       
       if (filters.maxPrice) {
-        filteredHouses = filteredHouses.filter(
-          house => house.monthly_rent <= parseFloat(filters.maxPrice)
-        );
+        params.max_rent = filters.maxPrice;
       }
       
-      setHouses(filteredHouses);
+      // Fetch filtered houses - price filtering happens on the server
+      const response = await axios.get(`${API_BASE_URL}/api/houses/`, { params });
+      
+      setHouses(response.data.results || response.data);
       setLoading(false);
     } catch (err) {
       setError('Failed to apply filters. Please try again.');
@@ -112,7 +105,7 @@ function BrowseHouses() {
     
     // Re-fetch all houses
     axios.get(`${API_BASE_URL}/api/houses/`, { params: { status: 'vacant' } })
-      .then(response => setHouses(response.data))
+      .then(response => setHouses(response.data.results || response.data))
       .catch(err => {
         setError('Failed to reset filters. Please try again.');
         console.error('Error resetting filters:', err);
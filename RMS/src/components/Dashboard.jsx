@@ -198,6 +198,57 @@ const Dashboard = () => {
     fetchUserData();
   }, []);
 
+  // Receive new notifications pushed over Server-Sent Events instead of polling
+  useEffect(() => {
+    const authToken =
+      localStorage.getItem("authToken") || localStorage.getItem("token");
+    if (!activeRole || !authToken) return;
+
+    let source = null;
+    let lastEventId = "";
+    let stopped = false;
+    const handleNotification = (event) => {
+      lastEventId = event.lastEventId;
+      const notification = JSON.parse(event.data);
+      setNotifications((current) => [
+        notification,
+        ...current.filter((item) => item.id !== notification.id),
+      ]);
+    };
+
+    // EventSource cannot send the Authorization header, so each connection is
+    // opened with a short-lived ticket. Once the ticket has expired a reconnect
+    // is refused and the source closes; a fresh ticket resumes from the last event.
+    const connect = async () => {
+      const response = await fetch(
+        `/api/${activeRole}/notifications/stream/ticket`,
+        { method: "POST", headers: { Authorization: `Token ${authToken}` } }
+      );
+      if (!response.ok || stopped) return;
+      const { ticket } = await response.json();
+      const params = new URLSearchParams({ ticket });
+      if (lastEventId) params.set("last_event_id", lastEventId);
+
+      source = new EventSource(
+        `/api/${activeRole}/notifications/stream?${params}`
+      );
+      ["booking_status", "invoice_created", "payment_received"].forEach(
+        (type) => source.addEventListener(type, handleNotification)
+      );
+      source.onerror = () => {
+        if (source.readyState === EventSource.CLOSED && !stopped) {
+          setTimeout(() => connect().catch(() => {}), 5000);
+        }
+      };
+    };
+    connect().catch(() => {});
+
+    return () => {
+      stopped = true;
+      if (source) source.close();
+    };
+  }, [activeRole]);
+
   // Fetch role-specific data
   const fetchRoleData = async (role) => {
     try {
@@ -228,7 +279,7 @@ const Dashboard = () => {
 
       if (activitiesResponse.ok) {
         const activitiesData = await activitiesResponse.json();
-        setActivities(activitiesData);
+        setActivities(activitiesData.results || activitiesData);
       } else {
         // Use placeholder activities if API fails
         setActivities(getPlaceholderActivities(role));
@@ -243,7 +294,7 @@ const Dashboard = () => {
 
       if (notificationsResponse.ok) {
         const notificationsData = await notificationsResponse.json();
-        setNotifications(notificationsData);
+        setNotifications(notificationsData.results || notificationsData);
       }
     } catch (err) {
       console.error("Error fetching role data:", err);
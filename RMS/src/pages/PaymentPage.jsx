@@ -114,17 +114,7 @@ const PaymentPage = () => {
           setPaymentSuccess(true);
           setPaymentLoading(false);
           
-          // Update invoice status
-          await axios.patch(`/api/invoices/${invoiceId}/`, {
-            paid: true,
-            payment_date: new Date().toISOString(),
-            payment_method: 'mpesa',
-            transaction_id: statusResponse.data.transaction_id
-          }, {
-            headers: {
-              'Authorization': `Token ${localStorage.getItem('token')}`
-            }
-          });
+          // The M-Pesa callback has already recorded the payment against the invoice
           
           alert("Payment completed successfully!");
           